@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+from __future__ import division
+import gc
+from time import time
+
+import numpy as np
+
+from safe_cv import cv
+from camera_capture import CameraCapture, CVFileCapture
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    # Not available on Windows.
+    import resource
+except ImportError:
+    resource = None
+
+
+def parse_args():
+    """Parses arguments, returns ``(options, args)``."""
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="""\
+Compare allocations and garbage collector activity of `get_frame` with and
+without a preallocated frame pool.""",
+                           )
+    parser.add_argument('-n', '--frame_count', dest='frame_count', type=int,
+                        default=10000)
+    parser.add_argument('-i', '--in_file', dest='in_file', type=str,
+                        default=None, help='Video file to use instead of '
+                        'camera.')
+    args = parser.parse_args()
+
+    return args
+
+
+def _get_frame_copy(cam_cap):
+    # Previous behaviour: wrap frame from the capture and copy it so it
+    # survives the next `get_frame` call.
+    frame = cam_cap.get_frame()
+    return np.asarray(cv.GetMat(frame)).copy()
+
+
+def _get_frame_pooled(cam_cap):
+    return cam_cap.get_frame(out=cam_cap.frame_pool.next())
+
+
+def benchmark(cam_cap, get_frame, frame_count):
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+    collections = 0
+    prev_count = gc.get_count()[0]
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time()
+    for i in range(frame_count):
+        get_frame(cam_cap)
+        count = gc.get_count()[0]
+        # Generation 0 counter is reset by each collection.
+        if count < prev_count:
+            collections += 1
+        prev_count = count
+    duration = time() - start
+    results = dict(frames_per_second=frame_count / duration,
+                   gen0_collections=collections)
+    if resource is not None:
+        results['max_rss_increase_kb'] = \
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - max_rss
+    if tracemalloc is not None:
+        results['peak_traced_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return results
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    if args.in_file is None:
+        cam_cap = CameraCapture()
+    else:
+        cam_cap = CVFileCapture(args.in_file)
+    cam_cap.init_capture()
+    cam_cap.create_frame_pool()
+
+    for name, get_frame in (('copy', _get_frame_copy),
+                            ('pool', _get_frame_pooled)):
+        results = benchmark(cam_cap, get_frame, args.frame_count)
+        print '%s (%d frames):' % (name, args.frame_count)
+        for k, v in sorted(results.items()):
+            print '  %-22s %s' % (k + ':', v)
+    del cam_cap
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import numpy as np
+
+from frame_codec import (RawFrameCodec, JPEGFrameCodec, PNGFrameCodec,
+                         DeltaFrameCodec)
+
+
+def parse_args():
+    """Parses arguments, returns ``(options, args)``."""
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="""\
+Compare encoding and decoding throughput and compression ratio of frame
+codecs.""",
+                           )
+    parser.add_argument('-n', '--frame_count', dest='frame_count', type=int,
+                        default=100)
+    parser.add_argument('-i', '--in_file', dest='in_file', type=str,
+                        default=None, help='Video file to read frames from '
+                        '(default: synthetic frames).')
+    parser.add_argument('-W', '--width', dest='width', type=int, default=640)
+    parser.add_argument('-H', '--height', dest='height', type=int,
+                        default=480)
+    parser.add_argument('-q', '--jpeg_quality', dest='jpeg_quality',
+                        type=int, default=90)
+    args = parser.parse_args()
+
+    return args
+
+
+def synthetic_frames(width, height, frame_count):
+    '''
+    Static gradient background with sensor noise and a moving square.
+    '''
+    y, x = np.mgrid[:height, :width]
+    background = np.dstack([x * 255 // width, y * 255 // height,
+                            (x + y) * 255 // (width + height)])
+    for i in range(frame_count):
+        frame = background + np.random.randint(-2, 3, background.shape)
+        offset = (4 * i) % (width - 40)
+        frame[20:60, offset:offset + 40] = 255
+        yield frame.clip(0, 255).astype('uint8')
+
+
+def file_frames(in_file, frame_count):
+    from camera_capture import CVFileCapture
+
+    cam_cap = CVFileCapture(in_file)
+    cam_cap.init_capture()
+    cam_cap.create_frame_pool(size=1)
+    for i in range(frame_count):
+        yield cam_cap.get_frame(out=cam_cap.frame_pool.next()).copy()
+
+
+def benchmark_codec(codec, frames):
+    decoded = [codec.decode(*codec.encode(frame)) for frame in frames]
+    # Access pixels, so lazy frames are decoded.
+    for frame in decoded:
+        np.asarray(frame)
+    return codec.stats()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    if args.in_file is None:
+        frames = list(synthetic_frames(args.width, args.height,
+                                       args.frame_count))
+    else:
+        frames = list(file_frames(args.in_file, args.frame_count))
+
+    for codec in (RawFrameCodec(), JPEGFrameCodec(args.jpeg_quality),
+                  PNGFrameCodec(), DeltaFrameCodec()):
+        results = benchmark_codec(codec, frames)
+        print '%s (%d frames):' % (codec.name, len(frames))
+        print '  compression ratio:      %.1f' % results['compression_ratio']
+        print '  encode time/frame:      %.2f ms' % \
+            (1e3 * results['encode_time_per_frame'])
+        print '  encode throughput:      %.1f MB/s' % \
+            (1e-6 * (results['encode_bytes_per_second'] or 0))
+        if results['decode_time_per_frame'] is not None:
+            print '  decode time/frame:      %.2f ms' % \
+                (1e3 * results['decode_time_per_frame'])
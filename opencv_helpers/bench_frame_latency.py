@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+from __future__ import division
+from datetime import datetime
+import os
+import logging
+
+import numpy as np
+import gobject
+
+from frame_grabber import FrameGrabber
+from camera_capture import CameraCapture
+
+
+def parse_args():
+    """Parses arguments, returns ``(options, args)``."""
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="""\
+Measure latency from `get_frame` to `frame_callback` and idle CPU time of
+the parent process for each FrameGrabber delivery mode.""",
+                           )
+    parser.add_argument('-s', '--seconds', dest='seconds', type=float,
+                        default=5)
+    parser.add_argument('-f', '--fps_limit', dest='fps_limit', type=float,
+                        default=30)
+    args = parser.parse_args()
+
+    return args
+
+
+def _run_main_loop(seconds):
+    loop = gobject.MainLoop()
+    gobject.timeout_add(int(1000 * seconds), loop.quit)
+    loop.run()
+
+
+def _cpu_time():
+    user, system = os.times()[:2]
+    return user + system
+
+
+def benchmark_delivery(delivery, seconds, fps_limit):
+    cam_cap = CameraCapture(auto_init=False)
+    grabber = FrameGrabber(cam_cap, auto_init=True, delivery=delivery)
+    latencies = []
+
+    def on_frame(frame, frame_time):
+        latencies.append((datetime.now() - frame_time).total_seconds())
+
+    grabber.frame_callback = on_frame
+    grabber.set_fps_limit(fps_limit)
+    grabber.start()
+    _run_main_loop(seconds)
+
+    # Measure CPU time used by the parent while no frames are produced.
+    grabber.pause()
+    _run_main_loop(0.5)
+    idle_start = _cpu_time()
+    _run_main_loop(seconds)
+    idle_cpu = _cpu_time() - idle_start
+    grabber.stop()
+    del cam_cap
+
+    latencies = np.array(latencies)
+    return dict(frame_count=len(latencies),
+                mean_latency=latencies.mean(),
+                p95_latency=np.percentile(latencies, 95),
+                idle_cpu_fraction=idle_cpu / seconds)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    args = parse_args()
+
+    for delivery in ('poll', 'io_watch'):
+        results = benchmark_delivery(delivery, args.seconds, args.fps_limit)
+        print '%s:' % delivery
+        print '  frames:           %d' % results['frame_count']
+        print '  mean latency:     %.2f ms' % (1e3 * results['mean_latency'])
+        print '  p95 latency:      %.2f ms' % (1e3 * results['p95_latency'])
+        print '  idle CPU:         %.2f%%' % \
+            (100 * results['idle_cpu_fraction'])
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+from __future__ import division
+import os
+from time import time, sleep
+
+import numpy as np
+
+from camera_capture import CameraCaptureBase
+from frame_grabber_core import ThreadedFrameGrabber
+from frame_transform import FrameTransform
+
+
+def parse_args():
+    """Parses arguments, returns ``(options, args)``."""
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="""\
+Compare bytes transferred and parent CPU time of full frames and frames
+reduced in the grabber child process.""",
+                           )
+    parser.add_argument('-t', '--seconds', dest='seconds', type=float,
+                        default=5.)
+    parser.add_argument('-f', '--fps_limit', dest='fps_limit', type=float,
+                        default=30.)
+    parser.add_argument('-W', '--width', dest='width', type=int,
+                        default=1920)
+    parser.add_argument('-H', '--height', dest='height', type=int,
+                        default=1080)
+    args = parser.parse_args()
+
+    return args
+
+
+class SyntheticCapture(CameraCaptureBase):
+    '''
+    Generate frames of a fixed size without a camera.
+    '''
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.frame = None
+        super(SyntheticCapture, self).__init__()
+
+    def _init_capture(self):
+        self.frame = np.random.randint(0, 256, (self.height, self.width, 3))\
+            .astype('uint8')
+
+    def _release_capture(self):
+        self.frame = None
+
+    def grab(self):
+        return self.frame is not None
+
+    def retrieve(self, out=None):
+        if self.frame is None:
+            return None
+        if out is None:
+            return self.frame
+        out[:] = self.frame
+        return out
+
+    @property
+    def dimensions(self):
+        return (self.width, self.height)
+
+
+def _cpu_time():
+    # User and system CPU time of this process (`resource` is not available
+    # on Windows).
+    user, system = os.times()[:2]
+    return user + system
+
+
+def benchmark_transform(transform, width, height, seconds, fps_limit):
+    grabber = ThreadedFrameGrabber(SyntheticCapture(width, height),
+                                   auto_init=True, transform=transform)
+    grabber.set_fps_limit(fps_limit)
+    start_cpu = _cpu_time()
+    start = time()
+    grabber.start()
+    sleep(seconds)
+    grabber.stop()
+    duration = time() - start
+    cpu = _cpu_time() - start_cpu
+    # Frames received from the child.
+    frames = max(grabber.latency_stats.count, 1)
+    return dict(frames_per_second=grabber.latency_stats.count / duration,
+                bytes_per_frame=grabber.bytes_received / frames,
+                parent_cpu_per_frame=cpu / frames,
+                parent_cpu_percent=100 * cpu / duration)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    transforms = (('full', None),
+                  ('scale 0.5', FrameTransform(scale=0.5)),
+                  ('scale 0.25', FrameTransform(scale=0.25)),
+                  ('scale 0.25, gray', FrameTransform(scale=0.25,
+                                                      grayscale=True)),
+                  ('roi 640x480', FrameTransform(roi=(0, 0, 640, 480))))
+    for name, transform in transforms:
+        results = benchmark_transform(transform, args.width, args.height,
+                                      args.seconds, args.fps_limit)
+        print '%s (%dx%d):' % (name, args.width, args.height)
+        print '  frames/sec:             %.1f' % results['frames_per_second']
+        print '  bytes/frame:            %d' % results['bytes_per_frame']
+        print '  parent CPU/frame:       %.2f ms' % \
+            (1e3 * results['parent_cpu_per_frame'])
+        print '  parent CPU:             %.1f%%' % \
+            results['parent_cpu_percent']
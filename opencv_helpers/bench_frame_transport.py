@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+from __future__ import division
+import multiprocessing
+import cPickle as pickle
+from time import time
+
+import numpy as np
+
+from frame_transport import PickleFrameTransport, SharedMemoryFrameTransport
+
+
+def parse_args():
+    """Parses arguments, returns ``(options, args)``."""
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="""\
+Compare frame transports between a child process and its parent.""",
+                           )
+    parser.add_argument('-n', '--frame_count', dest='frame_count', type=int,
+                        default=1000)
+    parser.add_argument('-W', '--width', dest='width', type=int, default=640)
+    parser.add_argument('-H', '--height', dest='height', type=int,
+                        default=480)
+    parser.add_argument('-s', '--slot_count', dest='slot_count', type=int,
+                        default=4)
+    args = parser.parse_args()
+
+    return args
+
+
+def _send_frames(conn, transport, frame_shape, frame_count):
+    np_frame = np.zeros(frame_shape, dtype='uint8')
+    for i in range(frame_count):
+        np_frame[0, 0] = i % 256
+        message = ['frame', transport.pack(np_frame), i]
+        conn.send(message)
+        # Wait for parent to consume frame to avoid overrunning the ring.
+        conn.recv()
+    # Every message has the same size, so only measure the last one.
+    pipe_bytes = frame_count * len(pickle.dumps(message,
+                                                pickle.HIGHEST_PROTOCOL))
+    conn.send(('results', dict(pipe_bytes=pipe_bytes,
+                               bytes_copied=transport.bytes_copied)))
+
+
+def benchmark_transport(transport, frame_shape, frame_count):
+    conn, child_conn = multiprocessing.Pipe()
+    p = multiprocessing.Process(target=_send_frames,
+                                args=(child_conn, transport, frame_shape,
+                                      frame_count))
+    start = time()
+    p.start()
+    checksum = 0
+    for i in range(frame_count):
+        message = conn.recv()
+        np_frame = transport.unpack(message[1])
+        checksum += int(np_frame[0, 0, 0])
+        conn.send('ack')
+    duration = time() - start
+    results = conn.recv()[1]
+    p.join()
+    results.update(frames_per_second=frame_count / duration,
+                   pipe_bytes_per_frame=results['pipe_bytes'] / frame_count,
+                   copied_bytes_per_frame=results['bytes_copied'] /
+                   frame_count)
+    return results
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    frame_shape = (args.height, args.width, 3)
+
+    for transport in (PickleFrameTransport(),
+                      SharedMemoryFrameTransport(args.slot_count,
+                                                 frame_shape)):
+        results = benchmark_transport(transport, frame_shape,
+                                      args.frame_count)
+        print '%s:' % transport.name
+        print '  frames/sec:             %.1f' % results['frames_per_second']
+        print '  pipe bytes/frame:       %d' % results['pipe_bytes_per_frame']
+        print '  bytes copied/frame:     %d' % \
+            results['copied_bytes_per_frame']
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+from __future__ import division
+from time import sleep
+
+import numpy as np
+
+from camera_capture import CameraCapture, CVFileCapture
+from frame_grabber_core import ThreadedFrameGrabber
+
+
+def parse_args():
+    """Parses arguments, returns ``(options, args)``."""
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="""\
+Compare start-to-first-frame latency of a grabber launching its child on
+`start` and a prewarmed grabber.""",
+                           )
+    parser.add_argument('-n', '--repeat', dest='repeat', type=int,
+                        default=5)
+    parser.add_argument('-i', '--in_file', dest='in_file', type=str,
+                        default=None, help='Video file to use instead of '
+                        'camera.')
+    args = parser.parse_args()
+
+    return args
+
+
+def benchmark_startup(cam_cap, prewarm, repeat):
+    grabber = ThreadedFrameGrabber(cam_cap, prewarm=prewarm)
+    phases = []
+    for i in range(repeat):
+        if prewarm:
+            # Give the prewarmed child time to initialize, as between
+            # on-demand recordings.
+            sleep(2.)
+        grabber.start()
+        next(iter(grabber))
+        phases.append(dict(grabber.startup))
+        grabber.stop()
+    grabber.close()
+    return dict([(k, np.mean([p[k] for p in phases]))
+                 for k in phases[0]])
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    if args.in_file is None:
+        cam_cap = CameraCapture()
+    else:
+        cam_cap = CVFileCapture(args.in_file)
+
+    for prewarm in (False, True):
+        results = benchmark_startup(cam_cap, prewarm, args.repeat)
+        print '%s (mean of %d starts):' % ('prewarm' if prewarm else 'cold',
+                                           args.repeat)
+        for k, v in sorted(results.items()):
+            print '  %-22s %.1f ms' % (k + ':', 1e3 * v)
@@ -1,4 +1,5 @@
 import os
+import threading
 from datetime import datetime, timedelta
 
 import numpy as np
@@ -25,9 +26,73 @@ class CaptureFrameRateInfo(FrameRateInfo):
         return np.array(times), frame_lengths
 
 
+class FramePool(object):
+    '''
+    Fixed set of preallocated frame buffers, handed out in turn.
+
+    A buffer returned by `next` is handed out again after `size` more calls,
+    so consumers must be finished with a frame by then.
+    '''
+    def __init__(self, shape, dtype='uint8', size=4):
+        self.buffers = [np.empty(shape, dtype=dtype) for i in range(size)]
+        self.index = 0
+
+    @property
+    def size(self):
+        return len(self.buffers)
+
+    def next(self):
+        buffer_ = self.buffers[self.index]
+        self.index = (self.index + 1) % len(self.buffers)
+        return buffer_
+
+
+class SharedFramePool(FramePool):
+    '''
+    Frame pool for frames passed to several consumers (e.g., encoder
+    threads) that finish with them at different times.
+
+    Consumers `hold` a frame until they `release` it, and `next` skips held
+    buffers, so a slow consumer never sees its frames overwritten.  `size`
+    must exceed the number of frames held at once.
+    '''
+    def __init__(self, shape, dtype='uint8', size=4):
+        super(SharedFramePool, self).__init__(shape, dtype=dtype, size=size)
+        self.holds = [0] * size
+        self.indexes = dict([(id(b), i) for i, b in enumerate(self.buffers)])
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            for i in xrange(len(self.buffers)):
+                index = (self.index + i) % len(self.buffers)
+                if not self.holds[index]:
+                    self.index = (index + 1) % len(self.buffers)
+                    return self.buffers[index]
+        raise RuntimeError('All %d frame buffers are held.' %
+                           len(self.buffers))
+
+    def hold(self, frame):
+        '''
+        Keep `frame` from being handed out until `release` is called (once
+        per call to `hold`).  Frames not from this pool are ignored.
+        '''
+        index = self.indexes.get(id(frame))
+        if index is not None:
+            with self.lock:
+                self.holds[index] += 1
+
+    def release(self, frame):
+        index = self.indexes.get(id(frame))
+        if index is not None:
+            with self.lock:
+                self.holds[index] -= 1
+
+
 class CameraCaptureBase(object):
     def __init__(self, auto_init=False):
         self.initialized = False
+        self.frame_pool = None
         if auto_init:
             self.init_capture()
         self._dimensions = None
@@ -52,9 +117,43 @@ class CameraCaptureBase(object):
     def _init_capture(self):
         raise NotImplementedError
 
-    def get_frame(self):
+    def get_frame(self, out=None):
+        '''
+        Returns the next frame as an OpenCV image or, if `out` is given, copies
+        the next frame into the NumPy array `out` (shape `(height, width, 3)`,
+        BGR) and returns `out`.  Returns `None` if no frame is available.
+
+        Equivalent to `grab` followed by `retrieve`.
+        '''
+        if not self.grab():
+            return None
+        return self.retrieve(out=out)
+
+    def grab(self):
+        '''
+        Take the next frame from the device, without decoding it.  Returns
+        `True` on success.
+
+        Use to keep the driver queue fresh (e.g., while paused) or to skip
+        frames that are not used, at minimal CPU cost.
+        '''
+        raise NotImplementedError
+
+    def retrieve(self, out=None):
+        '''
+        Decode the frame taken by the most recent `grab` (see `get_frame`).
+        '''
         raise NotImplementedError
 
+    def create_frame_pool(self, size=4):
+        '''
+        Create a pool of frame buffers sized from `dimensions`, for use with
+        `get_frame(out=self.frame_pool.next())`.
+        '''
+        width, height = self.dimensions
+        self.frame_pool = FramePool((height, width, 3), size=size)
+        return self.frame_pool
+
     @property
     def dimensions(self):
         raise NotImplementedError
@@ -109,13 +208,19 @@ class CVCameraCapture(CameraCaptureBase):
     def _init_capture(self):
         self.cap = self.cap_config.create_capture()
 
-    def get_frame(self):
-        cv.GrabFrame(self.cap)
+    def grab(self):
+        return bool(cv.GrabFrame(self.cap))
+
+    def retrieve(self, out=None):
         frame = cv.RetrieveFrame(self.cap)
-        if frame:
-            return frame
-        else:
+        if not frame:
             return None
+        elif out is None:
+            return frame
+        # Frame returned by `RetrieveFrame` is owned by the capture, so the
+        # NumPy view does not copy the pixel data.
+        out[:] = np.asarray(cv.GetMat(frame))
+        return out
 
     def _set_dimensions(self, dimensions):
         cv.SetCaptureProperty(self.cap, cv.CV_CAP_PROP_FRAME_WIDTH, dimensions[0])
@@ -130,6 +235,34 @@ class CVCameraCapture(CameraCaptureBase):
         return self._dimensions
 
 
+class CVFileCapture(CVCameraCapture):
+    '''
+    Capture frames from a video file instead of a camera, e.g., for testing
+    without camera hardware.
+
+    Arguments
+    ---------
+
+     - `source`: Path to video file.
+     - `loop`: Restart from the first frame when the end of the file is
+       reached.
+    '''
+    def __init__(self, source, loop=True, auto_init=False):
+        self.id = source
+        self.loop = loop
+        self.cap_config = CVCaptureConfig(source, type_='file')
+        self.cap = None
+        self.props = None
+        CameraCaptureBase.__init__(self, auto_init=auto_init)
+
+    def grab(self):
+        result = super(CVFileCapture, self).grab()
+        if not result and self.loop:
+            cv.SetCaptureProperty(self.cap, cv.CV_CAP_PROP_POS_FRAMES, 0)
+            result = super(CVFileCapture, self).grab()
+        return result
+
+
 class CAMVideoCapture(CameraCaptureBase):
     def __init__(self, id=None, auto_init=False):
         if id is None:
@@ -137,6 +270,8 @@ class CAMVideoCapture(CameraCaptureBase):
         else:
             self.id = id
         self.device = None
+        # Raw buffer of most recent `grab`.
+        self.buffer = None
         super(CAMVideoCapture, self).__init__(auto_init=auto_init)
 
     def _init_capture(self):
@@ -153,11 +288,22 @@ class CAMVideoCapture(CameraCaptureBase):
         if self.device:
             del self.device
 
-    def get_frame(self):
-        pi = self.device.getImage()
-        frame = cv.CreateImageHeader(pi.size, cv.IPL_DEPTH_8U, 3)
-        cv.SetData(frame, pi.tostring())
-        cv.CvtColor(frame, frame, cv.CV_RGB2BGR)
+    def grab(self):
+        self.buffer = self.device.getBuffer()
+        return bool(self.buffer[0])
+
+    def retrieve(self, out=None):
+        if self.buffer is None or not self.buffer[0]:
+            return None
+        buffer_, width, height = self.buffer
+        # Raw device buffer is BGR, bottom-up.
+        np_frame = np.frombuffer(buffer_, dtype='uint8')\
+            .reshape(height, width, 3)[::-1]
+        if out is not None:
+            out[:] = np_frame
+            return out
+        frame = cv.CreateImageHeader((width, height), cv.IPL_DEPTH_8U, 3)
+        cv.SetData(frame, np.ascontiguousarray(np_frame).tostring())
         return frame
 
     @property
@@ -0,0 +1,214 @@
+from __future__ import division
+from collections import namedtuple, deque
+import threading
+
+from pacing import monotonic
+
+
+# Request sent to a child process.  The child replies with a `Response`
+# with the same `id`.
+Command = namedtuple('Command', 'id name args')
+Response = namedtuple('Response', 'id name result')
+
+
+class ControlError(Exception):
+    pass
+
+
+class ChildDiedError(ControlError):
+    pass
+
+
+class ControlTimeout(ControlError):
+    pass
+
+
+def parse_command(message):
+    '''
+    Returns `(request_id, name, args)` for a `Command`, or for a plain
+    command message (e.g., `'start'` or `('ack', 2)`), in which case
+    `request_id` is `None` and no response is expected.
+    '''
+    if isinstance(message, Command):
+        return message
+    if isinstance(message, basestring):
+        return None, message, ()
+    return None, message[0], tuple(message[1:])
+
+
+def message_name(message):
+    if isinstance(message, basestring):
+        return message
+    return message[0]
+
+
+class ControlChannel(object):
+    '''
+    Parent end of the pipe to a child process, carrying both requests with
+    responses (see `request`) and unsolicited messages from the child (e.g.,
+    frames and heartbeats, see `poll` and `recv`).
+
+    All waits block on the pipe, up to a deadline, rather than polling.  A
+    wait raises `ChildDiedError` if `process` exits or the pipe is closed
+    before the expected message arrives, and `ControlTimeout` if the
+    deadline passes.
+
+    Several threads may wait at once; one reads the pipe and hands
+    responses to the others.
+
+    Arguments
+    ---------
+
+     - `conn`: `multiprocessing` connection to the child.
+     - `process`: Child process, checked for exit while waiting.
+     - `poll_interval`: Maximum time between checks of `process`.
+    '''
+    def __init__(self, conn, process=None, poll_interval=0.1):
+        self.conn = conn
+        self.process = process
+        self.poll_interval = poll_interval
+        self.pending = deque()
+        self.responses = {}
+        self.condition = threading.Condition()
+        self.send_lock = threading.Lock()
+        # `True` while one thread is reading from the pipe.
+        self.reading = False
+        self.next_id = 0
+        # Round trip times by command name: `[count, total, max, last]`.
+        self.round_trip_times = {}
+
+    def send(self, message):
+        '''
+        Send a message without waiting for a response.
+        '''
+        with self.send_lock:
+            self.conn.send(message)
+
+    def request(self, name, *args, **kwargs):
+        '''
+        Send command `name` and wait for the child's response.
+
+        Returns the result of the command.  Pass `timeout` (in seconds) as a
+        keyword argument to bound the wait.
+        '''
+        timeout = kwargs.pop('timeout', None)
+        with self.condition:
+            request_id = self.next_id
+            self.next_id += 1
+        start = monotonic()
+        self.send(Command(request_id, name, args))
+        response = self._wait(lambda: self.responses.pop(request_id, None),
+                              timeout)
+        round_trip_time = monotonic() - start
+        with self.condition:
+            times = self.round_trip_times.setdefault(name, [0, 0., 0., 0.])
+            times[0] += 1
+            times[1] += round_trip_time
+            times[2] = max(times[2], round_trip_time)
+            times[3] = round_trip_time
+        return response.result
+
+    def wait_for(self, name, timeout=None):
+        '''
+        Wait for an unsolicited message named `name` (e.g., `'ready'`) and
+        return it.  Other messages stay pending, in order.
+        '''
+        def _find():
+            for i, message in enumerate(self.pending):
+                if message_name(message) == name:
+                    del self.pending[i]
+                    return message
+
+        return self._wait(_find, timeout)
+
+    def poll(self, timeout=0):
+        '''
+        Returns `True` if an unsolicited message is available within
+        `timeout` seconds.
+        '''
+        try:
+            return self._wait(lambda: True if self.pending else None,
+                              timeout)
+        except ControlTimeout:
+            return False
+
+    def recv(self):
+        '''
+        Returns the oldest unsolicited message (see `poll`).
+        '''
+        with self.condition:
+            if self.pending:
+                return self.pending.popleft()
+        self.poll(None)
+        with self.condition:
+            return self.pending.popleft()
+
+    def clear(self, name=None):
+        '''
+        Discard pending messages and responses, or only pending messages named
+        `name`, if given (see `message_name`).
+        '''
+        with self.condition:
+            if name is not None:
+                self.pending = deque([message for message in self.pending
+                                      if message_name(message) != name])
+                return
+            self.pending.clear()
+            self.responses.clear()
+
+    def stats(self):
+        '''
+        Returns round trip time statistics, in seconds, by command name.
+        '''
+        with self.condition:
+            return dict([(name, dict(count=count, mean=total / count,
+                                     max=max_, last=last))
+                         for name, (count, total, max_, last)
+                         in self.round_trip_times.items()])
+
+    def _wait(self, find, timeout):
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            with self.condition:
+                result = find()
+                if result is not None:
+                    return result
+                if deadline is None:
+                    wait_time = self.poll_interval
+                else:
+                    remaining = max(deadline - monotonic(), 0)
+                    wait_time = min(remaining, self.poll_interval)
+                if self.reading:
+                    # Another thread is reading the pipe, and notifies us
+                    # of each message.
+                    if wait_time <= 0:
+                        raise ControlTimeout()
+                    self.condition.wait(wait_time)
+                    continue
+                self.reading = True
+            try:
+                received = self._read(wait_time)
+            finally:
+                with self.condition:
+                    self.reading = False
+                    self.condition.notify_all()
+            if not received and wait_time <= 0:
+                raise ControlTimeout()
+
+    def _read(self, timeout):
+        # Read at most one message, waiting up to `timeout` seconds.
+        try:
+            if not self.conn.poll(timeout):
+                if self.process is not None and not self.process.is_alive():
+                    raise ChildDiedError('Child process exited with code %s' %
+                                         self.process.exitcode)
+                return False
+            message = self.conn.recv()
+        except (EOFError, IOError), why:
+            raise ChildDiedError('Pipe to child process closed: %s' % why)
+        with self.condition:
+            if isinstance(message, Response):
+                self.responses[message.id] = message
+            else:
+                self.pending.append(message)
+        return True
@@ -0,0 +1,283 @@
+from __future__ import division
+import zlib
+
+import numpy as np
+
+from safe_cv import cv2
+from pacing import monotonic
+
+
+class LazyFrame(object):
+    '''
+    Encoded frame that is decoded the first time its pixels are accessed,
+    e.g., through `np.asarray(frame)`, indexing or any `numpy.ndarray`
+    attribute other than `shape` and `dtype`.
+
+    Decoded pixels are read-only and kept for subsequent accesses.  The
+    encoded data is immutable, so `copy` returns the frame itself.
+    '''
+    def __init__(self, decode, shape, dtype):
+        self._decode = decode
+        self._array = None
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def decoded(self):
+        return self._array is not None
+
+    def decode(self):
+        if self._array is None:
+            self._array = self._decode()
+            self._array.flags.writeable = False
+            # Release encoded data (and, for delta frames, the previous
+            # frame).
+            self._decode = None
+        return self._array
+
+    def copy(self):
+        return self
+
+    def __array__(self, dtype=None):
+        if dtype is None:
+            return self.decode()
+        return self.decode().astype(dtype)
+
+    def __getitem__(self, key):
+        return self.decode()[key]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.decode(), name)
+
+
+class FrameCodecBase(object):
+    '''
+    Encode frames in the `FrameGrabberChild` process and decode them in the
+    parent.
+
+    `encode` returns `(header, data)`, where `data` is a 1-D `uint8` array
+    sent through the frame transport and `header` is a small picklable
+    object sent with it.  `decode` returns a `LazyFrame`, except for
+    `RawFrameCodec`.
+
+    `stream` identifies a sequence of frames, e.g., the transform applied
+    to the frames (see `frame_transform.FrameTransform`).  It only matters
+    for codecs that refer to previous frames.
+
+    Encoding statistics are counted in the child and copied to the parent
+    codec with each frame (see `encode_counts`).
+    '''
+    name = None
+
+    def __init__(self):
+        self.frames_encoded = 0
+        self.raw_bytes = 0
+        self.encoded_bytes = 0
+        self.encode_time = 0
+        self.frames_decoded = 0
+        self.decode_time = 0
+
+    def encode(self, np_frame, stream=None):
+        start = monotonic()
+        header, data = self._encode(np_frame, stream)
+        self.encode_time += monotonic() - start
+        self.frames_encoded += 1
+        self.raw_bytes += np_frame.nbytes
+        self.encoded_bytes += data.nbytes
+        return header, data
+
+    def decode(self, header, data, stream=None, copy=False):
+        '''
+        Arguments
+        ---------
+
+         - `header`, `data`: As returned by `encode`.
+         - `stream`: As passed to `encode`.
+         - `copy`: `data` is only valid during this call (e.g., a view into a
+           shared memory ring), so copy it if decoding is deferred.
+        '''
+        if copy:
+            data = data.copy()
+        shape, dtype = header[:2]
+
+        def _decode():
+            start = monotonic()
+            np_frame = self._decode(header, data)
+            self.decode_time += monotonic() - start
+            self.frames_decoded += 1
+            return np_frame
+
+        return LazyFrame(_decode, shape, dtype)
+
+    def encode_counts(self):
+        return (self.frames_encoded, self.raw_bytes, self.encoded_bytes,
+                self.encode_time)
+
+    def set_encode_counts(self, counts):
+        (self.frames_encoded, self.raw_bytes, self.encoded_bytes,
+         self.encode_time) = counts
+
+    def stats(self):
+        '''
+        Returns throughput, time per frame and compression ratio of encoding
+        (in the child) and decoding (in the parent).
+        '''
+        def _per_frame(duration, count):
+            return duration / count if count else None
+
+        return dict(codec=self.name, frames_encoded=self.frames_encoded,
+                    raw_bytes=self.raw_bytes,
+                    encoded_bytes=self.encoded_bytes,
+                    compression_ratio=self.raw_bytes / self.encoded_bytes
+                    if self.encoded_bytes else None,
+                    encode_time_per_frame=_per_frame(self.encode_time,
+                                                     self.frames_encoded),
+                    encode_bytes_per_second=self.raw_bytes / self.encode_time
+                    if self.encode_time else None,
+                    frames_decoded=self.frames_decoded,
+                    decode_time_per_frame=_per_frame(self.decode_time,
+                                                     self.frames_decoded))
+
+    def _encode(self, np_frame, stream):
+        raise NotImplementedError
+
+    def _decode(self, header, data):
+        raise NotImplementedError
+
+
+class RawFrameCodec(FrameCodecBase):
+    '''
+    Send pixels unchanged (default).  Frames are decoded immediately, i.e.,
+    `decode` returns the frame array itself.
+    '''
+    name = 'raw'
+
+    def _encode(self, np_frame, stream):
+        return None, np_frame
+
+    def decode(self, header, data, stream=None, copy=False):
+        self.frames_decoded += 1
+        return data
+
+
+class ImageFrameCodec(FrameCodecBase):
+    '''
+    Compress each frame as an image file, using `cv2.imencode`.
+
+    Arguments
+    ---------
+
+     - `extension`: Image format, e.g., `'.jpg'` or `'.png'`.
+     - `params`: Encoder parameters, e.g., `[cv2.IMWRITE_JPEG_QUALITY, 80]`.
+    '''
+    def __init__(self, extension, params=None):
+        self.extension = extension
+        self.params = params or []
+        super(ImageFrameCodec, self).__init__()
+
+    def _encode(self, np_frame, stream):
+        result, data = cv2.imencode(self.extension, np_frame, self.params)
+        if not result:
+            raise ValueError('Could not encode frame as %s' % self.extension)
+        return (np_frame.shape, np_frame.dtype.str), data.ravel()
+
+    def _decode(self, header, data):
+        # Flag -1: Keep channels and depth of encoded image.
+        return cv2.imdecode(data, -1).reshape(header[0])
+
+
+class JPEGFrameCodec(ImageFrameCodec):
+    '''
+    Lossy JPEG compression at `quality` (0-100).
+    '''
+    name = 'jpeg'
+
+    def __init__(self, quality=90):
+        self.quality = quality
+        super(JPEGFrameCodec, self).__init__('.jpg',
+                                             [cv2.IMWRITE_JPEG_QUALITY,
+                                              quality])
+
+
+class PNGFrameCodec(ImageFrameCodec):
+    '''
+    Lossless PNG compression at `compression` level (0-9).
+    '''
+    name = 'png'
+
+    def __init__(self, compression=1):
+        self.compression = compression
+        super(PNGFrameCodec, self).__init__('.png',
+                                            [cv2.IMWRITE_PNG_COMPRESSION,
+                                             compression])
+
+
+class DeltaFrameCodec(FrameCodecBase):
+    '''
+    Lossless compression of the difference to the previous frame of the same
+    stream, using `zlib`.  Mostly static scenes compress well.
+
+    Every `keyframe_interval` frames, the frame itself is compressed instead,
+    which bounds the number of previous frames decoded to access one frame.
+
+    Every encoded frame must be passed to `decode`, in order.
+    '''
+    name = 'delta'
+
+    def __init__(self, keyframe_interval=30, level=1):
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        # Previous frame and frames since key frame, by stream (child).
+        self.encode_state = {}
+        # Previous `LazyFrame`, by stream (parent).
+        self.decode_state = {}
+        super(DeltaFrameCodec, self).__init__()
+
+    def _encode(self, np_frame, stream):
+        previous, count = self.encode_state.get(stream, (None, 0))
+        keyframe = previous is None or previous.shape != np_frame.shape or \
+            count >= self.keyframe_interval
+        if keyframe:
+            data = np_frame
+            count = 0
+        else:
+            # `uint8` subtraction wraps around, and is undone by addition.
+            data = np_frame - previous
+        self.encode_state[stream] = (np_frame.copy(), count + 1)
+        data = zlib.compress(np.ascontiguousarray(data).tostring(),
+                             self.level)
+        return ((np_frame.shape, np_frame.dtype.str, keyframe),
+                np.frombuffer(data, dtype='uint8'))
+
+    def decode(self, header, data, stream=None, copy=False):
+        keyframe = header[2]
+        previous = None if keyframe else self.decode_state.get(stream)
+        if not keyframe and previous is None:
+            raise ValueError('Delta frame received without previous frame.')
+        if copy:
+            data = data.copy()
+        shape, dtype = header[:2]
+
+        def _decode():
+            start = monotonic()
+            np_frame = np.frombuffer(zlib.decompress(data.tostring()),
+                                     dtype=dtype).reshape(shape)
+            duration = monotonic() - start
+            if previous is not None:
+                # Previous frame is decoded (and timed) separately.
+                base = previous.decode()
+                start = monotonic()
+                np_frame = np_frame + base
+                duration += monotonic() - start
+            self.decode_time += duration
+            self.frames_decoded += 1
+            return np_frame
+
+        frame = LazyFrame(_decode, shape, dtype)
+        self.decode_state[stream] = frame
+        return frame
@@ -0,0 +1,1047 @@
+"""
+Copyright 2012 Ryan Fobel and Christian Fobel
+
+This file is part of Microdrop.
+
+Microdrop is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Microdrop is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Microdrop.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import division
+import multiprocessing
+from collections import namedtuple, deque, OrderedDict
+from datetime import datetime
+import logging
+import threading
+
+from path_helpers import path
+import numpy as np
+
+from video import cv
+from frame_transport import PickleFrameTransport
+from frame_codec import RawFrameCodec
+from control import (ControlChannel, ControlError, Response, message_name,
+                     parse_command)
+from pacing import DeadlineScheduler, monotonic
+from frame_subscription import FrameSubscription
+from frame_stats import FrameInfo, FrameLatencyStats
+
+
+class CVCaptureConfig(object):
+    type_names = ('camera', 'file')
+    types = namedtuple('CVCaptureTypes', type_names)(**dict([(n, i) for i, n in enumerate(type_names)]))
+
+    def __init__(self, source, type_=None):
+        self.source = source
+        if type_ is None:
+            type_ = self.types.camera
+        elif type_ not in self.types:
+            type_ = type_.strip()
+            if not type_ in self.types._fields:
+                raise ValueError, 'Invalid type: %s' % type_
+            else:
+                type_ = getattr(self.types, type_)
+        self.type_ = type_
+
+    def create_capture(self):
+        if self.type_ == self.types.camera:
+            cap = cv.CaptureFromCAM(self.source)
+        elif self.type_ == self.types.file:
+            source_path = path(self.source).abspath()
+            if not source_path.exists():
+                raise IOError, 'Capture source path is not accessible: %s' % source_path.abspath()
+            cap = cv.CaptureFromFile(self.source)
+        else:
+            raise ValueError, 'Unsupported capture type: %s' % self.type_
+        return cap
+
+    def test_capture(self):
+        cap = self.create_capture()
+        result = cv.GrabFrame(cap)
+        del cap
+        return (result == 0)
+
+
+class FrameSender(object):
+    '''
+    Send frames from the child process to the parent.
+
+    At most `transport.max_in_flight` frames are sent without being
+    acknowledged by the parent.  With the `'latest'` and `'queue'` policies,
+    frames are sent from a background thread and wait in a bounded queue
+    until the parent catches up, so a slow parent never blocks capture.
+    When the queue is full:
+
+     - `'latest'`: The queued frame is replaced by the newest frame.
+     - `'queue'`: The oldest of up to `queue_length` queued frames is
+       dropped.
+
+    With the `'block'` policy, frames are sent synchronously by the capture
+    loop, which waits for the parent to acknowledge (see
+    `FrameGrabberChild.main`).
+
+    Frames are not copied, so a frame buffer passed to `put` must not be
+    reused until `queue_length + 1` more frames have been put (see
+    `camera_capture.FramePool`).
+
+    If a frame cannot be sent (e.g., a transform or the codec fails), the
+    error is logged, `error` is set and no further frames are sent.
+
+    Each frame is sent once per transform in `transforms` (see
+    `frame_transform.FrameTransform`), where `None` is the full frame.
+    Transforms are applied as frames are sent, so dropped frames are never
+    transformed.  Each transformed frame is then encoded by `codec` (see
+    `frame_codec`).
+    '''
+    POLICIES = ('latest', 'queue', 'block')
+
+    def __init__(self, conn, transport, policy='latest', queue_length=4,
+                 codec=None):
+        if policy not in self.POLICIES:
+            raise ValueError('Invalid delivery policy: %s' % policy)
+        if codec is None:
+            codec = RawFrameCodec()
+        self.codec = codec
+        self.conn = conn
+        self.transport = transport
+        self.policy = policy
+        self.queue_length = 1 if policy == 'latest' else queue_length
+        self.frames = deque()
+        self.credits = transport.max_in_flight
+        self.produced = 0
+        self.dropped = 0
+        self.condition = threading.Condition()
+        # Serializes messages sent from the capture loop and from the sender
+        # thread.
+        self.send_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        # Description of the error that stopped sending, or `None`.
+        self.error = None
+        self.transforms = (None, )
+        # Output buffers of transforms, reused since frames are packed by
+        # the transport before the next frame is transformed.
+        self.transform_buffers = {}
+
+    def start(self):
+        self.running = True
+        if self.policy == 'block':
+            return
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def put(self, np_frame, grab_time, info):
+        '''
+        Arguments
+        ---------
+
+         - `np_frame`: Frame array.
+         - `grab_time`: `datetime` when frame was grabbed.
+         - `info`: `(sequence, grab_start, grab_end)` tuple (see
+           `frame_stats.FrameInfo`).
+        '''
+        with self.condition:
+            self.produced += 1
+            if self.policy == 'block':
+                self.credits -= 1
+                counts = (self.produced, self.dropped)
+            else:
+                if len(self.frames) >= self.queue_length:
+                    self.frames.popleft()
+                    self.dropped += 1
+                self.frames.append((np_frame, grab_time, info))
+                self.condition.notify_all()
+                return
+        self._send(np_frame, grab_time, info, counts)
+
+    def ack(self, count):
+        with self.condition:
+            self.credits += count
+            self.condition.notify_all()
+
+    def send_message(self, message):
+        with self.send_lock:
+            self.conn.send(message)
+
+    def set_transforms(self, transforms):
+        with self.send_lock:
+            self.transforms = tuple(transforms) or (None, )
+            self.transform_buffers = {}
+
+    def _transform(self, np_frame, transform):
+        if transform is None:
+            return np_frame
+        key = (transform, np_frame.shape)
+        if key not in self.transform_buffers:
+            self.transform_buffers[key] = \
+                np.empty(transform.output_shape(np_frame.shape),
+                         dtype=np_frame.dtype)
+        return transform.apply(np_frame, out=self.transform_buffers[key])
+
+    def _send(self, np_frame, grab_time, info, counts):
+        '''
+        Returns `False` if the frame could not be sent (see `error`).
+        '''
+        with self.send_lock:
+            if self.error is not None:
+                return False
+            try:
+                transforms = self.transforms
+                encoded = [self.codec.encode(self._transform(np_frame, t), t)
+                           for t in transforms]
+                payload = self.transport.pack_frames([data for header, data
+                                                      in encoded])
+                self.conn.send(['frame', payload, grab_time, counts,
+                                info + (monotonic(), ), transforms,
+                                [header for header, data in encoded],
+                                self.codec.encode_counts()])
+            except Exception, exception:
+                logging.getLogger('opencv.frame_grabber').exception(
+                    'Error sending frame.')
+                self.error = '%s: %s' % (type(exception).__name__,
+                                         exception)
+                return False
+        return True
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not (self.frames and
+                                            self.credits > 0):
+                    self.condition.wait()
+                if not self.running:
+                    return
+                np_frame, grab_time, info = self.frames.popleft()
+                self.credits -= 1
+                counts = (self.produced, self.dropped)
+            if not self._send(np_frame, grab_time, info, counts):
+                # Reported by the capture loop (see `FrameGrabberChild`).
+                return
+
+
+class FrameGrabberChild(object):
+    STATES = dict(RECORDING=10, STOPPED=20, EXITING=30)
+
+    def __init__(self, conn, cam_cap, transport=None, policy='latest',
+                 queue_length=4, heartbeat_interval=1.,
+                 watchdog_timeout=None, codec=None):
+        # Startup phase durations, reported to the parent with `'ready'`.
+        self.startup = dict(process_start=monotonic())
+        self.conn = conn
+        self.heartbeat_interval = heartbeat_interval
+        self.watchdog_timeout = watchdog_timeout
+        self.cam_cap = cam_cap
+        if transport is None:
+            transport = PickleFrameTransport()
+        self.transport = transport
+        self.sender = FrameSender(conn, transport, policy, queue_length,
+                                  codec)
+        start = monotonic()
+        try:
+            self.cam_cap.init_capture()
+            # Enough buffers for every queued frame, plus the frame being
+            # sent and the frame being captured.
+            self.frame_pool = \
+                self.cam_cap.create_frame_pool(self.sender.queue_length + 2)
+        except:
+            self.cam_cap = None
+        self.startup['init_capture'] = monotonic() - start
+        self.fps_limit = 10.
+        self.state = self.STATES['STOPPED']
+        self.scheduler = None
+        self.start_time = None
+        self.stop_time = None
+        self.watch_time = None
+        self.stop_request = None
+
+    def _handle_command(self, message):
+        request_id, command, args = parse_command(message)
+        if command == 'reset_watchdog':
+            self.watch_time = datetime.now()
+        elif command == 'stop':
+            logging.getLogger('opencv.frame_grabber')\
+                    .info('stop recording')
+            self.state = self.STATES['EXITING']
+            self.stop_time = datetime.now()
+            # Results are sent in response, once capture has stopped.
+            self.stop_request = request_id
+            return
+        elif command == 'start':
+            logging.getLogger('opencv.frame_grabber').info('recording')
+            self.state = self.STATES['RECORDING']
+            self.watch_time = datetime.now()
+            if self.start_time is None:
+                self.start_time = datetime.now()
+        elif command == 'pause':
+            logging.getLogger('opencv.frame_grabber').info('paused')
+            self.state = self.STATES['STOPPED']
+        elif command == 'ack':
+            self.sender.ack(args[0])
+        elif command == 'set_fps_limit':
+            logging.getLogger('opencv.frame_grabber')\
+                    .debug('setting fps_limit: %s' % args[0])
+            if args[0] > 0:
+                self.fps_limit = args[0]
+                self.scheduler.set_fps(self.fps_limit)
+        elif command == 'sync_clock':
+            # Align capture deadlines to a `monotonic()` start time shared
+            # with other grabbers.
+            self.scheduler.reset(args[0])
+        elif command == 'set_transforms':
+            self.sender.set_transforms(args[0])
+        if request_id is not None:
+            self.sender.send_message(Response(request_id, command, None))
+
+    def main(self):
+        self.startup['ready_time'] = monotonic()
+        self.conn.send(('ready', self.startup))
+        self.sender.start()
+
+        frames_captured = 0
+        self.watch_time = datetime.now()
+        self.scheduler = DeadlineScheduler(self.fps_limit)
+        heartbeat_time = None
+        while True:
+            now = datetime.now()
+            if self.watchdog_timeout is not None and \
+                    self.start_time is not None and \
+                    (now - self.watch_time).total_seconds() > \
+                    self.watchdog_timeout:
+                # No watchdog reset within timeout.  Assume that main
+                # thread is gone.
+                logging.getLogger('opencv.frame_grabber').warning(
+                    'No watchdog reset in the last %s seconds.  Assume that '
+                    'main thread is gone.' % self.watchdog_timeout)
+                self.sender.stop()
+                return
+            timestamp = monotonic()
+            if heartbeat_time is None or \
+                    timestamp - heartbeat_time >= self.heartbeat_interval:
+                # Let the parent know the capture loop is not hung.
+                self.sender.send_message(('heartbeat', timestamp))
+                heartbeat_time = timestamp
+            if self.conn.poll():
+                self._handle_command(self.conn.recv())
+            if self.state == self.STATES['EXITING']:
+                break
+            if self.sender.error is not None:
+                # Frames can no longer be sent to the parent.
+                self.sender.send_message(('error', self.sender.error))
+                break
+            if self.sender.policy == 'block':
+                # Wait until parent has acknowledged enough frames to send
+                # another one.
+                while self.sender.credits <= 0 and\
+                        self.state == self.STATES['RECORDING']:
+                    if self.conn.poll(max(heartbeat_time +
+                                          self.heartbeat_interval -
+                                          monotonic(), 0)):
+                        self._handle_command(self.conn.recv())
+                    else:
+                        # Parent is behind, but capture is not hung.
+                        heartbeat_time = monotonic()
+                        self.sender.send_message(('heartbeat',
+                                                  heartbeat_time))
+            if self.cam_cap is not None\
+                    and self.state == self.STATES['RECORDING']:
+                grab_time = datetime.now()
+                grab_start = monotonic()
+                np_frame = self.cam_cap.get_frame(out=self.frame_pool.next())
+                if np_frame is not None:
+                    self.sender.put(np_frame, grab_time,
+                                    (frames_captured, grab_start,
+                                     monotonic()))
+                    frames_captured += 1
+            elif self.cam_cap is not None:
+                # Paused: keep driver queue fresh, so the first frame after
+                # resuming is current, without decoding frames.
+                self.cam_cap.grab()
+            # Handle commands as soon as they arrive, rather than once per
+            # frame period.
+            while self.state != self.STATES['EXITING'] and \
+                    self.conn.poll(self.scheduler.remaining()):
+                self._handle_command(self.conn.recv())
+            if self.state == self.STATES['EXITING']:
+                break
+            self.scheduler.wait()
+        self.sender.stop()
+        results = dict(frames_captured=frames_captured,
+                       start_time=self.start_time, stop_time=self.stop_time,
+                       frames_dropped=self.sender.dropped,
+                       error=self.sender.error)
+        results.update(self.scheduler.stats())
+        if self.stop_request is None:
+            self.conn.send(('results', results))
+        else:
+            self.conn.send(Response(self.stop_request, 'stop', results))
+
+
+class FrameGrabberCore(object):
+    '''
+    Capture frames in a child process, without any GUI toolkit dependency.
+
+    Frames are only read from the pipe when `receive_frames` (or
+    `dispatch_frames`) is called; see `frame_grabber.FrameGrabber` for a
+    GTK frontend and `ThreadedFrameGrabber` for a headless frontend.
+
+    Arguments
+    ---------
+
+     - `cam_cap`: Camera capture (see `camera_capture.CameraCaptureBase`).
+     - `auto_init`: Launch child process immediately.
+     - `transport`: Frame transport from child to parent process (default:
+       `frame_transport.PickleFrameTransport`).  Use
+       `frame_transport.SharedMemoryFrameTransport` to avoid pickling frames.
+     - `policy`: What the child does with new frames while the parent is
+       behind: `'latest'` (default), `'queue'` or `'block'` (see
+       `FrameSender`).
+     - `queue_length`: Number of frames queued in the child for the
+       `'queue'` policy.
+     - `watchdog_timeout`: If set, the child exits when it has not heard
+       from the parent for this many seconds (frontends reset the watchdog
+       every 2.5 s).
+     - `codec`: Encoding of frames sent by the child (see `frame_codec`;
+       default: `frame_codec.RawFrameCodec`).  Other codecs deliver
+       `frame_codec.LazyFrame` objects, which are decoded when their pixels
+       are first accessed.
+     - `prewarm`: Keep an idle child process with its capture initialized,
+       waiting for `start`.  The child is launched in the background by the
+       constructor and again after each `stop` (use `close` to stop without
+       launching another child).  See `startup` for startup phase times.
+     - `control_timeout`: Maximum time, in seconds, to wait for the child to
+       be ready or to stop.  `control.ChildDiedError` is raised if the child
+       exits before, and `control.ControlTimeout` if it does not respond in
+       time.
+     - `transform`: Reduction applied in the child to frames returned by
+       `receive_frames` and passed to `frame_callback` (see
+       `frame_transform.FrameTransform`; default: full frames).  Each
+       subscription may request its own transform (see `subscribe`).
+
+    See `frame_grabber_supervisor.FrameGrabberSupervisor` to restart a
+    stalled child automatically.
+    '''
+    # Seconds between heartbeats of an idle child (see `FrameGrabberChild`).
+    HEARTBEAT_INTERVAL = 1.
+
+    def __init__(self, cam_cap, auto_init=False, transport=None,
+                 policy='latest', queue_length=4, watchdog_timeout=None,
+                 transform=None, codec=None, prewarm=False,
+                 control_timeout=30.):
+        if policy not in FrameSender.POLICIES:
+            raise ValueError('Invalid delivery policy: %s' % policy)
+        self.policy = policy
+        if codec is None:
+            codec = RawFrameCodec()
+        self.codec = codec
+        self.transform = transform
+        self.queue_length = queue_length
+        self.watchdog_timeout = watchdog_timeout
+        self.fps_limit = None
+        self.paused = False
+        self.child_ready = False
+        # Parent `monotonic()` times of last heartbeat and last frame
+        # received from the child.
+        self.last_heartbeat = None
+        self.last_frame_received = None
+        # Error that stopped the child from sending frames (see
+        # `FrameSender`), raised by `stop`.
+        self.child_error = None
+        self.cam_cap = cam_cap
+        if transport is None:
+            transport = PickleFrameTransport()
+        self.transport = transport
+        self.conn, self.child_conn = multiprocessing.Pipe()
+        self.channel = ControlChannel(self.conn)
+        self.control_timeout = control_timeout
+        self.enabled = False
+        self.child = None
+        self.last_result = None
+        self.current_frame = None
+        self.current_time = None
+        # Metadata of current frame (see `frame_stats.FrameInfo`).
+        self.current_info = None
+        self.latency_stats = FrameLatencyStats()
+        self.frame_callback = None
+        self.subscriptions = []
+        # Frames produced and dropped by the child, as of the most recently
+        # received frame, and by previous children (e.g., restarted by a
+        # `frame_grabber_supervisor.FrameGrabberSupervisor`).
+        self.frames_produced = 0
+        self.frames_dropped_child = 0
+        self.frames_produced_previous = 0
+        self.frames_dropped_child_previous = 0
+        # Frames received from the child, but superseded by a newer frame
+        # before `frame_callback` was called.
+        self.frames_dropped_parent = 0
+        self.frames_delivered = 0
+        # Pixel data received from the child, over all transforms.
+        self.bytes_received = 0
+        self.prewarm = prewarm
+        # Startup phase durations of the most recent child that became
+        # ready, in seconds (kept after `stop`, until the next child is
+        # ready, e.g., while a prewarmed child initializes):
+        #
+        #  - `spawn`: From launching the child process until the child runs.
+        #  - `init_capture`: Capture device initialization in the child.
+        #  - `ready`: From launching the child until it is ready.
+        #  - `start_to_first_frame`: From `start` until the first frame is
+        #    received.
+        self.startup = {}
+        self.spawn_time = None
+        self.start_request_time = None
+        if auto_init:
+            self.child = self._launch_child()
+        elif prewarm:
+            self.child = self._spawn_child()
+
+    def _send(self, message):
+        self.channel.send(message)
+
+    def _request(self, command, timeout=None):
+        '''
+        Send `command` and wait for the child to respond.  Frames and
+        heartbeats read from the pipe meanwhile are left pending in
+        `channel`, to be read by `receive_frames`.
+        '''
+        return self.channel.request(command, timeout=timeout)
+
+    def _launch_child(self):
+        p = self._spawn_child()
+        self._wait_ready()
+        self._replay_settings()
+        return p
+
+    def _spawn_child(self):
+        # Counts of the new child start from zero.
+        self.frames_produced_previous += self.frames_produced
+        self.frames_dropped_child_previous += self.frames_dropped_child
+        self.frames_produced = 0
+        self.frames_dropped_child = 0
+        self.child_ready = False
+        self.spawn_time = monotonic()
+        p = multiprocessing.Process(target=self._start_child)
+        # An idle prewarmed child must not keep the application from exiting.
+        p.daemon = self.prewarm
+        p.start()
+        self.channel.process = p
+        return p
+
+    def _on_ready(self, phases):
+        self.child_ready = True
+        self.last_heartbeat = monotonic()
+        self.startup = dict(spawn=phases['process_start'] - self.spawn_time,
+                            init_capture=phases['init_capture'],
+                            ready=phases['ready_time'] - self.spawn_time)
+
+    def _on_child_error(self, error):
+        logging.getLogger('opencv.frame_grabber').error(
+            'FrameGrabberChild stopped sending frames: %s' % error)
+        self.child_error = error
+
+    def _wait_ready(self):
+        response = self.channel.wait_for('ready', timeout=self.control_timeout)
+        self._on_ready(response[1])
+        logging.getLogger('opencv.frame_grabber').info('FrameGrabberChild is ready')
+
+    def _start_child(self):
+        child = FrameGrabberChild(self.child_conn, self.cam_cap,
+                                  self.transport, self.policy,
+                                  self.queue_length,
+                                  heartbeat_interval=self.HEARTBEAT_INTERVAL,
+                                  watchdog_timeout=self.watchdog_timeout,
+                                  codec=self.codec)
+        child.main()
+
+    def _add_delivery_source(self):
+        '''
+        Called by `start` to begin reading frames; overridden by frontends.
+        '''
+        pass
+
+    def _remove_delivery_source(self):
+        '''
+        Called by `stop` to stop reading frames; overridden by frontends.
+        '''
+        pass
+
+    def _terminate_child(self):
+        '''
+        Kill the child process (e.g., hung in the capture driver) and replace
+        the pipe, discarding any messages still in it.
+        '''
+        if self.child is not None:
+            if self.child.is_alive():
+                self.child.terminate()
+            self.child.join(1.)
+        self.child = None
+        self.child_ready = False
+        if self.enabled:
+            self._remove_delivery_source()
+        self.conn.close()
+        self.child_conn.close()
+        self.conn, self.child_conn = multiprocessing.Pipe()
+        self.channel = ControlChannel(self.conn)
+        if self.enabled:
+            self._add_delivery_source()
+
+    def _respawn_child(self):
+        '''
+        Launch a new child without waiting for it to become ready
+        (`child_ready` is set once its `'ready'` message is received).
+        '''
+        self.child = self._spawn_child()
+
+    def _replay_settings(self):
+        '''
+        Send settings made before the child was ready (or to a previous
+        child) to a child that has just become ready.
+        '''
+        if self.fps_limit is not None:
+            self._send(('set_fps_limit', self.fps_limit))
+        self._send(('set_transforms', self.transforms))
+
+    def _resume_child(self):
+        '''
+        Restore settings of a respawned child and resume grabbing.
+        '''
+        self._replay_settings()
+        if self.enabled and not self.paused:
+            self._send('start')
+
+    def _reset_watchdog(self):
+        if self.child is None:
+            # Keep timer running while a supervised child is restarted.
+            return self.enabled
+        self._send('reset_watchdog')
+        return True
+
+    @property
+    def transforms(self):
+        '''
+        Distinct transforms requested by the grabber and its subscriptions.
+        '''
+        transforms = [self.transform]
+        for subscription in self.subscriptions:
+            if subscription.transform not in transforms:
+                transforms.append(subscription.transform)
+        return tuple(transforms)
+
+    def _update_transforms(self):
+        if self.child is None:
+            return
+        self._send(('set_transforms', self.transforms))
+
+    def set_transform(self, transform):
+        '''
+        Set transform of frames returned by `receive_frames` and passed to
+        `frame_callback` (see `frame_transform.FrameTransform`).
+        '''
+        self.transform = transform
+        self._update_transforms()
+
+    def receive_frames(self):
+        '''
+        Read all frames waiting in the pipe.
+
+        Returns a list of `(frame, grab_time, info)` tuples, oldest first,
+        where `info` is a `frame_stats.FrameInfo`.  `current_frame`,
+        `current_time` and `current_info` are set from the newest frame.
+
+        Frames have the grabber `transform` applied, except frames sent
+        before a change of transforms reached the child, which may be
+        transformed differently.
+
+        With a zero copy transport, frames are copied out of the transport
+        before they are acknowledged, so they stay valid.
+        '''
+        received = self._receive()
+        try:
+            frames = [(self._select(variants, self.transform), grab_time,
+                       info) for variants, grab_time, info in received]
+            if self.transport.zero_copy:
+                frames = [(frame.copy(), grab_time, info)
+                          for frame, grab_time, info in frames]
+            return frames
+        finally:
+            self._ack(received)
+
+    def _select(self, variants, transform):
+        if transform in variants:
+            return variants[transform]
+        # Sent before child received current transforms: prefer the full
+        # frame, otherwise the first transform requested.
+        if None in variants:
+            return variants[None]
+        return next(iter(variants.values()))
+
+    def _ack(self, received):
+        # Return credits to child so it may send more frames.  Frames of a
+        # zero copy transport are reused by the child once acknowledged.
+        if received:
+            self._send(('ack', len(received)))
+
+    def _receive(self):
+        # Returns list of `(variants, grab_time, info)`, where `variants`
+        # maps each transform to a frame.
+        frames = []
+        while self.enabled:
+            try:
+                if not self.channel.poll():
+                    break
+                message = self.channel.recv()
+            except ControlError:
+                # Child is gone.
+                break
+            if message[0] == 'ready':
+                self._on_ready(message[1])
+            elif message[0] == 'heartbeat':
+                self.last_heartbeat = monotonic()
+            elif message[0] == 'error':
+                self._on_child_error(message[1])
+            elif message[0] == 'frame':
+                (payload, grab_time, counts, info, transforms, headers,
+                 codec_counts) = message[1:8]
+                self.frames_produced, self.frames_dropped_child = counts
+                info = FrameInfo(*(info + (monotonic(), )))
+                self.latency_stats.add(info)
+                self.codec.set_encode_counts(codec_counts)
+                encoded = self.transport.unpack_frames(payload)
+                self.bytes_received += sum(data.nbytes for data in encoded)
+                # Decoded on first access (except raw frames).
+                variants = [self.codec.decode(header, data, transform,
+                                              copy=self.transport.zero_copy)
+                            for header, data, transform
+                            in zip(headers, encoded, transforms)]
+                frames.append((OrderedDict(zip(transforms, variants)),
+                               grab_time, info))
+        if frames:
+            self.last_frame_received = monotonic()
+            if self.start_request_time is not None:
+                self.startup['start_to_first_frame'] = \
+                    self.last_frame_received - self.start_request_time
+                self.start_request_time = None
+            variants, self.current_time, self.current_info = frames[-1]
+            self.current_frame = self._select(variants, self.transform)
+        return frames
+
+    def dispatch_frames(self):
+        '''
+        Read all frames waiting in the pipe and publish them to
+        subscriptions and `frame_callback` (newest frame only).
+
+        Returns the list of frames received (see `receive_frames`).  With a
+        zero copy transport, frames are only valid until the next call.
+        '''
+        received = self._receive()
+        try:
+            if received:
+                self._publish(received)
+            return [(self._select(variants, self.transform), grab_time,
+                     info) for variants, grab_time, info in received]
+        finally:
+            # Only once published, since subscribers copy frames of a zero
+            # copy transport as they are published.
+            self._ack(received)
+
+    def _publish(self, received):
+        '''
+        Publish frames to subscriptions and `frame_callback`; extended by
+        frontends.  Frames are acknowledged to the child once this returns.
+        '''
+        self.frames_dropped_parent += len(received) - 1
+        self.frames_delivered += 1
+        for variants, grab_time, info in received:
+            for frame in variants.values():
+                if isinstance(frame, np.ndarray):
+                    # Frames are shared by all subscribers.
+                    frame.flags.writeable = False
+        for subscription in self.subscriptions:
+            subscription.publish([(self._select(variants,
+                                                subscription.transform),
+                                   grab_time, info)
+                                  for variants, grab_time, info in received],
+                                 copy=self.transport.zero_copy)
+        if self.frame_callback:
+            self.frame_callback(self.current_frame, self.current_time)
+
+    def subscribe(self, callback, fps_limit=None, policy='sync',
+                  queue_length=4, transform=None):
+        '''
+        Register an additional frame consumer.  Frames are captured and
+        transferred once, regardless of the number of subscriptions.
+
+        See `frame_subscription.FrameSubscription` for arguments.  Set the
+        grabber `fps_limit` to at least the highest subscription rate.
+
+        If `transform` is set (see `frame_transform.FrameTransform`), the
+        child sends a reduced copy of each frame for this subscription,
+        shared with other subscriptions requesting an equal transform.
+        '''
+        subscription = FrameSubscription(callback, fps_limit, policy,
+                                         queue_length, transform)
+        self.subscriptions.append(subscription)
+        self._update_transforms()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+            self._update_transforms()
+        subscription.close()
+
+    def stats(self):
+        '''
+        Returns frame counts (see `frame_counts`), rolling per-stage
+        latency percentiles and sequence gap counts (see
+        `frame_stats.FrameLatencyStats`), bytes received, codec statistics
+        (see `frame_codec.FrameCodecBase.stats`), startup phase times (see
+        `startup`) and control command round trip times (see
+        `control.ControlChannel.stats`).
+        '''
+        stats = self.latency_stats.summary()
+        stats.update(counts=self.frame_counts,
+                     bytes_received=self.bytes_received,
+                     startup=self.startup,
+                     control=self.channel.stats(),
+                     codec=self.codec.stats())
+        return stats
+
+    @property
+    def frame_counts(self):
+        '''
+        Returns frame counts over all child processes.
+        '''
+        dropped_child = self.frames_dropped_child_previous + \
+            self.frames_dropped_child
+        return dict(produced=self.frames_produced_previous +
+                    self.frames_produced,
+                    delivered=self.frames_delivered,
+                    dropped=dropped_child + self.frames_dropped_parent,
+                    dropped_child=dropped_child,
+                    dropped_parent=self.frames_dropped_parent)
+
+    def ping(self, timeout=None):
+        '''
+        Returns round trip time of a command to the child, in seconds.  The
+        child handles commands between frames, so this is at most about one
+        frame period while capturing.
+        '''
+        start = monotonic()
+        self._request('ping', timeout=timeout)
+        return monotonic() - start
+
+    def set_fps_limit(self, fps_limit):
+        self.fps_limit = fps_limit
+        if self.child is None:
+            return
+        self._send(('set_fps_limit', fps_limit))
+
+    def sync_clock(self, start_time):
+        '''
+        Align capture deadlines of the child to `start_time`, in
+        `pacing.monotonic()` time.
+        '''
+        if self.child is None:
+            return
+        self._send(('sync_clock', start_time))
+
+    def start(self):
+        if not self.enabled:
+            self.start_request_time = monotonic()
+            self.child_error = None
+        if self.child is None:
+            self.child = self._launch_child()
+        elif not self.child_ready:
+            # Prewarmed child is still initializing.
+            self._wait_ready()
+            self._replay_settings()
+        logging.getLogger('opencv.frame_grabber').info('request start: %s' % datetime.now())
+        self._send('start')
+        self.paused = False
+        self.last_frame_received = monotonic()
+        if self.enabled:
+            # Resuming after `pause`; delivery is already set up.
+            return
+        self.enabled = True
+        self._add_delivery_source()
+
+    def pause(self):
+        '''
+        Stop grabbing frames without shutting down the child process.  Call
+        `start` to resume.
+        '''
+        if self.child is None:
+            return
+        logging.getLogger('opencv.frame_grabber').info('request pause: %s' % datetime.now())
+        self._send('pause')
+        self.paused = True
+
+    def stop(self):
+        if self.enabled:
+            self.enabled = False
+            self._remove_delivery_source()
+        logging.getLogger('opencv.frame_grabber').info('request stop: %s' % datetime.now())
+        if self.child and not self.child.is_alive():
+            self.child.join()
+            self.child = None
+        error = None
+        if self.child:
+            try:
+                log = ('results', self._request('stop', timeout=
+                                                self.control_timeout))
+                self.child.join()
+            except ControlError, error:
+                logging.getLogger('opencv.frame_grabber').error(
+                    'FrameGrabberChild did not stop: %r' % error)
+                self._terminate_child()
+                log = None
+        else:
+            log = None
+        # Messages not read yet, e.g., of a child that exited on its own.
+        try:
+            while self.channel.poll():
+                message = self.channel.recv()
+                if message_name(message) == 'error':
+                    self._on_child_error(message[1])
+                elif message_name(message) == 'results' and log is None:
+                    log = message
+        except ControlError:
+            # Child is gone and all its messages have been read.
+            pass
+        # Frames and heartbeats received while waiting.
+        self.channel.clear()
+        for subscription in self.subscriptions:
+            subscription.close()
+        self.subscriptions = []
+        self.child = None
+        self.last_result = log
+        if self.prewarm:
+            # Initialize the next child while idle.
+            self.child = self._spawn_child()
+        if error is None and self.child_error is not None:
+            error = ControlError('FrameGrabberChild stopped sending frames: '
+                                 '%s' % self.child_error)
+        if error is not None:
+            raise error
+        return self.last_result
+
+    def close(self):
+        '''
+        Stop, without launching another prewarmed child.
+        '''
+        self.prewarm = False
+        return self.stop()
+
+
+class ThreadedFrameGrabber(FrameGrabberCore):
+    '''
+    Headless frontend: frames are read from the pipe by a background thread
+    as soon as they arrive and published to subscriptions and
+    `frame_callback` (called from that thread).
+
+    Frames may also be consumed by iterating over the grabber:
+
+        for frame, grab_time, info in grabber:
+            ...
+
+    Iteration ends when `stop` is called.  Up to `iter_queue_length` frames
+    wait for the iterating consumer; older frames are dropped.  Frames not
+    consumed before `stop` are discarded.
+
+    See `FrameGrabberCore` for other arguments.
+    '''
+    def __init__(self, cam_cap, iter_queue_length=4, **kwargs):
+        self.iter_frames = deque(maxlen=iter_queue_length)
+        self.iter_condition = threading.Condition()
+        self.reader_thread = None
+        self.reader_enabled = False
+        super(ThreadedFrameGrabber, self).__init__(cam_cap, **kwargs)
+
+    def _add_delivery_source(self):
+        self.reader_enabled = True
+        self.reader_thread = threading.Thread(target=self._read_frames)
+        self.reader_thread.daemon = True
+        self.reader_thread.start()
+
+    def _remove_delivery_source(self):
+        self.reader_enabled = False
+        if self.reader_thread is None:
+            return
+        if self.reader_thread is not threading.current_thread():
+            self.reader_thread.join()
+        self.reader_thread = None
+        with self.iter_condition:
+            self.iter_condition.notify_all()
+
+    def _clear_iter_frames(self):
+        with self.iter_condition:
+            self.iter_frames.clear()
+            self.iter_condition.notify_all()
+
+    def start(self):
+        if not self.enabled:
+            # Frames of a previous run.
+            self._clear_iter_frames()
+        super(ThreadedFrameGrabber, self).start()
+
+    def stop(self):
+        try:
+            return super(ThreadedFrameGrabber, self).stop()
+        finally:
+            self._clear_iter_frames()
+
+    def _read_frames(self):
+        channel = self.channel
+        watchdog_time = monotonic()
+        while self.reader_enabled:
+            if monotonic() - watchdog_time > 2.5:
+                self._reset_watchdog()
+                watchdog_time = monotonic()
+            try:
+                if not channel.poll(0.1):
+                    continue
+            except ControlError:
+                break
+            self.dispatch_frames()
+
+    def _publish(self, received):
+        super(ThreadedFrameGrabber, self)._publish(received)
+        with self.iter_condition:
+            for variants, grab_time, info in received:
+                frame = self._select(variants, self.transform)
+                if self.transport.zero_copy:
+                    frame = frame.copy()
+                self.iter_frames.append((frame, grab_time, info))
+            self.iter_condition.notify_all()
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        with self.iter_condition:
+            while self.enabled and not self.iter_frames:
+                # Timeout lets `KeyboardInterrupt` through on Python 2.
+                self.iter_condition.wait(0.5)
+            if not self.iter_frames:
+                raise StopIteration
+            return self.iter_frames.popleft()
+
+    __next__ = next
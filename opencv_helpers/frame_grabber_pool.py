@@ -0,0 +1,157 @@
+from __future__ import division
+from collections import deque
+from datetime import datetime
+import logging
+
+import numpy as np
+
+from frame_grabber import _gobject
+from frame_grabber_core import FrameGrabberCore
+from pacing import monotonic
+
+
+class FrameGrabberPool(object):
+    '''
+    Grab frames from several capture sources, paced by a shared clock, and
+    deliver sets of frames that were grabbed at (nearly) the same time.
+
+    All children schedule their grabs against the same `monotonic()`
+    deadlines, and the parent reads from all pipes using a single `gobject`
+    timer.
+
+    Arguments
+    ---------
+
+     - `cam_caps`: List of captures (see `camera_capture.CameraCaptureBase`).
+     - `fps_limit`: Target frame rate of every source.
+     - `tolerance`: Maximum difference (in seconds) between grab timestamps
+       of frames in a set (default: half a frame period).
+     - `queue_length`: Maximum number of unmatched frames kept per source.
+     - `auto_init`: Launch child processes immediately.
+
+    `frame_set_callback` is called as `frame_set_callback(frames,
+    timestamps)` with one frame and grab timestamp per source, in the order
+    of `cam_caps`.
+    '''
+    def __init__(self, cam_caps, fps_limit=10., tolerance=None,
+                 queue_length=4, auto_init=False):
+        self.grabbers = [FrameGrabberCore(cam_cap) for cam_cap in cam_caps]
+        self.fps_limit = fps_limit
+        if tolerance is None:
+            tolerance = 0.5 / fps_limit
+        self.tolerance = tolerance
+        self.pending = [deque(maxlen=queue_length) for g in self.grabbers]
+        self.frame_set_callback = None
+        self.timer_id = None
+        self.enabled = False
+        self.start_time = None
+        self.stop_time = None
+        self.frame_sets = 0
+        self.frames_received = np.zeros(len(self.grabbers), dtype=int)
+        self.frames_unmatched = np.zeros(len(self.grabbers), dtype=int)
+        self.launched = False
+        if auto_init:
+            self._launch_children()
+
+    def _launch_children(self):
+        # Spawn all children before waiting, so capture devices are
+        # initialized in parallel.
+        for grabber in self.grabbers:
+            grabber.child = grabber._spawn_child()
+        for grabber in self.grabbers:
+            grabber._wait_ready()
+            grabber._replay_settings()
+        self.launched = True
+
+    def _grab_frames(self):
+        for i, grabber in enumerate(self.grabbers):
+            for frame, grab_time, info in grabber.receive_frames():
+                if len(self.pending[i]) == self.pending[i].maxlen:
+                    self.frames_unmatched[i] += 1
+                self.pending[i].append((info.grab_start, frame))
+                self.frames_received[i] += 1
+        self._match_frames()
+        return self.enabled
+
+    def _match_frames(self):
+        while all(self.pending):
+            timestamps = np.array([p[0][0] for p in self.pending])
+            if timestamps.max() - timestamps.min() <= self.tolerance:
+                frames = [p.popleft()[1] for p in self.pending]
+                self.frame_sets += 1
+                if self.frame_set_callback:
+                    self.frame_set_callback(frames, timestamps)
+            else:
+                # Oldest frame cannot be matched by any other source anymore.
+                i = timestamps.argmin()
+                self.pending[i].popleft()
+                self.frames_unmatched[i] += 1
+
+    def set_fps_limit(self, fps_limit):
+        self.fps_limit = fps_limit
+        for grabber in self.grabbers:
+            grabber.set_fps_limit(fps_limit)
+        self.sync_clock()
+
+    def sync_clock(self, delay=0.1):
+        '''
+        Align capture deadlines of all children to a common start time,
+        `delay` seconds from now.
+        '''
+        start_time = monotonic() + delay
+        for grabber in self.grabbers:
+            grabber.sync_clock(start_time)
+
+    def start(self):
+        if not self.launched:
+            self._launch_children()
+        logging.getLogger('opencv.frame_grabber').info('request pool start: %s' % datetime.now())
+        for grabber in self.grabbers:
+            grabber.set_fps_limit(self.fps_limit)
+        self.sync_clock()
+        for grabber in self.grabbers:
+            grabber.start()
+        if self.enabled:
+            return
+        self.start_time = monotonic()
+        self.enabled = True
+        self.timer_id = _gobject().timeout_add(10, self._grab_frames)
+
+    def pause(self):
+        for grabber in self.grabbers:
+            grabber.pause()
+
+    def stop(self):
+        if self.timer_id is not None:
+            _gobject().source_remove(self.timer_id)
+            self.timer_id = None
+        self.enabled = False
+        self.stop_time = monotonic()
+        results = [grabber.stop() for grabber in self.grabbers]
+        self.launched = False
+        return results
+
+    def stats(self):
+        '''
+        Returns per-source and aggregate throughput statistics.
+        '''
+        if self.start_time is None:
+            duration = None
+        else:
+            end_time = monotonic() if self.enabled else self.stop_time
+            duration = end_time - self.start_time
+        per_source = []
+        for i, grabber in enumerate(self.grabbers):
+            counts = grabber.frame_counts
+            per_source.append(dict(produced=counts['produced'],
+                                   dropped=counts['dropped_child'],
+                                   received=self.frames_received[i],
+                                   unmatched=self.frames_unmatched[i],
+                                   fps=self.frames_received[i] / duration
+                                   if duration else None))
+        return dict(sources=per_source, duration=duration,
+                    frame_sets=self.frame_sets,
+                    frame_set_fps=self.frame_sets / duration
+                    if duration else None,
+                    total_fps=self.frames_received.sum() / duration
+                    if duration else None)
@@ -0,0 +1,140 @@
+from __future__ import division
+import logging
+
+from frame_grabber import _gobject
+from pacing import monotonic
+
+
+class FrameGrabberSupervisor(object):
+    '''
+    Restart the child process of a `frame_grabber.FrameGrabber` when capture
+    stalls, e.g., due to a hung camera driver.
+
+    Capture is considered stalled when the child process has exited, or
+    when no heartbeat (or, while grabbing, no frame) has been received for
+    `stall_timeout` seconds.  The child is then killed and relaunched, which
+    runs `init_capture` again.  Consecutive failed restarts are delayed by an
+    exponential backoff of `backoff_base * 2 ** n` seconds, up to
+    `backoff_max`.
+
+    Arguments
+    ---------
+
+     - `grabber`: Frame grabber to supervise.
+     - `stall_timeout`: Seconds without heartbeat/frames before restarting.
+       Must be longer than the heartbeat interval of the child (see
+       `frame_grabber_core.FrameGrabberCore.HEARTBEAT_INTERVAL`).
+     - `backoff_base`: Delay before first restart attempt, in seconds.
+     - `backoff_max`: Maximum delay between restart attempts, in seconds.
+     - `check_interval`: Milliseconds between checks (`gobject` timer).  Set
+       to `None` to call `check` manually.
+    '''
+    STATES = ('running', 'waiting', 'starting', 'recovering')
+
+    def __init__(self, grabber, stall_timeout=5., backoff_base=0.5,
+                 backoff_max=30., check_interval=500):
+        if stall_timeout <= grabber.HEARTBEAT_INTERVAL:
+            raise ValueError('Stall timeout (%s s) must be longer than the '
+                             'heartbeat interval (%s s).' %
+                             (stall_timeout, grabber.HEARTBEAT_INTERVAL))
+        self.grabber = grabber
+        self.stall_timeout = stall_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.state = 'running'
+        self.failures = 0
+        self.restart_count = 0
+        self.downtime = 0.
+        self.down_since = None
+        self.retry_time = None
+        self.spawn_time = None
+        self.resume_time = None
+        self.last_reason = None
+        self.timer_id = None
+        if check_interval is not None:
+            self.timer_id = _gobject().timeout_add(check_interval, self.check)
+
+    def close(self):
+        if self.timer_id is not None:
+            _gobject().source_remove(self.timer_id)
+            self.timer_id = None
+
+    def _stall_reason(self, now):
+        grabber = self.grabber
+        if grabber.child is not None and not grabber.child.is_alive():
+            return 'child exited (code %s)' % grabber.child.exitcode
+        if grabber.last_heartbeat is not None and \
+                now - grabber.last_heartbeat > self.stall_timeout:
+            return 'no heartbeat for %.1f s' % (now - grabber.last_heartbeat)
+        if not grabber.paused and grabber.last_frame_received is not None \
+                and now - grabber.last_frame_received > self.stall_timeout:
+            return 'no frame for %.1f s' % (now - grabber.last_frame_received)
+        return None
+
+    def _schedule_restart(self, now, reason):
+        logging.getLogger('opencv.frame_grabber').warning(
+            'FrameGrabber capture stalled: %s.  Restarting child.' % reason)
+        self.last_reason = reason
+        self.grabber._terminate_child()
+        if self.down_since is None:
+            self.down_since = now
+        delay = min(self.backoff_base * 2 ** self.failures, self.backoff_max)
+        self.failures += 1
+        self.retry_time = now + delay
+        self.state = 'waiting'
+
+    def check(self):
+        '''
+        Check the child and advance the restart state machine.  Returns
+        `True` so it may be used directly as a `gobject` timer callback.
+        '''
+        grabber = self.grabber
+        now = monotonic()
+        if not grabber.enabled:
+            return True
+        if self.state == 'running':
+            if grabber.child is None:
+                return True
+            reason = self._stall_reason(now)
+            if reason is not None:
+                self._schedule_restart(now, reason)
+        elif self.state == 'waiting':
+            if now >= self.retry_time:
+                grabber._respawn_child()
+                self.spawn_time = now
+                self.state = 'starting'
+        elif self.state == 'starting':
+            if grabber.child_ready:
+                grabber._resume_child()
+                grabber.last_frame_received = now
+                self.restart_count += 1
+                self.resume_time = now
+                self.state = 'recovering'
+            elif not grabber.child.is_alive() or \
+                    now - self.spawn_time > self.stall_timeout:
+                self._schedule_restart(now, 'child did not become ready')
+        elif self.state == 'recovering':
+            if grabber.paused or (grabber.last_frame_received is not None and
+                                  grabber.last_frame_received >
+                                  self.resume_time):
+                # Capture is healthy again.
+                self.downtime += now - self.down_since
+                self.down_since = None
+                self.failures = 0
+                self.state = 'running'
+                logging.getLogger('opencv.frame_grabber').info(
+                    'FrameGrabber capture recovered after %d restart(s).' %
+                    self.restart_count)
+            else:
+                reason = self._stall_reason(now)
+                if reason is not None:
+                    self._schedule_restart(now, reason)
+        return True
+
+    def stats(self):
+        downtime = self.downtime
+        if self.down_since is not None:
+            downtime += monotonic() - self.down_since
+        return dict(state=self.state, restarts=self.restart_count,
+                    downtime=downtime, consecutive_failures=self.failures,
+                    last_reason=self.last_reason)
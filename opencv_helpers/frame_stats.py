@@ -0,0 +1,134 @@
+from collections import namedtuple
+
+import numpy as np
+
+
+# Metadata delivered with each frame.  All times are `pacing.monotonic()`
+# times (shared by processes on the same host):
+#
+#  - `sequence`: Index of frame among all frames captured by the child.
+#  - `grab_start`, `grab_end`: Before and after `get_frame`.
+#  - `send_time`: When the frame was handed to the pipe by the child.
+#  - `receive_time`: When the frame was read from the pipe by the parent.
+FrameInfo = namedtuple('FrameInfo', 'sequence grab_start grab_end send_time '
+                       'receive_time')
+
+
+class FrameLatencyStats(object):
+    '''
+    Rolling latency statistics over the last `window` frames.
+
+    Stages:
+
+     - `capture`: `grab_end - grab_start`
+     - `queue`: `send_time - grab_end` (waiting in the child for the parent)
+     - `transfer`: `receive_time - send_time`
+     - `total`: `receive_time - grab_start`
+
+    A sequence gap is counted each time a frame is not the successor of the
+    previous frame received, i.e., one or more frames were dropped.
+    '''
+    STAGES = ('capture', 'queue', 'transfer', 'total')
+
+    def __init__(self, window=300):
+        self.window = window
+        self.latencies = np.zeros((window, len(self.STAGES)))
+        self.count = 0
+        self.gap_count = 0
+        self.frames_missing = 0
+        self.last_sequence = None
+
+    def add(self, info):
+        if self.last_sequence is not None and \
+                info.sequence != self.last_sequence + 1:
+            self.gap_count += 1
+            self.frames_missing += max(info.sequence - self.last_sequence -
+                                       1, 0)
+        self.last_sequence = info.sequence
+        self.latencies[self.count % self.window] = \
+            (info.grab_end - info.grab_start, info.send_time - info.grab_end,
+             info.receive_time - info.send_time,
+             info.receive_time - info.grab_start)
+        self.count += 1
+
+    def percentiles(self, q=(50, 95, 99)):
+        '''
+        Returns `{stage: {'p50': ..., ...}}`, in seconds.
+        '''
+        latencies = self.latencies[:min(self.count, self.window)]
+        if not len(latencies):
+            return None
+        values = np.percentile(latencies, q, axis=0)
+        return dict([(stage, dict([('p%s' % q_i, values[i, j])
+                                   for i, q_i in enumerate(q)]))
+                     for j, stage in enumerate(self.STAGES)])
+
+    def summary(self):
+        return dict(frames=self.count, sequence_gaps=self.gap_count,
+                    frames_missing=self.frames_missing,
+                    latency=self.percentiles())
+
+
+class RunningStats(object):
+    '''
+    Count, mean, variance, minimum and maximum of a stream of values, in
+    constant memory (Welford's algorithm).
+    '''
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def variance(self):
+        if self.count < 2:
+            return None
+        return self.m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        variance = self.variance
+        return None if variance is None else np.sqrt(variance)
+
+    def summary(self):
+        return dict(count=self.count,
+                    mean=self.mean if self.count else None, std=self.std,
+                    min=self.min, max=self.max)
+
+
+class RollingPercentiles(object):
+    '''
+    Percentiles of the last `window` values of a stream, e.g., for live
+    telemetry.
+
+    Values are kept in a preallocated ring, so `add` is cheap enough to call
+    per frame.  `add` may be called from one thread while another reads
+    `percentile`, in which case a value being replaced is read as either
+    the old or the new value.
+    '''
+    def __init__(self, window=256):
+        self.window = window
+        self.values = np.zeros(window)
+        self.count = 0
+
+    def add(self, value):
+        self.values[self.count % self.window] = value
+        self.count += 1
+
+    def percentile(self, q):
+        values = self.values[:min(self.count, self.window)]
+        if not len(values):
+            return None
+        return float(np.percentile(values, q))
@@ -0,0 +1,124 @@
+from collections import deque
+import threading
+
+
+class FrameSubscription(object):
+    '''
+    Subscription to frames published by a `frame_grabber.FrameGrabber`.
+
+    Frames are shared between all subscriptions and must be treated as
+    read-only.
+
+    Arguments
+    ---------
+
+     - `callback`: Called as `callback(frame, grab_time)`.
+     - `fps_limit`: Maximum rate at which frames are delivered (default: every
+       frame).
+     - `policy`: How frames are delivered:
+       * `'sync'`: Call `callback` with the newest frame from the thread
+         reading frames from the grabber (e.g., the GTK main loop).
+       * `'latest'`: Call `callback` from a worker thread with the newest
+         frame, skipping frames that arrive while `callback` is busy.
+       * `'queue'`: Call `callback` from a worker thread for every frame,
+         dropping the oldest frame if more than `queue_length` frames are
+         waiting.
+     - `queue_length`: Maximum number of frames waiting for `'queue'`
+       policy.
+     - `transform`: Reduction applied to frames for this subscription by the
+       grabber child process (see `frame_transform.FrameTransform`).
+    '''
+    POLICIES = ('sync', 'latest', 'queue')
+
+    def __init__(self, callback, fps_limit=None, policy='sync',
+                 queue_length=4, transform=None):
+        if policy not in self.POLICIES:
+            raise ValueError('Invalid subscription policy: %s' % policy)
+        self.callback = callback
+        self.transform = transform
+        self.fps_limit = fps_limit
+        self.policy = policy
+        self.queue_length = 1 if policy == 'latest' else queue_length
+        self.next_timestamp = None
+        self.delivered = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.frames = deque()
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        if policy != 'sync':
+            self.running = True
+            self.thread = threading.Thread(target=self._run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def _accept(self, timestamp):
+        # Rate limit, based on grab timestamps.
+        if self.fps_limit is None:
+            return True
+        period = 1. / self.fps_limit
+        if self.next_timestamp is not None and \
+                timestamp < self.next_timestamp - 0.1 * period:
+            self.skipped += 1
+            return False
+        if self.next_timestamp is None or \
+                timestamp > self.next_timestamp + period:
+            self.next_timestamp = timestamp
+        self.next_timestamp += period
+        return True
+
+    def publish(self, frames, copy=False):
+        '''
+        Arguments
+        ---------
+
+         - `frames`: List of `(frame, grab_time, info)` tuples, oldest
+           first (see `frame_stats.FrameInfo`).
+         - `copy`: Frames are only valid during this call (e.g., views into a
+           shared memory ring), so copy them if delivery is deferred.
+        '''
+        frames = [f for f in frames if self._accept(f[2].grab_start)]
+        if not frames:
+            return
+        if self.policy == 'sync':
+            self.dropped += len(frames) - 1
+            frame, grab_time = frames[-1][:2]
+            self.delivered += 1
+            self.callback(frame, grab_time)
+            return
+        with self.condition:
+            for frame, grab_time, info in frames:
+                if len(self.frames) >= self.queue_length:
+                    self.frames.popleft()
+                    self.dropped += 1
+                self.frames.append((frame.copy() if copy else frame,
+                                    grab_time))
+            self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.frames:
+                    self.condition.wait()
+                if not self.frames:
+                    return
+                frame, grab_time = self.frames.popleft()
+            self.delivered += 1
+            self.callback(frame, grab_time)
+
+    def close(self):
+        '''
+        Stop delivering frames.  Frames already waiting are delivered before
+        returning.
+        '''
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def stats(self):
+        return dict(delivered=self.delivered, dropped=self.dropped,
+                    skipped=self.skipped)
@@ -0,0 +1,142 @@
+from __future__ import division
+import os
+
+import numpy as np
+
+
+# Record per video frame.
+#
+#  - `time`: Wall clock time (seconds since the epoch) at which the pixels of
+#    the frame were grabbed.
+#  - `monotonic`: Same instant, in `pacing.monotonic()` time.
+#  - `sequence`: Frame deadline number, counted from the start of the
+#    recording.  Gaps mean deadlines without a frame in the video.
+#  - `flags`: See `FRAME_DUPLICATED`, `FRAME_REPEATED`, `FRAME_AFTER_GAP` and
+#    `FRAME_PREROLL`.
+TIMESTAMP_DTYPE = np.dtype([('time', '<f8'), ('monotonic', '<f8'),
+                            ('sequence', '<u4'), ('flags', 'u1')])
+
+# Copy of the next captured frame, written for a deadline missed while
+# capture was lagging.
+FRAME_DUPLICATED = 1
+# Copy of the previous frame, written because the capture returned no frame.
+FRAME_REPEATED = 2
+# One or more deadlines before this frame have no frame in the video (e.g.,
+# dropped because the encoder queue was full).
+FRAME_AFTER_GAP = 4
+# Captured before recording was triggered (see `recorder.RecorderChild`).
+FRAME_PREROLL = 8
+
+MAGIC = 'OCVFTS01'
+# Magic, followed by the nominal frame rate of the video (`<f8`).
+HEADER_SIZE = len(MAGIC) + 8
+
+
+def timestamps_path(video_path):
+    '''
+    Returns path of the timestamp sidecar file of `video_path`.
+    '''
+    return video_path + '.timestamps'
+
+
+class FrameTimestampWriter(object):
+    '''
+    Append one `TIMESTAMP_DTYPE` record per frame written to a video file.
+
+    Records are written as they arrive, after a fixed size header, so a file
+    cut short (e.g., by a crash) is still readable up to the last complete
+    record.
+
+    Arguments
+    ---------
+
+     - `path`: Output file (see `timestamps_path`).
+     - `fps`: Nominal frame rate of the video.
+    '''
+    def __init__(self, path, fps):
+        self.path = path
+        self.fps = fps
+        self.frame_count = 0
+        self.record = np.zeros(1, dtype=TIMESTAMP_DTYPE)
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.file.write(np.array([fps], dtype='<f8').tostring())
+
+    def write(self, time, monotonic, sequence, flags=0):
+        self.record[0] = (time, monotonic, sequence, flags)
+        self.file.write(self.record.tostring())
+        self.frame_count += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class FrameTimestamps(object):
+    '''
+    Read a timestamp sidecar file (see `FrameTimestampWriter`).
+
+    Records are memory-mapped, so looking up the time of a video frame by
+    index takes constant time, regardless of the length of the recording.
+
+    Arguments
+    ---------
+
+     - `path`: Sidecar file, or video file with a sidecar next to it (see
+       `timestamps_path`).
+    '''
+    def __init__(self, path):
+        if not os.path.exists(path) and \
+                os.path.exists(timestamps_path(path)):
+            path = timestamps_path(path)
+        self.path = path
+        with open(path, 'rb') as input_:
+            header = input_.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+            raise ValueError('Not a frame timestamp file: %s' % path)
+        self.fps = np.fromstring(header[len(MAGIC):], dtype='<f8')[0]
+        # Ignore an incomplete last record.
+        count = (os.path.getsize(path) - HEADER_SIZE) // \
+            TIMESTAMP_DTYPE.itemsize
+        if count:
+            self.records = np.memmap(path, dtype=TIMESTAMP_DTYPE, mode='r',
+                                     offset=HEADER_SIZE, shape=(count, ))
+        else:
+            self.records = np.zeros(0, dtype=TIMESTAMP_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def time(self, index):
+        '''
+        Returns wall clock time (seconds since the epoch) of video frame
+        `index`.
+        '''
+        return self.records['time'][index]
+
+    def index_at(self, time):
+        '''
+        Returns index of the last video frame grabbed at or before wall clock
+        `time` (`-1` if none).
+        '''
+        return int(np.searchsorted(self.records['time'], time,
+                                   side='right')) - 1
+
+    def stats(self):
+        '''
+        Returns frame counts by flag, and the number of deadlines without a
+        frame in the video.
+        '''
+        flags = self.records['flags']
+        # Each deadline has at most one frame.
+        missing = int(self.records['sequence'][-1]) + 1 - len(self) \
+            if len(self) else 0
+        return dict(frames=len(self), fps=self.fps,
+                    duplicated=int(((flags & FRAME_DUPLICATED) != 0).sum()),
+                    repeated=int(((flags & FRAME_REPEATED) != 0).sum()),
+                    preroll=int(((flags & FRAME_PREROLL) != 0).sum()),
+                    missing=missing)
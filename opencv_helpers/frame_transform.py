@@ -0,0 +1,104 @@
+from __future__ import division
+from collections import namedtuple
+
+import numpy as np
+
+from safe_cv import cv
+
+
+INTERPOLATIONS = dict(nearest=cv.CV_INTER_NN, linear=cv.CV_INTER_LINEAR,
+                      area=cv.CV_INTER_AREA, cubic=cv.CV_INTER_CUBIC)
+
+
+class FrameTransform(namedtuple('FrameTransform', 'roi scale interpolation '
+                                'grayscale')):
+    '''
+    Reduction applied to frames in the `FrameGrabberChild` process, before
+    frames are sent to the parent.
+
+    Transforms are compared by value, so subscribers with equal transforms
+    share the same transformed frame.
+
+    Arguments
+    ---------
+
+     - `roi`: `(x, y, width, height)` region of interest, in pixels of the
+       captured frame (default: whole frame).  A region extending past the
+       edge of the frame is clipped to the frame.
+     - `scale`: Scale factor applied after cropping, e.g., `0.25`.
+     - `interpolation`: One of `'nearest'`, `'linear'`, `'area'` (default,
+       best quality for downscaling) or `'cubic'`.
+     - `grayscale`: Convert BGR frame to a single channel.
+    '''
+    def __new__(cls, roi=None, scale=1., interpolation='area',
+                grayscale=False):
+        if interpolation not in INTERPOLATIONS:
+            raise ValueError('Invalid interpolation: %s' % interpolation)
+        if scale <= 0:
+            raise ValueError('Scale must be positive.')
+        if roi is not None:
+            roi = tuple(int(v) for v in roi)
+            if len(roi) != 4:
+                raise ValueError('Region of interest must be (x, y, width, '
+                                 'height).')
+            if roi[0] < 0 or roi[1] < 0:
+                raise ValueError('Region of interest must not start '
+                                 'outside the frame.')
+            if roi[2] <= 0 or roi[3] <= 0:
+                raise ValueError('Region of interest must not be empty.')
+        return super(FrameTransform, cls).__new__(cls, roi, float(scale),
+                                                  interpolation,
+                                                  bool(grayscale))
+
+    def clipped_roi(self, shape):
+        '''
+        Returns `(x, y, width, height)` region of interest, clipped to a
+        captured frame of `shape` (whole frame if `roi` is `None`).
+        '''
+        frame_height, frame_width = shape[:2]
+        if self.roi is None:
+            return (0, 0, frame_width, frame_height)
+        x, y, width, height = self.roi
+        if x >= frame_width or y >= frame_height:
+            raise ValueError('Region of interest %s is outside %dx%d frame.'
+                             % (self.roi, frame_width, frame_height))
+        return (x, y, min(width, frame_width - x),
+                min(height, frame_height - y))
+
+    def output_shape(self, shape):
+        '''
+        Returns shape of transformed frame for a captured frame of `shape`.
+        '''
+        x, y, width, height = self.clipped_roi(shape)
+        height = max(int(round(height * self.scale)), 1)
+        width = max(int(round(width * self.scale)), 1)
+        if self.grayscale or len(shape) < 3:
+            return (height, width)
+        return (height, width) + tuple(shape[2:])
+
+    def apply(self, frame, out=None):
+        '''
+        Returns transformed copy of `frame` (a NumPy array), written to `out`
+        if given (see `output_shape`).
+        '''
+        if out is None:
+            out = np.empty(self.output_shape(frame.shape), dtype=frame.dtype)
+        if self.roi is not None:
+            x, y, width, height = self.clipped_roi(frame.shape)
+            # View only; the crop is copied by the conversion or resize below.
+            frame = frame[y:y + height, x:x + width]
+        if self.grayscale and frame.ndim == 3:
+            # Convert before resizing, so only one channel is interpolated.
+            if self.scale == 1:
+                gray = out
+            else:
+                gray = np.empty(frame.shape[:2], dtype=frame.dtype)
+            cv.CvtColor(cv.fromarray(frame), cv.fromarray(gray),
+                        cv.CV_BGR2GRAY)
+            frame = gray
+        if self.scale != 1:
+            cv.Resize(cv.fromarray(frame), cv.fromarray(out),
+                      INTERPOLATIONS[self.interpolation])
+        elif frame is not out:
+            out[:] = frame
+        return out
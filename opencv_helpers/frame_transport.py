@@ -0,0 +1,214 @@
+import logging
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+
+
+class PickleFrameTransport(object):
+    '''
+    Send each frame through the pipe as a pickled NumPy array.
+
+    Every frame is copied into the pickle, through the pipe and back out into
+    a new array in the parent process.
+    '''
+    name = 'pickle'
+    # Unpacked frames are not reused by the transport.
+    zero_copy = False
+
+    def __init__(self, max_in_flight=2):
+        self.bytes_copied = 0
+        # Maximum number of frames sent but not yet acknowledged by the
+        # parent.
+        self.max_in_flight = max_in_flight
+
+    def pack(self, np_frame):
+        # Pickle in child, pipe write/read, unpickle in parent.
+        self.bytes_copied += 3 * np_frame.nbytes
+        return np_frame
+
+    def unpack(self, payload):
+        return payload
+
+    def pack_frames(self, np_frames):
+        '''
+        Pack several frames (e.g., transformed variants of a frame, see
+        `frame_transform.FrameTransform`) into one payload.
+        '''
+        return [self.pack(np_frame) for np_frame in np_frames]
+
+    def unpack_frames(self, payload):
+        return [self.unpack(p) for p in payload]
+
+
+class SharedFrameRing(object):
+    '''
+    Fixed number of equally sized frame slots in shared memory.
+
+    By default, the ring is anonymous shared memory, which must be created
+    _before_ the child process is launched so that both processes map the
+    same memory.  A ring backed by file `path` (see `create_file`) may be
+    created by either process at any time, and opened by the other.
+    '''
+    def __init__(self, slot_count, slot_bytes, path=None):
+        self.slot_count = slot_count
+        self.slot_bytes = slot_bytes
+        self.path = path
+        if path is None:
+            self._buffer = multiprocessing.RawArray('B',
+                                                    slot_count * slot_bytes)
+            self._array = np.frombuffer(self._buffer, dtype='uint8')
+        else:
+            self._buffer = None
+            self._array = np.memmap(path, dtype='uint8', mode='r+',
+                                    shape=(slot_count * slot_bytes, ))
+        self.next_slot = 0
+        self.sequence = 0
+
+    @classmethod
+    def create_file(cls, slot_count, slot_bytes):
+        '''
+        Create a ring backed by a new temporary file (in memory, under
+        `/dev/shm`, where available).
+        '''
+        directory = '/dev/shm' if os.path.isdir('/dev/shm') else None
+        handle, path = tempfile.mkstemp(prefix='frame-ring-', dir=directory)
+        with os.fdopen(handle, 'wb') as output:
+            output.truncate(slot_count * slot_bytes)
+        return cls(slot_count, slot_bytes, path)
+
+    def write(self, np_frame):
+        return self.write_frames([np_frame])[0]
+
+    def write_frames(self, np_frames):
+        '''
+        Write frames back to back into the next slot.
+
+        Returns `(slot, offsets)`.
+        '''
+        nbytes = sum(np_frame.nbytes for np_frame in np_frames)
+        if nbytes > self.slot_bytes:
+            raise ValueError('Frame size (%d bytes) exceeds ring slot size '
+                             '(%d bytes).' % (nbytes, self.slot_bytes))
+        slot = self.next_slot
+        offsets = []
+        offset = 0
+        for np_frame in np_frames:
+            self.view(slot, np_frame.shape, np_frame.dtype, offset)[:] = \
+                np_frame
+            offsets.append(offset)
+            offset += np_frame.nbytes
+        self.next_slot = (slot + 1) % self.slot_count
+        self.sequence += 1
+        return slot, offsets
+
+    def view(self, slot, shape, dtype, offset=0):
+        dtype = np.dtype(dtype)
+        offset += slot * self.slot_bytes
+        count = int(np.prod(shape)) * dtype.itemsize
+        return (self._array[offset:offset + count].view(dtype)
+                .reshape(shape))
+
+
+class SharedMemoryFrameTransport(object):
+    '''
+    Write frames into a preallocated ring of shared memory slots and only
+    send the slot index, sequence number and frame layout through the pipe.
+
+    Frames returned by `unpack` are zero-copy views into the ring, i.e., a
+    frame is only valid until the child has written `slot_count` more
+    frames.  At most `slot_count - 1` frames are in flight at once, so the
+    most recently delivered frame stays valid until the parent receives the
+    next one.  Copy the frame if it must be kept longer.
+
+    Each message uses one slot, holding the frame and its transformed
+    variants (see `pack_frames`).  If a message does not fit, e.g., once a
+    subscription requests another transform, the child replaces the ring
+    with a file-backed ring of larger slots (see
+    `SharedFrameRing.create_file`), and the parent opens it on the first
+    message written to it.  Frames already sent stay valid, since the
+    previous ring is not written to anymore.
+
+    Arguments
+    ---------
+
+     - `slot_count`: Number of frames in the ring.
+     - `frame_shape`: Largest expected frame shape, e.g., `(480, 640, 3)`.
+     - `dtype`: Frame data type.
+    '''
+    name = 'shared'
+    # Unpacked frames are views of ring slots that are reused.
+    zero_copy = True
+
+    def __init__(self, slot_count=4, frame_shape=(480, 640, 3),
+                 dtype='uint8'):
+        if slot_count < 2:
+            raise ValueError('At least 2 ring slots are required.')
+        slot_bytes = int(np.prod(frame_shape)) * np.dtype(dtype).itemsize
+        self.ring = SharedFrameRing(slot_count, slot_bytes)
+        self.bytes_copied = 0
+        self.max_in_flight = slot_count - 1
+        # Number of times the ring was replaced by a larger one.
+        self.ring_resizes = 0
+
+    @property
+    def slot_count(self):
+        return self.ring.slot_count
+
+    def _reserve(self, nbytes):
+        # Called in the child, before writing a message of `nbytes`.
+        if nbytes <= self.ring.slot_bytes:
+            return
+        logging.getLogger('opencv.frame_grabber').info(
+            'Frame data (%d bytes) exceeds ring slot size (%d bytes).  '
+            'Allocating larger ring.' % (nbytes, self.ring.slot_bytes))
+        self.ring = SharedFrameRing.create_file(self.ring.slot_count, nbytes)
+        self.ring_resizes += 1
+
+    def _open_ring(self, ring_path, slot_bytes):
+        # Called in the parent, on the first message written to a ring
+        # created by the child.
+        if ring_path == self.ring.path:
+            return
+        self.ring = SharedFrameRing(self.ring.slot_count, slot_bytes,
+                                    ring_path)
+        self.ring_resizes += 1
+        # Both processes have mapped the file, and a child launched later
+        # inherits the mapping, so the file name is not needed anymore.
+        try:
+            os.remove(ring_path)
+        except OSError:
+            # File is mapped (Windows).
+            pass
+
+    def pack(self, np_frame):
+        self._reserve(np_frame.nbytes)
+        slot = self.ring.write(np_frame)
+        self.bytes_copied += np_frame.nbytes
+        return (slot, self.ring.sequence, np_frame.shape, np_frame.dtype.str,
+                self.ring.path, self.ring.slot_bytes)
+
+    def unpack(self, payload):
+        slot, sequence, shape, dtype, ring_path, slot_bytes = payload
+        self._open_ring(ring_path, slot_bytes)
+        return self.ring.view(slot, shape, dtype)
+
+    def pack_frames(self, np_frames):
+        '''
+        Pack several frames into a single slot, so each message still uses one
+        slot.  Slots are enlarged as needed (see above).
+        '''
+        self._reserve(sum(np_frame.nbytes for np_frame in np_frames))
+        slot, offsets = self.ring.write_frames(np_frames)
+        self.bytes_copied += sum(np_frame.nbytes for np_frame in np_frames)
+        return (slot, self.ring.sequence,
+                [(offset, np_frame.shape, np_frame.dtype.str)
+                 for offset, np_frame in zip(offsets, np_frames)],
+                self.ring.path, self.ring.slot_bytes)
+
+    def unpack_frames(self, payload):
+        slot, sequence, layouts, ring_path, slot_bytes = payload
+        self._open_ring(ring_path, slot_bytes)
+        return [self.ring.view(slot, shape, dtype, offset)
+                for offset, shape, dtype in layouts]
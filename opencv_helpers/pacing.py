@@ -0,0 +1,120 @@
+from __future__ import division
+import os
+from time import sleep, time
+
+
+try:
+    from time import monotonic
+except ImportError:
+    # Python 2 has no monotonic clock in the standard library.
+    import ctypes
+
+    if os.name == 'nt':
+        _qpc_frequency = ctypes.c_int64()
+        ctypes.windll.kernel32.QueryPerformanceFrequency(
+            ctypes.byref(_qpc_frequency))
+
+        def monotonic():
+            counter = ctypes.c_int64()
+            ctypes.windll.kernel32.QueryPerformanceCounter(
+                ctypes.byref(counter))
+            return counter.value / _qpc_frequency.value
+    else:
+        import ctypes.util
+
+        class _timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+        _CLOCK_MONOTONIC = 1
+        try:
+            _librt = ctypes.CDLL(ctypes.util.find_library('rt') or
+                                 ctypes.util.find_library('c'))
+            _clock_gettime = _librt.clock_gettime
+            _clock_gettime.argtypes = [ctypes.c_int,
+                                       ctypes.POINTER(_timespec)]
+        except (OSError, AttributeError):
+            _clock_gettime = None
+
+        if _clock_gettime is None:
+            monotonic = time
+        else:
+            def monotonic():
+                t = _timespec()
+                if _clock_gettime(_CLOCK_MONOTONIC, ctypes.byref(t)) != 0:
+                    raise OSError('clock_gettime(CLOCK_MONOTONIC) failed')
+                return t.tv_sec + t.tv_nsec * 1e-9
+
+
+class DeadlineScheduler(object):
+    '''
+    Pace a loop at a fixed rate using absolute deadlines on a monotonic
+    clock.
+
+    Unlike sleeping a fixed period after each iteration, the time spent in
+    the loop body does not reduce the achieved rate and errors do not
+    accumulate.  If the loop falls behind by one or more whole periods, the
+    missed deadlines are skipped (and counted) rather than run back-to-back
+    to catch up.
+
+    Arguments
+    ---------
+
+     - `fps`: Target rate (iterations per second).
+     - `start_time`: First deadline, in `monotonic()` time (default: now).
+       Schedulers in separate processes sharing the same `start_time` and
+       `fps` fire in phase.
+    '''
+    def __init__(self, fps, start_time=None):
+        self.set_fps(fps)
+        self.reset(start_time)
+
+    def reset(self, start_time=None):
+        if start_time is None:
+            start_time = monotonic()
+        self.start_time = start_time
+        self.next_deadline = start_time
+        self.last_deadline = None
+        self.tick_count = 0
+        self.miss_count = 0
+
+    def set_fps(self, fps):
+        if fps <= 0:
+            raise ValueError('Rate must be positive: %s' % fps)
+        self.fps = fps
+        self.period = 1. / fps
+
+    def wait(self):
+        '''
+        Sleep until the next deadline.
+
+        Returns the number of deadlines that were missed (and skipped) since
+        the previous call.
+        '''
+        now = monotonic()
+        if now < self.next_deadline:
+            sleep(self.next_deadline - now)
+            missed = 0
+        else:
+            missed = int((now - self.next_deadline) // self.period)
+            self.next_deadline += missed * self.period
+        self.last_deadline = self.next_deadline
+        self.next_deadline += self.period
+        self.tick_count += 1
+        self.miss_count += missed
+        return missed
+
+    def remaining(self):
+        '''
+        Returns time until the next deadline, in seconds (`0` if passed).
+        '''
+        return max(self.next_deadline - monotonic(), 0)
+
+    @property
+    def achieved_fps(self):
+        if self.tick_count < 2:
+            return None
+        return (self.tick_count - 1) / (self.last_deadline - self.start_time)
+
+    def stats(self):
+        return dict(target_fps=self.fps, achieved_fps=self.achieved_fps,
+                    ticks=self.tick_count, deadline_misses=self.miss_count)
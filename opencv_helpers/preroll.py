@@ -0,0 +1,116 @@
+from __future__ import division
+from collections import deque
+
+import numpy as np
+
+from frame_codec import DeltaFrameCodec
+
+
+class PreRollBuffer(object):
+    '''
+    First-in, first-out ring of the most recent frames, each with an `info`
+    object, so a recording can include frames captured before it was
+    triggered.
+
+    Without a `codec`, frames are copied into `frame_count` preallocated
+    slots, i.e., memory use is fixed at `frame_count` frames.  With a codec
+    (e.g., `frame_codec.JPEGFrameCodec`), frames are stored encoded, and at
+    most `max_bytes` of encoded data is kept (default: the size of
+    `frame_count` raw frames).
+
+    When the ring is full, `append` evicts the oldest frame.
+
+    Arguments
+    ---------
+
+     - `frame_count`: Maximum number of frames.
+     - `shape`, `dtype`: Frame shape and type.
+     - `codec`: Codec that encodes each frame independently (see
+       `frame_codec`).
+     - `max_bytes`: Maximum encoded size of all frames (only with `codec`).
+    '''
+    def __init__(self, frame_count, shape, dtype='uint8', codec=None,
+                 max_bytes=None):
+        if frame_count < 1:
+            raise ValueError('Pre-roll must hold at least one frame.')
+        if isinstance(codec, DeltaFrameCodec):
+            raise ValueError('Delta frames cannot be evicted independently.')
+        self.frame_count = frame_count
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.codec = codec
+        if codec is None:
+            self.frames = np.empty((frame_count, ) + self.shape,
+                                   dtype=self.dtype)
+        else:
+            self.frames = deque()
+            if max_bytes is None:
+                max_bytes = frame_count * int(np.prod(self.shape)) * \
+                    self.dtype.itemsize
+        self.max_bytes = max_bytes
+        self.infos = deque()
+        # Index of oldest slot (raw frames only).
+        self.head = 0
+        self.encoded_bytes = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.infos)
+
+    @property
+    def nbytes(self):
+        '''
+        Bytes of frame data held, i.e., preallocated (raw) or encoded.
+        '''
+        if self.codec is None:
+            return self.frames.nbytes
+        return self.encoded_bytes
+
+    @property
+    def oldest_info(self):
+        return self.infos[0] if self.infos else None
+
+    def append(self, frame, info=None):
+        '''
+        Copy (or encode) `frame` into the ring.  Returns list of `info`
+        objects of frames evicted to make room.
+        '''
+        evicted = []
+        if self.codec is None:
+            if len(self) == self.frame_count:
+                evicted.append(self._evict())
+            self.frames[(self.head + len(self)) % self.frame_count] = frame
+        else:
+            header, data = self.codec.encode(frame)
+            data = np.array(data, copy=True)
+            while len(self) and (len(self) == self.frame_count or
+                                 self.encoded_bytes + data.nbytes >
+                                 self.max_bytes):
+                evicted.append(self._evict())
+            self.frames.append((header, data))
+            self.encoded_bytes += data.nbytes
+        self.infos.append(info)
+        return evicted
+
+    def _evict(self):
+        frame, info = self.popleft()
+        self.evicted += 1
+        return info
+
+    def popleft(self):
+        '''
+        Remove the oldest frame.  Returns `(frame, info)`.
+
+        A raw frame is a view into its slot, valid until the next `append`;
+        an encoded frame is a `frame_codec.LazyFrame`, decoded when
+        accessed.
+        '''
+        info = self.infos.popleft()
+        if self.codec is None:
+            frame = self.frames[self.head]
+            self.head = (self.head + 1) % self.frame_count
+        else:
+            header, data = self.frames.popleft()
+            self.encoded_bytes -= data.nbytes
+            frame = self.codec.decode(header, data)
+        return frame, info
@@ -1,5 +1,4 @@
 import sys
-from time import sleep
 import Queue
 import multiprocessing
 from collections import namedtuple
@@ -9,13 +8,30 @@ from datetime import datetime, timedelta
 import os
 import tempfile
 import logging
+import threading
+from time import time
 
 from path_helpers import path, pickle
 import numpy as np
 
-from video import cv, CVCaptureProperties
+from video import cv
+from safe_cv import cv2
 from frame_rate import FrameRateInfo
 from silence import Silence
+from pacing import DeadlineScheduler, monotonic
+from frame_timestamps import (FrameTimestampWriter, FRAME_DUPLICATED,
+                              FRAME_REPEATED, FRAME_AFTER_GAP, FRAME_PREROLL,
+                              timestamps_path)
+from control import (ControlChannel, ControlError, ControlTimeout, Response,
+                     parse_command)
+from segmented_writer import SegmentedVideoWriter
+from frame_stats import RunningStats, RollingPercentiles
+from recorder_log import StreamingRecorderLog, log_path
+from frame_codec import LazyFrame
+from preroll import PreRollBuffer
+from frame_transform import FrameTransform
+from recorder_qos import quality_path
+from spool import SpoolWriter
 
 
 class CVCaptureConfig(object):
@@ -57,9 +73,34 @@ class RecorderLog(object):
     def __init__(self, fps):
         self.fps = fps
         self.times = [datetime.now()]
+        # Time the capture loop waited before each frame.
         self.sleep_times = []
+        # Time spent in capture stage per frame.
         self.record_times = []
         self.frame_lengths = []
+        # Time spent in encoder stage per frame, and frames waiting for the
+        # encoder as each frame was captured.
+        self.encode_times = []
+        self.queue_depths = []
+        # Frames not written because an encoder queue was full (over all
+        # outputs).
+        self.frames_dropped = 0
+        # Frame deadlines missed because capture was late, and extra copies
+        # of frames written in their place (see `RecorderChild`).
+        self.deadline_misses = 0
+        self.frames_duplicated = 0
+        # Frame rate statistics (see `pacing.DeadlineScheduler.stats`).
+        self.rate_stats = {}
+        # Segments of a segmented recording (see
+        # `segmented_writer.SegmentedVideoWriter`).
+        self.segments = []
+        # Frames captured before recording was triggered (see
+        # `RecorderChild`).
+        self.preroll_frames = 0
+        # Lag accounting per output (see `FrameEncoder.stats`).
+        self.outputs = []
+        # Quality changes of the main output (see `RecorderChild`).
+        self.qos_transitions = []
 
     def print_summary(self):
         from pprint import pprint
@@ -74,8 +115,66 @@ class RecorderLog(object):
         print '    max:  %s' % (1.0 / self.frame_lengths.min())
         print '    min:  %s' % (1.0 / self.frame_lengths.max())
 
+        if self.rate_stats.get('achieved_fps') is not None:
+            achieved_fps = self.rate_stats['achieved_fps']
+            print '  Capture rate: %.3f fps (target: %.3f fps, %+.2f%%)' % \
+                (achieved_fps, self.fps, 100 * (achieved_fps / self.fps - 1))
+            print '  Deadlines missed: %d (frames duplicated: %d)' % \
+                (self.deadline_misses, self.frames_duplicated)
+        if self.preroll_frames:
+            print '  Pre-roll frames: %d' % self.preroll_frames
+
+        if self.encode_times:
+            print '  Stage times (mean/max):'
+            print '    capture: %.2f/%.2f ms' % (1e3 * np.mean(self.record_times),
+                                                1e3 * np.max(self.record_times))
+            print '    encode:  %.2f/%.2f ms' % (1e3 * np.mean(self.encode_times),
+                                                1e3 * np.max(self.encode_times))
+            print '  Encoder queue depth (mean/max): %.1f/%d' % \
+                (np.mean(self.queue_depths), np.max(self.queue_depths))
+            print '  Frames dropped (encoder queue full): %d' % \
+                self.frames_dropped
+
+        if len(self.outputs) > 1:
+            print '  Outputs (queued/dropped frames, mean encode time):'
+            for output in self.outputs:
+                print '    %s: %d/%d, %.2f ms' % \
+                    (output['name'], output['frames_queued'],
+                     output['frames_dropped'],
+                     1e3 * (output['encode_time']['mean'] or 0))
+
+        if self.qos_transitions:
+            print '  Quality changes: %d' % len(self.qos_transitions)
+            for transition in self.qos_transitions:
+                print '    frame %d: %s -> %s (lag %.2f), %s' % \
+                    (transition['frame'], transition['from_level'],
+                     transition['to_level'], transition['lag'],
+                     transition['path'])
+
+        if self.segments:
+            print '  Segments: %d' % len(self.segments)
+            for segment in self.segments:
+                # Spool files kept as is have no video file (see
+                # `spool.SpoolWriter`).
+                print '    %s: frames %d-%d' % \
+                    (segment['path'] or segment['spool'],
+                     segment['first_frame'],
+                     segment['first_frame'] + segment['frame_count'] - 1)
+
         pprint(self.frame_lengths)
 
+    def add_frame(self, time, monotonic_time, sleep_time, record_time,
+                  queue_depth):
+        '''
+        Log a captured frame (see `recorder_log.LOG_DTYPE`).  `sleep_time`
+        is `None` for the first frame.
+        '''
+        self.times.append(datetime.fromtimestamp(time))
+        if sleep_time is not None:
+            self.sleep_times.append(sleep_time)
+        self.record_times.append(record_time)
+        self.queue_depths.append(queue_depth)
+
     def save(self, out_file):
         out_path = path(out_file)
         out_path.pickle_dump([self.fps, self.frame_lengths, self.times, self.sleep_times, self.record_times], protocol=pickle.HIGHEST_PROTOCOL)
@@ -88,110 +187,789 @@ class RecorderLog(object):
         self.frame_lengths = np.array([(self.times[i + 1] - self.times[i]).total_seconds()  for i in range(len(self.times) - 1)])
 
 
+class FrameEncoder(object):
+    '''
+    Write frames to a video file from a background thread, so encoding
+    time does not delay capture.
+
+    `cv2.VideoWriter.write` releases the GIL, so encoding runs in parallel
+    with the capture loop (and with other encoders).  Frames are not
+    copied: a frame passed to `put` must not be modified until it has been
+    written, i.e., until up to `queue_length + 1` more frames have been put
+    (see `camera_capture.FramePool`), or until it is released to
+    `frame_pool` (see `camera_capture.SharedFramePool`).
+
+    If `timestamps` is given (see `frame_timestamps.FrameTimestampWriter`),
+    the timestamp record passed to `put` with each frame is written once
+    the frame is written, so records stay in video frame order.
+
+    Encode times are summarized in `encode_stats`, kept for the most recent
+    frames in `recent_encode_times` (see `frame_stats.RollingPercentiles`)
+    and, if `keep_times` is set, listed in `encode_times`.
+
+    `submit` adds per-output selection and lag accounting to `put`: only
+    every `decimation`-th frame deadline is written, frames are reduced by
+    `transform` (see `frame_transform.FrameTransform`) in the encoder
+    thread, and frames dropped because the queue is full are counted.
+
+    `switch` changes writer, transform and decimation between two frames,
+    e.g., to lower recording quality (see `RecorderChild`).
+    '''
+    def __init__(self, writer, queue_length=30, timestamps=None,
+                 keep_times=True, transform=None, decimation=1,
+                 frame_pool=None, name=None):
+        self.writer = writer
+        # Segments are split by grab time of frames.
+        self.timed_writer = isinstance(writer, (SegmentedVideoWriter,
+                                                SpoolWriter))
+        self.timestamps = timestamps
+        self.queue_length = queue_length
+        # Length is limited by `put`, so a writer switch is never dropped.
+        self.queue = Queue.Queue()
+        self.keep_times = keep_times
+        self.encode_times = []
+        self.encode_stats = RunningStats()
+        self.recent_encode_times = RollingPercentiles()
+        self.transform = transform
+        self.transform_buffer = None
+        self.decimation = decimation
+        # Further decimation, counted in frames of this output from
+        # `step_start` (see `switch`).
+        self.step = 1
+        self.step_start = 0
+        self.frame_pool = frame_pool
+        self.name = name
+        # Lag accounting (see `submit`).
+        self.frames_queued = 0
+        self.frames_dropped = 0
+        self.queue_depths = RunningStats()
+        # `True` if frames of this output were left out since the last
+        # frame queued.
+        self.gap = False
+        self.thread = None
+        # Threads releasing writers replaced by `switch`.
+        self.release_threads = []
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, frame, timestamp=None):
+        '''
+        Queue `frame` without blocking.  Returns `False` if the queue is
+        full, i.e., the frame is dropped.
+
+        `timestamp` is a tuple of arguments to `FrameTimestampWriter.write`.
+        '''
+        if self.depth >= self.queue_length:
+            return False
+        if self.frame_pool is not None:
+            self.frame_pool.hold(frame)
+        self.queue.put_nowait((frame, timestamp))
+        return True
+
+    def wants(self, sequence):
+        '''
+        Returns `True` if frame deadline `sequence` is written to this
+        output.
+        '''
+        return sequence % self.decimation == 0 and \
+            (sequence // self.decimation - self.step_start) % self.step == 0
+
+    def skip(self, sequence):
+        '''
+        Note that frame deadline `sequence` has no frame.
+        '''
+        if self.wants(sequence):
+            self.gap = True
+
+    def submit(self, frame, grab_times, sequence, flags=0):
+        '''
+        Queue `frame` for frame deadline `sequence` if this output wants it
+        (see `decimation`).  Returns `False` if the frame is dropped.
+        '''
+        if not self.wants(sequence):
+            return True
+        if self.gap:
+            flags |= FRAME_AFTER_GAP
+        self.queue_depths.add(self.depth)
+        if self.put(frame, grab_times + (sequence // self.decimation,
+                                         flags)):
+            self.gap = False
+            self.frames_queued += 1
+            return True
+        self.gap = True
+        self.frames_dropped += 1
+        logging.getLogger('opencv.recorder').info(
+            'warning: encoder queue of %s is full, frame dropped' % self.name)
+        return False
+
+    def switch(self, create_writer, transform=None, step=1, sequence=0):
+        '''
+        Write frames from frame deadline `sequence` on to the writer
+        returned by `create_writer()`, reduced by `transform`, and only
+        every `step`-th frame of this output from `sequence`.
+
+        Frames queued so far are written to the current writer first, and
+        the new writer is created in the encoder thread.  Frame numbers of
+        the timestamp sidecar continue, i.e., frames left out by `step` show
+        as gaps in the sequence (without `FRAME_AFTER_GAP`).
+
+        Returns index of the first frame of the new writer, counted over all
+        writers.
+        '''
+        self.step = step
+        self.step_start = -(-sequence // self.decimation)
+        self.queue.put(_WriterSwitch(create_writer, transform))
+        return self.frames_queued
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    def stats(self):
+        '''
+        Returns lag accounting and encode time statistics.
+        '''
+        return dict(name=self.name, decimation=self.decimation,
+                    frames_queued=self.frames_queued,
+                    frames_dropped=self.frames_dropped,
+                    queue_depth=self.queue_depths.summary(),
+                    encode_time=self.encode_stats.summary())
+
+    def stop(self):
+        '''
+        Wait for queued frames to be written.
+        '''
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        for thread in self.release_threads:
+            thread.join()
+        self.release_threads = []
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if isinstance(item, _WriterSwitch):
+                self._switch_writer(*item)
+                continue
+            frame, timestamp = item
+            start = monotonic()
+            source = frame
+            if isinstance(frame, LazyFrame):
+                # Compressed pre-roll frame (see `preroll.PreRollBuffer`).
+                frame = frame.decode()
+            if self.transform is not None:
+                if self.transform_buffer is None:
+                    self.transform_buffer = \
+                        np.empty(self.transform.output_shape(frame.shape),
+                                 dtype=frame.dtype)
+                frame = self.transform.apply(frame, self.transform_buffer)
+                if self.frame_pool is not None:
+                    # Captured frame is no longer needed.
+                    self.frame_pool.release(source)
+                    source = None
+            if self.timed_writer and timestamp is not None:
+                self.writer.write(frame, timestamp[0])
+            else:
+                self.writer.write(frame)
+            if self.frame_pool is not None and source is not None:
+                self.frame_pool.release(source)
+            encode_time = monotonic() - start
+            self.encode_stats.add(encode_time)
+            self.recent_encode_times.add(encode_time)
+            if self.keep_times:
+                self.encode_times.append(encode_time)
+            if self.timestamps is not None and timestamp is not None:
+                self.timestamps.write(*timestamp)
+
+    def _switch_writer(self, create_writer, transform):
+        finished_writer = self.writer
+        self.writer = create_writer()
+        self.timed_writer = isinstance(self.writer, (SegmentedVideoWriter,
+                                                     SpoolWriter))
+        self.transform = transform
+        self.transform_buffer = None
+        # Release (i.e., finish the file) without holding up frames.
+        thread = threading.Thread(target=finished_writer.release)
+        thread.daemon = True
+        thread.start()
+        self.release_threads.append(thread)
+
+
+# Queued by `FrameEncoder.switch`.
+_WriterSwitch = namedtuple('_WriterSwitch', 'create_writer transform')
+
+
+class RecorderOutput(namedtuple('RecorderOutput', 'output_path codec '
+                                'decimation scale segment_limits spool')):
+    '''
+    Additional output of a `Recorder`, encoded from the same captured
+    frames as the main output.
+
+    Arguments
+    ---------
+
+     - `output_path`: Video file (a timestamp sidecar is written next to
+       it, see `frame_timestamps`).
+     - `codec`: FourCC code, e.g., `'XVID'` (default as for `Recorder`).
+     - `decimation`: Write every `decimation`-th frame, i.e., at
+       `fps / decimation`.
+     - `scale`: Scale factor of frames, e.g., `0.25` for a small preview.
+     - `segment_limits`: See `segmented_writer.SegmentedVideoWriter`.
+     - `spool`: Write raw frames to spool files, encoded in the background
+       with `codec`, e.g., `dict(processes=2)` (keyword arguments of
+       `spool.SpoolWriter`).
+    '''
+    def __new__(cls, output_path, codec=None, decimation=1, scale=1.,
+                segment_limits=None, spool=None):
+        if int(decimation) < 1:
+            raise ValueError('Decimation must be at least 1.')
+        if scale <= 0:
+            raise ValueError('Scale must be positive.')
+        if segment_limits and spool is not None:
+            raise ValueError('Spool files are split by `spool` options, not '
+                             'segment limits.')
+        return super(RecorderOutput, cls).__new__(cls, path(output_path),
+                                                  codec, int(decimation),
+                                                  float(scale),
+                                                  segment_limits, spool)
+
+
+# Captured frame, as passed from `RecorderChild._capture_frame` to
+# `RecorderChild._write_frame`:
+#
+#  - `grab_times`: Wall clock and monotonic time of grab.
+#  - `deadline`: Deadline number (see `RecorderChild.deadline`).
+#  - `missed`: Deadlines missed before this one.
+#  - `flags`: See `frame_timestamps`.
+#  - `log_entry`: Arguments to `RecorderLog.add_frame`.
+_CaptureInfo = namedtuple('_CaptureInfo', 'grab_times deadline missed flags '
+                          'log_entry')
+
+
 class RecorderChild(object):
+    '''
+    Record from a capture device.  Frames are captured by the main loop and
+    written by a `FrameEncoder` thread, joined by a queue of up to
+    `queue_length` frames, so encoder speed does not affect capture timing.
+
+    Frames are captured at absolute deadlines, one frame period apart, on a
+    monotonic clock (see `pacing.DeadlineScheduler`), so capture time does
+    not reduce the frame rate and timing errors do not accumulate.
+
+    The video file has a fixed frame rate, so each deadline corresponds to
+    one frame of the video.  If a capture takes longer than a frame period,
+    the deadlines passed in the meantime are missed, and `lag_policy`
+    decides what is written in their place:
+
+     - `'duplicate'` (default): Write the next captured frame once per
+       missed deadline in addition to its own, so the video stays as long
+       as the recording and motion stays in time.
+     - `'drop'`: Write nothing, so the video is shorter than the recording
+       (i.e., plays back faster than real time while lagging).
+
+    If the device returns no frame, the previous frame is written again.
+
+    The grab time of every written frame is recorded in a sidecar file next
+    to the video, along with its deadline number and whether it is a copy
+    (see `frame_timestamps`).
+
+    If `segment_limits` is given, e.g., `dict(max_seconds=3600)`, the video
+    is split into files of limited length (see
+    `segmented_writer.SegmentedVideoWriter`).  Frame numbers of the
+    timestamp sidecar count over all segments.
+
+    With `log_mode` `'streaming'`, the log sent to the parent is a
+    `recorder_log.StreamingRecorderLog`, which writes per-frame records to
+    a file next to the video and keeps only summary statistics in memory,
+    rather than a `RecorderLog`.
+
+    If `preroll_seconds` is set, frames are captured (at the same deadlines)
+    while waiting for `'record'`, and the most recent `preroll_seconds` of
+    frames are kept in a `preroll.PreRollBuffer`, raw or compressed with
+    `preroll_codec` (e.g., `frame_codec.JPEGFrameCodec(quality=90)`).  On
+    `'record'`, the recording starts with the oldest frame kept: frames are
+    moved from the ring to the encoder as the encoder queue has room, and
+    live frames are appended to the ring until it is empty, so frames stay
+    in order and deadlines (i.e., frame timing) continue across the
+    trigger.  Frames captured before the trigger are flagged in the
+    timestamp sidecar (see `frame_timestamps.FRAME_PREROLL`).
+
+    `outputs` lists additional outputs (see `RecorderOutput`), encoded from
+    the same captured frames.  Each output has its own `FrameEncoder`
+    thread and queue, so a slow output drops its own frames (see
+    `RecorderLog.outputs`) without delaying capture or the other outputs.
+
+    If `qos` is given (see `recorder_qos.QualityController`), the quality
+    of the main output is lowered while the recording lags, i.e., while its
+    encoder queue fills up or frame deadlines are missed, and raised again
+    once the encoder keeps up.  Each quality change starts a new video file
+    (see `recorder_qos.quality_path`), while the timestamp sidecar of the
+    main output continues over all files.  Frames of a `spool` level are
+    spooled (see below), and encoded by background threads.  Quality
+    changes are listed in
+    `RecorderLog.qos_transitions`.
+
+    If `spool` is given, e.g., `dict(processes=2)`, frames of the main
+    output are copied raw to preallocated, memory-mapped spool files rather
+    than encoded, so the capture rate is bounded by memory bandwidth rather
+    than by the video codec, and spool files are encoded with `codec` by a
+    pool of background processes as they fill up (see `spool.SpoolWriter`
+    for options).  Encoding is finished before the log is sent, and spool
+    files are listed in `RecorderLog.segments`.
+
+    While recording, a telemetry snapshot (see `_send_telemetry`) is sent to
+    the parent as a `('telemetry', snapshot)` message every
+    `telemetry_interval` seconds (`None` to disable).  Snapshots are built
+    from counters kept anyway, and the interval is checked against the
+    frame deadline, so the cost per frame is a comparison.
+    '''
     STATES = dict(RECORDING=10, STOPPED=20)
+    LAG_POLICIES = ('duplicate', 'drop')
+    LOG_MODES = ('memory', 'streaming')
+
+    def __init__(self, conn, output_path, cam_cap, fps=24, codec=None,
+                 queue_length=30, lag_policy='duplicate',
+                 segment_limits=None, log_mode='memory', preroll_seconds=0,
+                 preroll_codec=None, outputs=(), qos=None, spool=None,
+                 telemetry_interval=1.):
+        from camera_capture import SharedFramePool
 
-    def __init__(self, conn, output_path, cam_cap, fps=24, codec=None):
+        if lag_policy not in self.LAG_POLICIES:
+            raise ValueError('Invalid lag policy: %s' % lag_policy)
+        if log_mode not in self.LOG_MODES:
+            raise ValueError('Invalid log mode: %s' % log_mode)
+        if qos is not None and segment_limits:
+            raise ValueError('Quality changes cannot be combined with '
+                             'segment limits.')
+        # Startup phase durations, reported to the parent with `'ready'`.
+        self.startup = dict(process_start=monotonic())
         self.conn = conn
         self.output_path = path(output_path)
         self.fps = fps
+        self.lag_policy = lag_policy
+        self.segment_limits = segment_limits
+        self.log_mode = log_mode
         if codec is None and not os.name == 'nt':
             codec = 'XVID'
         self.codec = codec
         logging.getLogger('opencv.recorder').info('[RecorderChild] Using codec: %s' % self.codec)
         self.cam_cap = cam_cap
+        start = monotonic()
         self.cam_cap.init_capture()
-        self.writer = self._get_writer()
+        width, height = self.cam_cap.dimensions
+        # Enough buffers for every queued frame, plus the frame being
+        # written, of each output, and the frame being captured.
+        self.frame_pool = SharedFramePool((height, width, 3),
+                                          size=(1 + len(outputs)) *
+                                          (queue_length + 1) + 2)
+        self.startup['init_capture'] = monotonic() - start
+        if preroll_seconds > 0:
+            self.preroll = PreRollBuffer(int(np.ceil(preroll_seconds * fps)),
+                                         (height, width, 3),
+                                         codec=preroll_codec)
+        else:
+            self.preroll = None
+        # `True` while frames are moved from the pre-roll to the encoder.
+        self.draining = False
+        start = monotonic()
+        self.queue_length = queue_length
+        self.encoders = [self._create_encoder(output) for output in
+                         [RecorderOutput(self.output_path, self.codec,
+                                         segment_limits=segment_limits,
+                                         spool=spool)] +
+                         list(outputs)]
+        # Main output.
+        self.encoder = self.encoders[0]
+        self.writer = self.encoder.writer
+        self.startup['create_writer'] = monotonic() - start
         self.state = self.STATES['STOPPED']
         self.frame_period = 1.0 / self.fps
-        
-    def _get_writer(self):
-        if self.codec is None:
+        self.scheduler = DeadlineScheduler(self.fps)
+        self.prev_frame = None
+        # Grab times of `prev_frame` (wall clock and monotonic).
+        self.prev_grab_times = None
+        self.capture_end = None
+        # Number of the current frame deadline since the scheduler was reset,
+        # number of the deadline of the first frame of the recording, and
+        # whether frames were left out of the video since the last written
+        # frame.
+        self.deadline = -1
+        self.sequence_base = 0
+        self.qos = qos
+        if qos is not None:
+            qos.reset()
+        self.telemetry_interval = telemetry_interval
+        # Monotonic time of next telemetry snapshot, and time and number of
+        # live frames captured at the previous one.
+        self.telemetry_time = None
+        self.telemetry_last = None
+        self.frames_captured = 0
+        # Pre-roll frames written to the recording so far (see `_drain`).
+        self.preroll_written = 0
+
+    def _frame_transform(self, scale):
+        '''
+        Returns `(transform, frame_size)` of frames scaled by `scale`.
+        '''
+        if scale == 1:
+            return None, self.cam_cap.dimensions
+        transform = FrameTransform(scale=scale)
+        width, height = self.cam_cap.dimensions
+        height, width = transform.output_shape((height, width))
+        return transform, (width, height)
+
+    def _create_encoder(self, output):
+        codec = output.codec
+        if codec is None and not os.name == 'nt':
+            codec = 'XVID'
+        fps = self.fps / output.decimation
+        transform, frame_size = self._frame_transform(output.scale)
+        if output.spool is not None:
+            writer = self._get_spool_writer(output.output_path, codec, fps,
+                                            frame_size, output.spool)
+        else:
+            writer = self._get_writer(output.output_path, codec, fps,
+                                      frame_size, output.segment_limits)
+        timestamps = FrameTimestampWriter(timestamps_path(output.output_path),
+                                          fps)
+        return FrameEncoder(writer, self.queue_length, timestamps,
+                            keep_times=self.log_mode == 'memory',
+                            transform=transform,
+                            decimation=output.decimation,
+                            frame_pool=self.frame_pool,
+                            name=output.output_path.name)
+
+    def _get_writer(self, output_path, codec, fps, frame_size,
+                    segment_limits=None):
+        if codec is None:
             fourcc = -1
         else:
-            fourcc = cv.CV_FOURCC(*self.codec)
-        writer = cv.CreateVideoWriter(self.output_path, fourcc, self.fps,
-                                            self.cam_cap.dimensions, True)
+            fourcc = cv.CV_FOURCC(*codec)
+        if segment_limits:
+            return SegmentedVideoWriter(output_path, fourcc, fps, frame_size,
+                                        True, **segment_limits)
+        # Unlike `cv.WriteFrame`, `cv2.VideoWriter.write` releases the GIL.
+        writer = cv2.VideoWriter(output_path, fourcc, fps, frame_size, True)
         return writer
 
-    def main(self):
-        import numpy as np
-
-        prev_frame = None
+    def _get_spool_writer(self, output_path, codec, fps, frame_size,
+                          options):
+        if codec is None:
+            fourcc = -1
+        else:
+            fourcc = cv.CV_FOURCC(*codec)
+        width, height = frame_size
+        return SpoolWriter(output_path, (height, width, 3), fps, fourcc,
+                           **options)
 
+    def main(self):
+        start = monotonic()
         self.cam_cap.get_framerate_info()
-        frame_count = 0
-        record_id = 0
-        avg_count = 1
-        record_times_smooth = np.array(avg_count * [0.1 * self.frame_period])
-        frame_periods = np.array(avg_count * [0.95 * self.frame_period])
+        self.startup['framerate_info'] = monotonic() - start
         logging.getLogger('opencv.recorder').info('Target FPS: %.4f' % (self.fps))
 
-        log = RecorderLog(self.fps)
-
-        iter_count = 1000
-        extra_start = datetime.now()
-        for i in range(iter_count):
-            log.sleep_times.append(1)
-            log.record_times.append(1)
-            log.times.append(1)
-            frame_count += 1
-            record_id = (record_id + 1) % avg_count
-        log.sleep_times = []
-        log.record_times = []
-        del log.times[1:]
-        record_id = 0
-        frame_count = 0
-        extra_time = (datetime.now() - extra_start).total_seconds() / float(iter_count)
-
-        self.conn.send('ready')
+        if self.log_mode == 'streaming':
+            log = StreamingRecorderLog(self.fps, log_path(self.output_path))
+        else:
+            log = RecorderLog(self.fps)
 
-        while True:
-            if self.conn.poll():
-                command = self.conn.recv()
+        self.startup['ready_time'] = monotonic()
+        self.conn.send(('ready', self.startup))
+
+        for encoder in self.encoders:
+            encoder.start()
+        stopping = False
+        stop_request = None
+        while not stopping:
+            # Handle commands as they arrive while waiting for the next
+            # deadline.
+            while self.conn.poll(self.scheduler.remaining()):
+                request_id, command, args = parse_command(self.conn.recv())
                 if command == 'stop':
                     logging.getLogger('opencv.recorder').info('stop recording')
                     self.state = self.STATES['STOPPED']
+                    # Log is sent in response, once recording has stopped.
+                    stopping = True
+                    stop_request = request_id
                     break
                 elif command == 'record':
                     logging.getLogger('opencv.recorder').info('recording')
+                    if self.state != self.STATES['RECORDING']:
+                        self._start_recording(log)
                     self.state = self.STATES['RECORDING']
+                if request_id is not None:
+                    self.conn.send(Response(request_id, command, None))
+            if stopping:
+                break
+            missed = self.scheduler.wait()
             if self.state == self.STATES['RECORDING']:
-                log.times.append(datetime.now())
-                frame_periods[record_id] = (log.times[-1] - log.times[-2]).total_seconds()
-                frame = self.cam_cap.get_frame()
-                if frame:
-                    cv.WriteFrame(self.writer, frame)
-                    prev_frame = frame
-                else:
-                    cv.WriteFrame(self.writer, prev_frame)
-                record_times_smooth[record_id] = (datetime.now() - log.times[-1]).total_seconds()
-                if frame_count > 10:
-                    sleep_time = self.frame_period - record_times_smooth[record_id]\
-                                    + 0.5 * (self.frame_period - frame_periods.mean())\
-                                    - extra_time
+                frame, info = self._capture_frame(missed)
+                if self.draining:
+                    self._drain(log)
+                if self.draining and frame is not None:
+                    # Live frames wait behind the pre-roll frames.
+                    for evicted in self.preroll.append(frame, info):
+                        # Encoders did not keep up.
+                        for encoder in self.encoders:
+                            encoder.gap = True
+                        log.frames_dropped += 1
                 else:
-                    sleep_time = self.frame_period - record_times_smooth[record_id]\
-                                    - extra_time
-
-                log.sleep_times.append(sleep_time)
-                log.record_times.append(record_times_smooth[record_id])
-                record_id = (record_id + 1) % avg_count
-
-                if sleep_time > 0:
-                    sleep(sleep_time)
-                else:
-                    logging.getLogger('opencv.recorder').info('warning: recording is lagging')
-                frame_count += 1
-
+                    self._write_frame(log, frame, info)
+                    if self.qos is not None:
+                        self._update_qos(log, info)
+                if self.telemetry_time is not None and \
+                        self.scheduler.last_deadline >= self.telemetry_time:
+                    self._send_telemetry(log)
+            elif self.preroll is not None:
+                frame, info = self._capture_frame(missed)
+                if frame is not None:
+                    self.preroll.append(frame, info)
+            else:
+                # Keep driver queue fresh until recording starts, without
+                # decoding frames.
+                self.cam_cap.grab()
 
+        # Write remaining queued frames.
+        for encoder in self.encoders:
+            encoder.stop()
+            encoder.writer.release()
+            encoder.timestamps.close()
+        log.outputs = [encoder.stats() for encoder in self.encoders]
+        log.frames_dropped += sum([encoder.frames_dropped
+                                   for encoder in self.encoders])
+        if self.log_mode == 'streaming':
+            log.encode_times = self.encoder.encode_stats
+        else:
+            log.encode_times = self.encoder.encode_times
+        if isinstance(self.writer, (SegmentedVideoWriter, SpoolWriter)):
+            log.segments = self.writer.segments
+        log.rate_stats = self.scheduler.stats()
         log.finish()
 
         # Report log back to parent process
-        self.conn.send(log)
+        if stop_request is None:
+            self.conn.send(log)
+        else:
+            self.conn.send(Response(stop_request, 'stop', log))
 
         return
 
+    def _start_recording(self, log):
+        if self.telemetry_interval is not None:
+            now = monotonic()
+            self.telemetry_time = now + self.telemetry_interval
+            self.telemetry_last = (now, 0)
+        if self.preroll is not None and len(self.preroll):
+            # Recording starts with the oldest pre-roll frame, and deadlines
+            # continue.
+            self.sequence_base = self.preroll.oldest_info.deadline
+            self.draining = True
+            log.preroll_frames = len(self.preroll)
+            self._drain(log)
+        else:
+            # First frame is due now.
+            self.scheduler.reset()
+            self.capture_end = None
+            self.deadline = -1
+            self.sequence_base = 0
+
+    def _capture_frame(self, missed):
+        '''
+        Capture a frame for the current deadline.
+
+        Returns `(frame, info)`, where `frame` is `None` if no frame has been
+        captured yet (see `_CaptureInfo`).
+        '''
+        self.deadline += missed + 1
+        capture_start = monotonic()
+        capture_time = time()
+        if self.capture_end is not None:
+            sleep_time = capture_start - self.capture_end
+        else:
+            sleep_time = None
+        queue_depth = self.encoder.depth
+        # Grab and retrieve separately, to timestamp the grab.
+        if self.cam_cap.grab():
+            grab_times = (time(), monotonic())
+            frame = self.cam_cap.retrieve(out=self.frame_pool.next())
+        else:
+            frame = None
+        flags = 0
+        if self.state != self.STATES['RECORDING']:
+            flags |= FRAME_PREROLL
+        if frame is not None:
+            self.prev_frame = frame
+            self.prev_grab_times = grab_times
+        else:
+            frame = self.prev_frame
+            grab_times = self.prev_grab_times
+            flags |= FRAME_REPEATED
+        self.capture_end = monotonic()
+        return frame, _CaptureInfo(grab_times, self.deadline, missed, flags,
+                                   (capture_time, capture_start, sleep_time,
+                                    self.capture_end - capture_start,
+                                    queue_depth))
+
+    def _missed(self, info):
+        # Deadlines before the first frame of the recording do not count.
+        return min(info.missed, info.deadline - self.sequence_base)
+
+    def _drain(self, log):
+        '''
+        Move pre-roll frames to the encoders, as long as any encoder queue
+        has room (i.e., a slow output drops frames rather than holding back
+        the others).
+        '''
+        while len(self.preroll):
+            info = self.preroll.oldest_info
+            if self.lag_policy == 'duplicate':
+                copies = 1 + self._missed(info)
+            else:
+                copies = 1
+            if min([encoder.depth for encoder in self.encoders]) + copies > \
+                    self.queue_length:
+                return
+            frame, info = self.preroll.popleft()
+            if not isinstance(frame, LazyFrame):
+                # Ring slot is reused by the next `append`.
+                out = self.frame_pool.next()
+                out[:] = frame
+                frame = out
+            self._write_frame(log, frame, info)
+            self.preroll_written += 1
+        self.draining = False
+        logging.getLogger('opencv.recorder').info('pre-roll written')
+
+    def _send_telemetry(self, log):
+        '''
+        Send snapshot of recording progress to the parent:
+
+         - `time`: Wall clock time of snapshot.
+         - `frames_captured`: Frames captured since recording started,
+           including pre-roll frames.
+         - `preroll_frames`: Pre-roll frames written so far.
+         - `frames_written`: Frames encoded to the main output.
+         - `frames_duplicated`, `deadline_misses`: See `RecorderLog`.
+         - `frames_dropped`: Frames dropped so far, over all outputs.
+         - `achieved_fps`: Capture rate since capture started (see
+           `pacing.DeadlineScheduler`).
+         - `fps`: Capture rate of live frames (i.e., not pre-roll) since
+           the previous snapshot.
+         - `queue_depth`: Frames waiting for the main encoder.
+         - `encode_time_p95`: 95th percentile of encode time of the most
+           recent frames of the main output, in seconds.
+         - `quality`: Name of the current quality level (see `qos`), or
+           `None`.
+        '''
+        now = monotonic()
+        last_time, last_captured = self.telemetry_last
+        live_captured = self.frames_captured - self.preroll_written
+        snapshot = dict(time=time(), frames_captured=self.frames_captured,
+                        preroll_frames=self.preroll_written,
+                        frames_written=self.encoder.encode_stats.count,
+                        frames_duplicated=log.frames_duplicated,
+                        deadline_misses=log.deadline_misses,
+                        frames_dropped=log.frames_dropped +
+                        sum([encoder.frames_dropped
+                             for encoder in self.encoders]),
+                        achieved_fps=self.scheduler.achieved_fps,
+                        fps=(live_captured - last_captured) /
+                        (now - last_time),
+                        queue_depth=self.encoder.depth,
+                        encode_time_p95=self.encoder.recent_encode_times
+                        .percentile(95),
+                        quality=self.qos.levels[self.qos.level].name
+                        if self.qos is not None else None)
+        self.conn.send(('telemetry', snapshot))
+        self.telemetry_last = (now, live_captured)
+        self.telemetry_time += self.telemetry_interval
+        if self.telemetry_time <= now:
+            # Snapshot was late; skip rather than catch up.
+            self.telemetry_time = now + self.telemetry_interval
+
+    def _update_qos(self, log, info):
+        # Lag of the main output, i.e., the output with quality levels.
+        lag = min(self.encoder.depth / float(self.queue_length), 1.)
+        if self._missed(info):
+            lag = 1.
+        capture_start = info.log_entry[1]
+        index = self.qos.update(capture_start, lag)
+        if index is None:
+            return
+        previous = self.qos.levels[log.qos_transitions[-1]['level']
+                                   if log.qos_transitions else 0]
+        level = self.qos.levels[index]
+        file_index = len(log.qos_transitions) + 1
+        output_path = path(quality_path(self.output_path, file_index))
+        codec = level.codec or self.codec
+        fps = self.fps / float(level.decimation)
+        transform, frame_size = self._frame_transform(level.scale)
+        transition = dict(time=info.log_entry[0], monotonic=capture_start,
+                          level=index, from_level=previous.name,
+                          to_level=level.name, lag=lag,
+                          path=str(output_path.name))
+        if level.spool:
+            # Split and named as by `spool.SpoolWriter`.
+            transition['spool'] = True
+
+            def create_writer():
+                # Called from the encoder thread, so spool files are
+                # encoded by threads (forking a process with running
+                # threads is unsafe).
+                return self._get_spool_writer(output_path, codec, fps,
+                                              frame_size, dict(threads=True))
+        else:
+            def create_writer():
+                return self._get_writer(output_path, codec, fps, frame_size)
+        # New settings apply from the next deadline.
+        transition['frame'] = \
+            self.encoder.switch(create_writer, transform, level.decimation,
+                                info.deadline - self.sequence_base + 1)
+        log.qos_transitions.append(transition)
+        logging.getLogger('opencv.recorder').info(
+            'recording quality: %s -> %s (lag %.2f), writing to %s' %
+            (previous.name, level.name, lag, output_path.name))
+
+    def _write_frame(self, log, frame, info):
+        '''
+        Queue a captured frame for the encoders, along with a copy per missed
+        deadline if `lag_policy` is `'duplicate'`.
+        '''
+        missed = self._missed(info)
+        log.deadline_misses += missed
+        if missed:
+            logging.getLogger('opencv.recorder').info(
+                'warning: recording is lagging, %d frame deadline(s) missed'
+                % missed)
+        log.add_frame(*info.log_entry)
+        self.frames_captured += 1
+        sequence = info.deadline - self.sequence_base
+        if frame is None:
+            for encoder in self.encoders:
+                encoder.skip(sequence)
+            return
+        if self.lag_policy == 'duplicate':
+            # Copies fill the missed deadlines, before the frame itself.
+            copies = [(sequence - missed + i, info.flags | FRAME_DUPLICATED)
+                      for i in xrange(missed)]
+            log.frames_duplicated += missed
+        else:
+            copies = []
+            for i in xrange(missed):
+                for encoder in self.encoders:
+                    encoder.skip(sequence - missed + i)
+        for sequence, flags in copies + [(sequence, info.flags)]:
+            for encoder in self.encoders:
+                encoder.submit(frame, info.grab_times, sequence, flags)
+
 
 class RecordFrameRateInfo(FrameRateInfo):
     def __init__(self, cam_cap, codec=None):
@@ -222,7 +1000,8 @@ class RecordFrameRateInfo(FrameRateInfo):
                         prev_frame = frame
                     else:
                         cv.WriteFrame(writer, prev_frame)
-                    self.cam_cap.get_frame()
+                    # Skip a frame without decoding it.
+                    self.cam_cap.grab()
                     times.append(datetime.now())
 
                 frame_lengths = np.array([(times[i + 1] - times[i]).total_seconds()  for i in range(len(times) - 1)])
@@ -234,53 +1013,335 @@ class RecordFrameRateInfo(FrameRateInfo):
         return np.array(times), frame_lengths
 
 
+class FrameGrabberRecorder(object):
+    '''
+    Record frames published by a `frame_grabber.FrameGrabber` (e.g., one
+    that also feeds a live display), rather than opening the capture device
+    again in a separate `RecorderChild` process.
+
+    Frames are taken from a `'sync'` subscription and written by a
+    `FrameEncoder` thread, so the thread delivering frames (e.g., the GTK
+    main loop) only queues them, and encoding (`cv2.VideoWriter.write`
+    releases the GIL) does not block it.  Frames encoded by the grabber
+    (see `frame_codec.LazyFrame`) are decoded in the encoder thread.
+
+    As for `RecorderChild`, each frame period of the video is a deadline,
+    here counted from the grab time of the first frame.  A frame arriving
+    after missed deadlines is written once per missed deadline in addition
+    to its own (`lag_policy` `'duplicate'`), or only once (`'drop'`), and
+    frames arriving before their deadline is due are skipped.
+
+    The subscription is closed when the grabber is stopped: no further
+    frames are written, but `stop` must still be called to finish the video
+    file.
+    '''
+    def __init__(self, grabber, output_path, fps=24, codec=None,
+                 queue_length=30, lag_policy='duplicate'):
+        if lag_policy not in RecorderChild.LAG_POLICIES:
+            raise ValueError('Invalid lag policy: %s' % lag_policy)
+        self.grabber = grabber
+        self.output_path = path(output_path)
+        self.fps = fps
+        if codec is None and not os.name == 'nt':
+            codec = 'XVID'
+        self.codec = codec
+        self.queue_length = queue_length
+        self.lag_policy = lag_policy
+        self.subscription = None
+        self.encoder = None
+        self.log = None
+        # Grab time of the first frame, in seconds since the epoch, and
+        # number of the last deadline written.
+        self.start_time = None
+        self.deadline = -1
+        # Frames received before their deadline was due.
+        self.frames_skipped = 0
+
+    def _get_writer(self, frame):
+        if self.codec is None:
+            fourcc = -1
+        else:
+            fourcc = cv.CV_FOURCC(*self.codec)
+        height, width = frame.shape[:2]
+        # Unlike `cv.WriteFrame`, `cv2.VideoWriter.write` releases the GIL.
+        return cv2.VideoWriter(self.output_path, fourcc, self.fps,
+                               (width, height), True)
+
+    def _write_frame(self, frame, grab_time):
+        grab_seconds = (grab_time - datetime.fromtimestamp(0))\
+            .total_seconds()
+        if self.encoder is None:
+            self.encoder = FrameEncoder(self._get_writer(frame),
+                                        self.queue_length, name=
+                                        self.output_path.name)
+            self.encoder.start()
+            self.start_time = grab_seconds
+        deadline = int(round((grab_seconds - self.start_time) * self.fps))
+        if deadline <= self.deadline:
+            # Deadline already written.
+            self.frames_skipped += 1
+            return
+        if self.grabber.transport.zero_copy:
+            # Frame is only valid during this call (see `FrameSubscription`).
+            frame = frame.copy()
+        missed = deadline - self.deadline - 1
+        self.deadline = deadline
+        self.log.deadline_misses += missed
+        self.log.times.append(grab_time)
+        grab_times = (grab_seconds, None)
+        if self.lag_policy == 'duplicate':
+            # Copies fill the missed deadlines, before the frame itself.
+            for sequence in xrange(deadline - missed, deadline):
+                self.encoder.submit(frame, grab_times, sequence,
+                                    FRAME_DUPLICATED)
+            self.log.frames_duplicated += missed
+        else:
+            for sequence in xrange(deadline - missed, deadline):
+                self.encoder.skip(sequence)
+        self.encoder.submit(frame, grab_times, deadline)
+
+    def record(self):
+        logging.getLogger('opencv.recorder').info('request recording: %s' % datetime.now())
+        self.log = RecorderLog(self.fps)
+        self.start_time = None
+        self.deadline = -1
+        self.frames_skipped = 0
+        self.subscription = self.grabber.subscribe(self._write_frame,
+                                                   policy='sync')
+
+    def stop(self):
+        logging.getLogger('opencv.recorder').info('request stop: %s' % datetime.now())
+        if self.subscription is None:
+            return None
+        # Subscription may already be closed by `grabber.stop`.
+        self.grabber.unsubscribe(self.subscription)
+        self.subscription = None
+        log = self.log
+        if self.encoder is not None:
+            # Write remaining queued frames.
+            self.encoder.stop()
+            self.encoder.writer.release()
+            log.outputs = [self.encoder.stats()]
+            log.frames_dropped += self.encoder.frames_dropped
+            self.encoder = None
+        log.finish()
+        return log
+
+
 class Recorder(object):
-    def __init__(self, output_path, cam_cap, fps=24, codec=None, auto_init=False):
+    '''
+    Record from a capture device in a `RecorderChild` process.
+
+    If `prewarm` is set, the child is launched in the background by the
+    constructor and waits, with the capture and writer initialized, for
+    `record`.  See `startup` for startup phase times.
+
+    `queue_length` frames may wait for the encoder thread of the child (see
+    `FrameEncoder`).  `lag_policy` decides what is written for frame
+    deadlines missed while capture lags (see `RecorderChild`).
+
+    Pass `segment_limits` (e.g., `dict(max_seconds=3600)`) to split long
+    recordings into several files (see
+    `segmented_writer.SegmentedVideoWriter`), and `log_mode='streaming'` to
+    log frames to a file in constant memory (see `RecorderChild`).
+
+    `outputs` lists additional outputs of the same capture, e.g., a small
+    preview next to a lossless archive (see `RecorderOutput`).
+
+    Pass a `recorder_qos.QualityController` as `qos` to lower recording
+    quality while the recording lags (see `RecorderChild`), or `spool` to
+    copy frames raw to disk during recording and encode them in the
+    background, e.g., for short high-speed bursts.
+
+    With `preroll_seconds`, the recording starts up to `preroll_seconds`
+    before `record` is called (see `RecorderChild`).  Frames are only kept
+    while the child runs, so use with `prewarm` or `auto_init`.
+
+    While recording, the child reports progress every `telemetry_interval`
+    seconds (see `RecorderChild._send_telemetry`).  The latest snapshot is
+    returned by `stats`, and passed to `telemetry_callback`, if given, from
+    a background thread.
+
+    Waits for the child raise `control.ChildDiedError` if the child exits,
+    or `control.ControlTimeout` after `control_timeout` seconds.  See
+    `control_stats` for command round trip times.
+    '''
+    def __init__(self, output_path, cam_cap, fps=24, codec=None,
+                 auto_init=False, prewarm=False, control_timeout=30.,
+                 queue_length=30, lag_policy='duplicate',
+                 segment_limits=None, log_mode='memory', preroll_seconds=0,
+                 preroll_codec=None, outputs=(), qos=None, spool=None,
+                 telemetry_interval=1., telemetry_callback=None):
+        if lag_policy not in RecorderChild.LAG_POLICIES:
+            raise ValueError('Invalid lag policy: %s' % lag_policy)
+        if log_mode not in RecorderChild.LOG_MODES:
+            raise ValueError('Invalid log mode: %s' % log_mode)
+        if qos is not None and segment_limits:
+            raise ValueError('Quality changes cannot be combined with '
+                             'segment limits.')
+        if segment_limits and spool is not None:
+            raise ValueError('Spool files are split by `spool` options, not '
+                             'segment limits.')
         self.output_path = path(output_path)
         self.fps = fps
         self.cam_cap = cam_cap
         self.codec = codec
+        self.queue_length = queue_length
+        self.lag_policy = lag_policy
+        self.segment_limits = segment_limits
+        self.log_mode = log_mode
+        self.preroll_seconds = preroll_seconds
+        self.preroll_codec = preroll_codec
+        self.outputs = list(outputs)
+        self.qos = qos
+        self.spool = spool
+        self.telemetry_interval = telemetry_interval
+        self.telemetry_callback = telemetry_callback
+        # Latest telemetry snapshot, and thread receiving snapshots (see
+        # `_receive_telemetry`).
+        self.telemetry = None
+        self.telemetry_thread = None
+        self.telemetry_stop = None
         self.conn, self.child_conn = multiprocessing.Pipe()
+        self.channel = ControlChannel(self.conn)
+        self.control_timeout = control_timeout
+        self.prewarm = prewarm
+        self.child_ready = False
+        # Startup phase durations of the child, in seconds:
+        #
+        #  - `spawn`: From launching the child process until the child runs.
+        #  - `init_capture`, `create_writer`, `framerate_info`:
+        #    Initialization steps in the child.
+        #  - `ready`: From launching the child until it is ready.
+        #  - `record_wait`: Time `record` waited for the child to be ready.
+        self.startup = {}
+        self.spawn_time = None
         if auto_init:
             self.child = self._launch_child()
+        elif prewarm:
+            self.child = self._spawn_child()
         else:
             self.child = None
 
-    def _pipe_pull(self):
-        while True:
-            if self.conn.poll():
-                return self.conn.recv()
-            sleep(1. / 100)
-    
     def _launch_child(self):
+        p = self._spawn_child()
+        self._wait_ready()
+        return p
+
+    def _spawn_child(self):
+        self.spawn_time = monotonic()
         p = multiprocessing.Process(target=self._start_child)
+        # An idle prewarmed child must not keep the application from exiting.
+        p.daemon = self.prewarm
         p.start()
-        while True:
-            response = self._pipe_pull()
-            if response == 'ready':
+        self.channel.process = p
+        if self.telemetry_interval is not None:
+            self.telemetry = None
+            self.channel.clear('telemetry')
+            self.telemetry_stop = threading.Event()
+            self.telemetry_thread = \
+                threading.Thread(target=self._receive_telemetry,
+                                 args=(self.telemetry_stop, ))
+            self.telemetry_thread.daemon = True
+            self.telemetry_thread.start()
+        return p
+
+    def _receive_telemetry(self, stop_event):
+        # Consume snapshots as they arrive, so they do not fill up the pipe
+        # (which would block the child) during a long recording.
+        while not stop_event.is_set():
+            try:
+                message = self.channel.wait_for('telemetry', timeout=0.5)
+            except ControlTimeout:
+                continue
+            except ControlError:
+                # Child exited.
                 break
-            else:
-                raise Exception('Invalid response from RecorderChild')
+            self.telemetry = message[1]
+            if self.telemetry_callback is not None:
+                try:
+                    self.telemetry_callback(self.telemetry)
+                except Exception:
+                    logging.getLogger('opencv.recorder').exception(
+                        'Error in telemetry callback.')
+
+    def _stop_telemetry(self):
+        if self.telemetry_thread is None:
+            return
+        self.telemetry_stop.set()
+        self.telemetry_thread.join()
+        self.telemetry_thread = None
+        self.telemetry_stop = None
+        # Snapshots read after the thread stopped (e.g., along with the
+        # `'stop'` response) are stale for the next recording.
+        self.channel.clear('telemetry')
+
+    def _wait_ready(self):
+        phases = self.channel.wait_for('ready',
+                                       timeout=self.control_timeout)[1]
+        self.child_ready = True
+        self.startup = dict(phases, spawn=phases['process_start'] -
+                            self.spawn_time,
+                            ready=phases['ready_time'] - self.spawn_time)
+        del self.startup['process_start']
+        del self.startup['ready_time']
         logging.getLogger('opencv.recorder').info('RecorderChild is ready')
-        return p
 
     def _start_child(self):
-        child = RecorderChild(self.child_conn, self.output_path, self.cam_cap, self.fps, self.codec)
+        child = RecorderChild(self.child_conn, self.output_path, self.cam_cap,
+                              self.fps, self.codec, self.queue_length,
+                              self.lag_policy, self.segment_limits,
+                              self.log_mode, self.preroll_seconds,
+                              self.preroll_codec, self.outputs, self.qos,
+                              self.spool, self.telemetry_interval)
         child.main()
 
     def record(self):
+        start = monotonic()
         if self.child is None:
             self.child = self._launch_child()
+        elif not self.child_ready:
+            # Prewarmed child is still initializing.
+            self._wait_ready()
+        self.startup['record_wait'] = monotonic() - start
         logging.getLogger('opencv.recorder').info('request recording: %s' % datetime.now())
-        self.conn.send('record')
+        self.channel.request('record', timeout=self.control_timeout)
 
     def stop(self):
         logging.getLogger('opencv.recorder').info('request stop: %s' % datetime.now())
-        self.conn.send('stop')
         if self.child:
-            log = self._pipe_pull()
-            self.child.join()
+            try:
+                if not self.child_ready:
+                    self._wait_ready()
+                log = self.channel.request('stop',
+                                           timeout=self.control_timeout)
+                self.child.join()
+            except ControlError:
+                if self.child.is_alive():
+                    self.child.terminate()
+                self.child.join(1.)
+                self._stop_telemetry()
+                self.child = None
+                self.child_ready = False
+                raise
         else:
             log = None
-        del self.child
+        self._stop_telemetry()
+        self.child = None
+        self.child_ready = False
         return log
+
+    def stats(self):
+        '''
+        Returns latest telemetry snapshot of the recording (see
+        `RecorderChild._send_telemetry`), or `None` before the first one.
+        '''
+        return self.telemetry
+
+    @property
+    def control_stats(self):
+        '''
+        Returns command round trip times (see
+        `control.ControlChannel.stats`).
+        '''
+        return self.channel.stats()
@@ -0,0 +1,220 @@
+from __future__ import division
+from datetime import datetime
+import os
+
+import numpy as np
+
+from frame_stats import RunningStats
+from pacing import monotonic
+
+
+# Record per captured frame of a `StreamingRecorderLog`.
+#
+#  - `time`: Wall clock time (seconds since the epoch) at capture.
+#  - `monotonic`: Same instant, in `pacing.monotonic()` time.
+#  - `sleep_time`: Time the capture loop waited before the frame (`NaN` for
+#    the first frame).
+#  - `record_time`: Time spent in the capture stage.
+#  - `queue_depth`: Frames waiting for the encoder when the frame was
+#    captured.
+LOG_DTYPE = np.dtype([('time', '<f8'), ('monotonic', '<f8'),
+                      ('sleep_time', '<f4'), ('record_time', '<f4'),
+                      ('queue_depth', '<u2')])
+
+MAGIC = 'OCVRLG01'
+# Magic, followed by the target frame rate (`<f8`).
+HEADER_SIZE = len(MAGIC) + 8
+
+
+def log_path(output_path):
+    '''
+    Returns path of the streaming log of recording `output_path`.
+    '''
+    return output_path + '.log'
+
+
+def read_log_records(path):
+    '''
+    Returns `(fps, records)`, where `records` is a memory-mapped
+    `LOG_DTYPE` array of log file `path` (see `StreamingRecorderLog`).
+    '''
+    with open(path, 'rb') as input_:
+        header = input_.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+        raise ValueError('Not a recorder log file: %s' % path)
+    fps = np.fromstring(header[len(MAGIC):], dtype='<f8')[0]
+    # Ignore an incomplete last record.
+    count = (os.path.getsize(path) - HEADER_SIZE) // LOG_DTYPE.itemsize
+    if not count:
+        return fps, np.zeros(0, dtype=LOG_DTYPE)
+    return fps, np.memmap(path, dtype=LOG_DTYPE, mode='r',
+                          offset=HEADER_SIZE, shape=(count, ))
+
+
+class StreamingRecorderLog(object):
+    '''
+    Recorder log for long recordings, in constant memory.
+
+    Unlike `recorder.RecorderLog`, which keeps Python objects for every
+    frame, each frame is stored as a fixed-width `LOG_DTYPE` record in a
+    preallocated chunk, which is appended to the log file at `path` when
+    full, or every `flush_interval` seconds.  Summary statistics are
+    updated with each frame (see `frame_stats.RunningStats`), so the log
+    itself stays small enough to send to the parent process at the end of
+    the recording; see `records` for per-frame data.
+
+    Arguments
+    ---------
+
+     - `fps`: Target frame rate.
+     - `path`: Log file (see `log_path`), overwritten.
+     - `chunk_size`: Records kept in memory between writes.
+     - `flush_interval`: Maximum time between writes, in seconds.
+    '''
+    def __init__(self, fps, path, chunk_size=1024, flush_interval=5.):
+        self.fps = fps
+        self.path = path
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.chunk = np.zeros(chunk_size, dtype=LOG_DTYPE)
+        self.chunk_count = 0
+        self.flush_time = monotonic()
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.file.write(np.array([fps], dtype='<f8').tostring())
+        self.frame_count = 0
+        self.first_time = None
+        self.last_time = None
+        self.last_monotonic = None
+        self.frame_lengths = RunningStats()
+        self.sleep_times = RunningStats()
+        self.record_times = RunningStats()
+        self.queue_depths = RunningStats()
+        self.encode_times = RunningStats()
+        # See `recorder.RecorderLog`.
+        self.frames_dropped = 0
+        self.deadline_misses = 0
+        self.frames_duplicated = 0
+        self.rate_stats = {}
+        self.segments = []
+        self.preroll_frames = 0
+        self.outputs = []
+        self.qos_transitions = []
+
+    def add_frame(self, time, monotonic_time, sleep_time, record_time,
+                  queue_depth):
+        '''
+        Log a captured frame (see `LOG_DTYPE`).  `sleep_time` is `None` for
+        the first frame.
+        '''
+        if sleep_time is None:
+            sleep_time = np.nan
+        else:
+            self.sleep_times.add(sleep_time)
+        self.chunk[self.chunk_count] = (time, monotonic_time, sleep_time,
+                                        record_time, queue_depth)
+        self.chunk_count += 1
+        if self.first_time is None:
+            self.first_time = time
+        else:
+            self.frame_lengths.add(monotonic_time - self.last_monotonic)
+        self.last_time = time
+        self.last_monotonic = monotonic_time
+        self.record_times.add(record_time)
+        self.queue_depths.add(queue_depth)
+        self.frame_count += 1
+        if self.chunk_count == self.chunk_size or \
+                monotonic_time - self.flush_time >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.file is None:
+            return
+        if self.chunk_count:
+            self.file.write(self.chunk[:self.chunk_count].tostring())
+            self.chunk_count = 0
+        self.file.flush()
+        self.flush_time = monotonic()
+
+    def finish(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __getstate__(self):
+        # Per-frame data stays in the log file.
+        state = self.__dict__.copy()
+        state['chunk'] = None
+        state['file'] = None
+        return state
+
+    @property
+    def records(self):
+        '''
+        Memory-mapped per-frame records (see `LOG_DTYPE`), once flushed.
+        '''
+        return read_log_records(self.path)[1]
+
+    def summary(self):
+        duration = self.last_time - self.first_time \
+            if self.frame_count else None
+        return dict(fps=self.fps, frames=self.frame_count,
+                    duration=duration,
+                    achieved_fps=self.rate_stats.get('achieved_fps'),
+                    frame_lengths=self.frame_lengths.summary(),
+                    sleep_times=self.sleep_times.summary(),
+                    record_times=self.record_times.summary(),
+                    encode_times=self.encode_times.summary(),
+                    queue_depths=self.queue_depths.summary(),
+                    frames_dropped=self.frames_dropped,
+                    deadline_misses=self.deadline_misses,
+                    frames_duplicated=self.frames_duplicated,
+                    preroll_frames=self.preroll_frames,
+                    segments=len(self.segments),
+                    qos_transitions=len(self.qos_transitions))
+
+    def print_summary(self):
+        print 'captured %d frames' % self.frame_count
+        if not self.frame_count:
+            return
+        print '  first frame: %s' % datetime.fromtimestamp(self.first_time)
+        print '  last frame:  %s' % datetime.fromtimestamp(self.last_time)
+        print '  recording length: %s' % (self.last_time - self.first_time)
+
+        if self.frame_lengths.count:
+            print '  Frame rate info:'
+            print '    mean: %s' % (1.0 / self.frame_lengths.mean)
+            print '    max:  %s' % (1.0 / self.frame_lengths.min)
+            print '    min:  %s' % (1.0 / self.frame_lengths.max)
+
+        if self.rate_stats.get('achieved_fps') is not None:
+            achieved_fps = self.rate_stats['achieved_fps']
+            print '  Capture rate: %.3f fps (target: %.3f fps, %+.2f%%)' % \
+                (achieved_fps, self.fps, 100 * (achieved_fps / self.fps - 1))
+            print '  Deadlines missed: %d (frames duplicated: %d)' % \
+                (self.deadline_misses, self.frames_duplicated)
+        if self.preroll_frames:
+            print '  Pre-roll frames: %d' % self.preroll_frames
+
+        if self.encode_times.count:
+            print '  Stage times (mean/max):'
+            print '    capture: %.2f/%.2f ms' % \
+                (1e3 * self.record_times.mean, 1e3 * self.record_times.max)
+            print '    encode:  %.2f/%.2f ms' % \
+                (1e3 * self.encode_times.mean, 1e3 * self.encode_times.max)
+            print '  Encoder queue depth (mean/max): %.1f/%d' % \
+                (self.queue_depths.mean, self.queue_depths.max)
+            print '  Frames dropped (encoder queue full): %d' % \
+                self.frames_dropped
+
+        if self.qos_transitions:
+            print '  Quality changes: %d' % len(self.qos_transitions)
+            for transition in self.qos_transitions:
+                print '    frame %d: %s -> %s (lag %.2f), %s' % \
+                    (transition['frame'], transition['from_level'],
+                     transition['to_level'], transition['lag'],
+                     transition['path'])
+
+        if self.segments:
+            print '  Segments: %d' % len(self.segments)
@@ -0,0 +1,128 @@
+from __future__ import division
+from collections import namedtuple
+import os
+
+
+class QualityLevel(namedtuple('QualityLevel', 'name codec scale decimation '
+                              'spool')):
+    '''
+    Recording quality setting of the main output of a
+    `recorder.RecorderChild` (see `QualityController`).
+
+    Arguments
+    ---------
+
+     - `name`: Label, used in the log and in file names.
+     - `codec`: FourCC code (default: codec of the recording).
+     - `scale`: Scale factor of frames.
+     - `decimation`: Write every `decimation`-th frame.
+     - `spool`: Write raw frames to spool files, encoded in the background
+       (see `spool.SpoolWriter`).
+    '''
+    def __new__(cls, name, codec=None, scale=1., decimation=1, spool=False):
+        if int(decimation) < 1:
+            raise ValueError('Decimation must be at least 1.')
+        if scale <= 0:
+            raise ValueError('Scale must be positive.')
+        return super(QualityLevel, cls).__new__(cls, name, codec, float(scale),
+                                                int(decimation), bool(spool))
+
+
+# Ordered from best to cheapest.  Motion JPEG encodes each frame on its own,
+# at a fraction of the cost of MPEG-4 (e.g., `'XVID'`), at the cost of
+# larger files.
+DEFAULT_LEVELS = (QualityLevel('full'),
+                  QualityLevel('fast_codec', codec='MJPG'),
+                  QualityLevel('half_resolution', codec='MJPG', scale=0.5),
+                  QualityLevel('half_rate', codec='MJPG', scale=0.5,
+                               decimation=2),
+                  QualityLevel('spool', spool=True))
+
+
+def quality_path(output_path, index, extension=None):
+    '''
+    Returns path of file `index` of recording `output_path`, i.e., the file
+    written after quality change `index`, e.g., `video-q02.avi` for
+    `video.avi`.
+    '''
+    base, output_extension = os.path.splitext(output_path)
+    if extension is None:
+        extension = output_extension
+    return '%s-q%02d%s' % (base, index, extension)
+
+
+class QualityController(object):
+    '''
+    Choose recording quality from how far a recording lags behind, with
+    hysteresis, so quality does not flip back and forth around a threshold.
+
+    Lag is a number from 0 (idle) to 1 (e.g., encoder queue full, or frame
+    deadline missed), reported once per frame with `update`.  Quality is
+    lowered by one level (see `levels`) once lag has stayed at or above
+    `degrade_lag` for `degrade_time` seconds, and raised by one level once
+    lag has stayed at or below `recover_lag` for `recover_time` seconds.
+    After a change, quality is not lowered again for `hold_time` seconds,
+    to let the encoder work off frames queued at the previous level.
+
+    Arguments
+    ---------
+
+     - `levels`: List of `QualityLevel`, from best to cheapest.
+     - `degrade_lag`, `degrade_time`: Lower quality when lag stays high.
+     - `recover_lag`, `recover_time`: Raise quality when lag stays low.
+     - `hold_time`: Minimum time at a level before lowering quality.
+    '''
+    def __init__(self, levels=DEFAULT_LEVELS, degrade_lag=0.5,
+                 degrade_time=0.5, recover_lag=0.1, recover_time=10.,
+                 hold_time=2.):
+        if not levels:
+            raise ValueError('At least one quality level is required.')
+        if recover_lag >= degrade_lag:
+            raise ValueError('Recover lag must be below degrade lag.')
+        self.levels = tuple(levels)
+        self.degrade_lag = degrade_lag
+        self.degrade_time = degrade_time
+        self.recover_lag = recover_lag
+        self.recover_time = recover_time
+        self.hold_time = hold_time
+        self.reset()
+
+    def reset(self):
+        # Index of current level.
+        self.level = 0
+        # Start of current period of high (or low) lag.
+        self.high_since = None
+        self.low_since = None
+        self.change_time = None
+
+    def update(self, now, lag):
+        '''
+        Report `lag` at monotonic time `now`.  Returns index of the new
+        level if quality changes, or `None`.
+        '''
+        if lag >= self.degrade_lag:
+            self.low_since = None
+            if self.high_since is None:
+                self.high_since = now
+        elif lag <= self.recover_lag:
+            self.high_since = None
+            if self.low_since is None:
+                self.low_since = now
+        else:
+            self.high_since = None
+            self.low_since = None
+        if self.high_since is not None and \
+                now - self.high_since >= self.degrade_time and \
+                self.level < len(self.levels) - 1 and \
+                (self.change_time is None or
+                 now - self.change_time >= self.hold_time):
+            self.level += 1
+        elif self.low_since is not None and \
+                now - self.low_since >= self.recover_time and self.level > 0:
+            self.level -= 1
+        else:
+            return None
+        self.change_time = now
+        self.high_since = None
+        self.low_since = None
+        return self.level
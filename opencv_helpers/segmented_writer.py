@@ -0,0 +1,215 @@
+from __future__ import division
+import json
+import os
+import threading
+from time import time
+
+from safe_cv import cv2
+
+
+def segment_path(output_path, index):
+    '''
+    Returns path of segment `index` of recording `output_path`, e.g.,
+    `video-0002.avi` for `video.avi`.
+    '''
+    base, extension = os.path.splitext(output_path)
+    return '%s-%04d%s' % (base, index, extension)
+
+
+def manifest_path(output_path):
+    '''
+    Returns path of the segment manifest of recording `output_path`.
+    '''
+    return output_path + '.manifest.json'
+
+
+def read_manifest(output_path):
+    '''
+    Returns segment manifest of recording `output_path` (see
+    `SegmentedVideoWriter`).
+    '''
+    with open(manifest_path(output_path), 'rb') as input_:
+        return json.load(input_)
+
+
+def locate_frame(manifest, frame_index):
+    '''
+    Returns `(segment file name, frame index within segment)` of frame
+    `frame_index` of the recording (see `read_manifest`).
+    '''
+    for segment in manifest['segments']:
+        offset = frame_index - segment['first_frame']
+        if 0 <= offset < segment['frame_count']:
+            return segment['path'], offset
+    raise IndexError('Frame not recorded: %s' % frame_index)
+
+
+class SegmentedVideoWriter(object):
+    '''
+    Write a recording as a sequence of video files (segments), so that each
+    file stays small enough to open quickly and a crash only affects the last
+    segment.
+
+    Drop-in replacement for `cv2.VideoWriter` (`write` and `release`).
+    Segments are named after `output_path` (see `segment_path`).
+
+    A new segment is started before writing a frame once the current
+    segment has reached any of the limits, so every frame is written to
+    exactly one segment.  The next segment's writer is opened in a
+    background thread as soon as the previous rotation is done, and the
+    finished writer is released in that thread as well, so rotating does
+    not wait for the video codec.
+
+    The manifest (see `manifest_path`) is rewritten on each rotation and on
+    `release`.  It lists each segment's file, frame range (first frame and
+    frame count, counted over the whole recording) and wall clock times of
+    its first and last frame.
+
+    Arguments
+    ---------
+
+     - `output_path`: Path of recording.
+     - `fourcc`, `fps`, `frame_size`, `is_color`: See `cv2.VideoWriter`.
+     - `max_seconds`: Maximum time between first and last frame of a
+       segment.
+     - `max_frames`: Maximum number of frames per segment.
+     - `max_bytes`: Maximum file size of a segment.  File size is checked
+       after each frame, so a segment may exceed the limit by the size of
+       one encoded frame (plus data buffered by the encoder).
+    '''
+    def __init__(self, output_path, fourcc, fps, frame_size, is_color=True,
+                 max_seconds=None, max_frames=None, max_bytes=None):
+        if max_seconds is None and max_frames is None and max_bytes is None:
+            raise ValueError('At least one segment limit is required.')
+        self.output_path = output_path
+        self.fourcc = fourcc
+        self.fps = fps
+        self.frame_size = frame_size
+        self.is_color = is_color
+        self.max_seconds = max_seconds
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.segments = []
+        self.frame_count = 0
+        # Time spent waiting for the next writer at each rotation.
+        self.rotation_waits = []
+        self.writer = None
+        self.next_writer = None
+        self.next_thread = None
+        self._start_segment(self._create_writer(0))
+        self._prepare_next(None)
+        self.write_manifest()
+
+    def _create_writer(self, index):
+        return cv2.VideoWriter(segment_path(self.output_path, index),
+                               self.fourcc, self.fps, self.frame_size,
+                               self.is_color)
+
+    def _prepare_next(self, finished_writer):
+        # Release the finished writer and open the next one, off the encoder
+        # thread.
+        index = len(self.segments)
+
+        def _run():
+            if finished_writer is not None:
+                finished_writer.release()
+            self.next_writer = self._create_writer(index)
+
+        self.next_thread = threading.Thread(target=_run)
+        self.next_thread.daemon = True
+        self.next_thread.start()
+
+    def _start_segment(self, writer):
+        index = len(self.segments)
+        self.writer = writer
+        self.segments.append(dict(index=index,
+                                  path=os.path.basename(
+                                      segment_path(self.output_path, index)),
+                                  first_frame=self.frame_count,
+                                  frame_count=0, start_time=None,
+                                  end_time=None, bytes=0))
+
+    def _segment_full(self, segment, frame_time):
+        if segment['frame_count'] == 0:
+            return False
+        if self.max_frames is not None and \
+                segment['frame_count'] >= self.max_frames:
+            return True
+        if self.max_seconds is not None and \
+                frame_time - segment['start_time'] >= self.max_seconds:
+            return True
+        if self.max_bytes is not None and segment['bytes'] >= self.max_bytes:
+            return True
+        return False
+
+    def _rotate(self):
+        start = time()
+        # Usually already done.
+        self.next_thread.join()
+        self.rotation_waits.append(time() - start)
+        finished_writer = self.writer
+        self._start_segment(self.next_writer)
+        self.next_writer = None
+        self._prepare_next(finished_writer)
+        self.write_manifest()
+
+    def write(self, frame, frame_time=None):
+        '''
+        Write `frame`, grabbed at wall clock `frame_time` (default: now).
+        '''
+        if frame_time is None:
+            frame_time = time()
+        segment = self.segments[-1]
+        if self._segment_full(segment, frame_time):
+            self._rotate()
+            segment = self.segments[-1]
+        self.writer.write(frame)
+        if segment['start_time'] is None:
+            segment['start_time'] = frame_time
+        segment['end_time'] = frame_time
+        segment['frame_count'] += 1
+        self.frame_count += 1
+        if self.max_bytes is not None:
+            segment['bytes'] = self._segment_size(segment)
+
+    def _segment_size(self, segment):
+        try:
+            return os.path.getsize(os.path.join(os.path.dirname(
+                self.output_path), segment['path']))
+        except OSError:
+            return 0
+
+    def release(self):
+        if self.writer is None:
+            return
+        self.next_thread.join()
+        self.writer.release()
+        self.writer = None
+        # Discard the unused next segment.
+        self.next_writer.release()
+        self.next_writer = None
+        try:
+            os.remove(segment_path(self.output_path, len(self.segments)))
+        except OSError:
+            pass
+        for segment in self.segments:
+            segment['bytes'] = self._segment_size(segment)
+        self.write_manifest(complete=True)
+
+    def write_manifest(self, complete=False):
+        '''
+        Write manifest (see `manifest_path`).  `complete` is `False` while
+        recording, i.e., the last segment is still being written.
+        '''
+        manifest = dict(fps=self.fps, frame_size=list(self.frame_size),
+                        frame_count=self.frame_count, complete=complete,
+                        segments=self.segments)
+        path = manifest_path(self.output_path)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as output:
+            json.dump(manifest, output, indent=2)
+        # Replace previous manifest in one step, so a crash leaves either the
+        # previous or the new manifest.
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        os.rename(temp_path, path)
@@ -0,0 +1,304 @@
+from __future__ import division
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import os
+from time import time
+
+import numpy as np
+
+from safe_cv import cv2
+from segmented_writer import segment_path
+
+
+MAGIC = 'OCVSPL01'
+# Fixed-size header of a spool file, padded to `HEADER_SIZE` bytes.
+# `frame_count` is updated after each frame is written, so a reader (or a
+# file cut short by a crash) only sees complete frames.
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('shape', '<u4', (3, )),
+                         ('dtype', 'S8'), ('fps', '<f8'),
+                         ('capacity', '<u4'), ('frame_count', '<u4')])
+HEADER_SIZE = 64
+# Index record per frame slot, after the header.
+#
+#  - `time`: Wall clock time (seconds since the epoch) the frame was
+#    grabbed.
+#  - `frame`: Frame number, counted over all spool files of a recording.
+INDEX_DTYPE = np.dtype([('time', '<f8'), ('frame', '<u4')])
+# Frame data starts at a page boundary.
+ALIGNMENT = 4096
+
+
+def spool_path(output_path):
+    '''
+    Returns spool path for video `output_path`.
+    '''
+    return os.path.splitext(output_path)[0] + '.spool'
+
+
+def _data_offset(capacity):
+    offset = HEADER_SIZE + capacity * INDEX_DTYPE.itemsize
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class SpoolFile(object):
+    '''
+    Spool file, i.e., raw frames in preallocated slots of a memory-mapped
+    file, with a fixed-size header and a per-frame index.
+
+    Frames are stored uncompressed at fixed offsets, so writing a frame is a
+    copy into the page cache, and any frame can be read in constant time.
+
+    Open an existing file with `SpoolFile(path)` (`mode='r+'` to append),
+    or create one with `SpoolFile.create`.
+    '''
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self.mode = mode
+        self.header = np.memmap(path, dtype=HEADER_DTYPE, mode=mode,
+                                shape=(1, ))
+        if self.header['magic'][0] != MAGIC:
+            raise ValueError('Not a spool file: %s' % path)
+        self.capacity = int(self.header['capacity'][0])
+        self.shape = tuple(int(v) for v in self.header['shape'][0])
+        self.dtype = np.dtype(self.header['dtype'][0])
+        self.fps = float(self.header['fps'][0])
+        self.index = np.memmap(path, dtype=INDEX_DTYPE, mode=mode,
+                               offset=HEADER_SIZE, shape=(self.capacity, ))
+        # Slots present, i.e., all slots unless the file has been cut to the
+        # frames written (see `close`).
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        slots = min((os.path.getsize(path) -
+                     _data_offset(self.capacity)) // frame_bytes,
+                    self.capacity)
+        if slots > 0:
+            self.frames = np.memmap(path, dtype=self.dtype, mode=mode,
+                                    offset=_data_offset(self.capacity),
+                                    shape=(slots, ) + self.shape)
+        else:
+            self.frames = np.zeros((0, ) + self.shape, dtype=self.dtype)
+
+    @classmethod
+    def create(cls, path, frame_shape, fps, capacity, dtype='uint8'):
+        '''
+        Create spool file `path` with room for `capacity` frames of
+        `frame_shape` (overwritten).  Returns `SpoolFile` open to append.
+        '''
+        frame_shape = tuple(frame_shape)
+        if len(frame_shape) == 2:
+            frame_shape += (1, )
+        dtype = np.dtype(dtype)
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header[0] = (MAGIC, frame_shape, dtype.str, fps, capacity, 0)
+        with open(path, 'wb') as output:
+            output.write(header.tostring().ljust(HEADER_SIZE, '\0'))
+            # Reserve the whole file up front, so appending never resizes
+            # the mapping.
+            output.truncate(_data_offset(capacity) + capacity *
+                            int(np.prod(frame_shape)) * dtype.itemsize)
+        return cls(path, mode='r+')
+
+    def __len__(self):
+        return int(self.header['frame_count'][0])
+
+    def __getitem__(self, index):
+        return self.frames[:len(self)][index]
+
+    @property
+    def full(self):
+        return len(self) >= self.capacity
+
+    @property
+    def times(self):
+        return self.index['time'][:len(self)]
+
+    def index_at(self, time):
+        '''
+        Returns index of the last frame grabbed at or before wall clock
+        `time` (`-1` if none).
+        '''
+        return int(np.searchsorted(self.times, time, side='right')) - 1
+
+    def append(self, frame, frame_time, frame_number):
+        count = len(self)
+        if count >= self.capacity:
+            raise IndexError('Spool file is full: %s' % self.path)
+        self.frames[count] = frame.reshape(self.shape)
+        self.index[count] = (frame_time, frame_number)
+        # Frame is visible to readers once complete.
+        self.header['frame_count'] = count + 1
+
+    def close(self):
+        '''
+        Unmap file.  A file open to append is cut to the frames written.
+        '''
+        if self.frames is None:
+            return
+        size = _data_offset(self.capacity) + len(self) * \
+            int(np.prod(self.shape)) * self.dtype.itemsize
+        if self.mode != 'r':
+            if len(self.frames):
+                self.frames.flush()
+            self.index.flush()
+            self.header.flush()
+        self.header = self.index = self.frames = None
+        if self.mode != 'r':
+            with open(self.path, 'r+b') as output:
+                output.truncate(size)
+
+
+def transcode_spool(path, output_path, fourcc, remove=True):
+    '''
+    Encode frames of spool file `path` to video `output_path`.  Returns the
+    number of frames written.
+
+    Arguments
+    ---------
+
+     - `fourcc`: Codec (see `cv2.VideoWriter`).
+     - `remove`: Delete the spool file once transcoded.
+    '''
+    spool = SpoolFile(path)
+    height, width, channels = spool.shape
+    writer = cv2.VideoWriter(output_path, fourcc, spool.fps, (width, height),
+                             channels == 3)
+    frame_count = len(spool)
+    for i in xrange(frame_count):
+        writer.write(np.asarray(spool[i]))
+    writer.release()
+    # Unmap before removing (required on Windows).
+    spool.close()
+    if remove:
+        os.remove(path)
+    return frame_count
+
+
+class SpoolTranscoder(object):
+    '''
+    Transcode spool files in a pool of `processes` background processes
+    (see `transcode_spool`).
+
+    A daemonic process (e.g., a prewarmed `recorder.RecorderChild`) cannot
+    start processes, so by default, threads are used there instead
+    (`cv2.VideoWriter.write` releases the GIL).
+    '''
+    def __init__(self, processes=1, threads=None):
+        if threads is None:
+            threads = multiprocessing.current_process().daemon
+        if threads:
+            self.pool = ThreadPool(processes)
+        else:
+            self.pool = multiprocessing.Pool(processes)
+        self.jobs = []
+
+    def submit(self, path, output_path, fourcc):
+        self.jobs.append(self.pool.apply_async(transcode_spool,
+                                               (path, output_path, fourcc)))
+
+    def join(self):
+        '''
+        Wait for all files to be transcoded.  Returns frame count of each
+        file, in order of `submit`.
+        '''
+        self.pool.close()
+        self.pool.join()
+        return [job.get() for job in self.jobs]
+
+
+class SpoolWriter(object):
+    '''
+    Write frames raw to spool files (see `SpoolFile`), so the cost per frame
+    is a memory copy rather than video encoding, e.g., for short high-speed
+    bursts.
+
+    Drop-in replacement for `cv2.VideoWriter` (`write` and `release`).  The
+    recording is split into spool files of `segment_frames` frames (default:
+    as many as fit in `segment_bytes`), named after `output_path` (see
+    `spool_path` and `segmented_writer.segment_path`), e.g.,
+    `video-0000.spool`.
+
+    If `fourcc` is given, each full spool file is encoded to a video file
+    (e.g., `video-0000.avi`) by a `SpoolTranscoder` while recording goes
+    on, and deleted.  `release` waits for all files to be encoded.
+    Otherwise, spool files are kept (e.g., for random access).
+
+    `segments` lists each file, its frame range and grab times of its first
+    and last frame (as for `segmented_writer.SegmentedVideoWriter`), and,
+    once released, the number of frames `transcoded`.  The `path` of the
+    video file is `None` if `fourcc` is not given.
+    '''
+    def __init__(self, output_path, frame_shape, fps, fourcc=None,
+                 segment_frames=None, segment_bytes=1 << 30, processes=1,
+                 threads=None, dtype='uint8'):
+        self.output_path = output_path
+        self.frame_shape = tuple(frame_shape)
+        self.fps = fps
+        self.fourcc = fourcc
+        self.dtype = np.dtype(dtype)
+        if segment_frames is None:
+            segment_frames = max(segment_bytes //
+                                 (int(np.prod(self.frame_shape)) *
+                                  self.dtype.itemsize), 1)
+        self.segment_frames = int(segment_frames)
+        self.segments = []
+        self.frame_count = 0
+        self.spool = None
+        if fourcc is not None:
+            # Started up front, so the first transcode does not delay
+            # recording.
+            self.transcoder = SpoolTranscoder(processes, threads)
+        else:
+            self.transcoder = None
+        self._start_segment()
+
+    def _start_segment(self):
+        index = len(self.segments)
+        path = segment_path(spool_path(self.output_path), index)
+        self.spool = SpoolFile.create(path, self.frame_shape, self.fps,
+                                      self.segment_frames, self.dtype)
+        if self.transcoder is not None:
+            video_path = os.path.basename(segment_path(self.output_path,
+                                                       index))
+        else:
+            # No video file is written.
+            video_path = None
+        self.segments.append(dict(index=index, path=video_path,
+                                  spool=os.path.basename(path),
+                                  first_frame=self.frame_count,
+                                  frame_count=0, start_time=None,
+                                  end_time=None))
+
+    def _finish_segment(self):
+        self.spool.close()
+        if self.transcoder is not None:
+            self.transcoder.submit(self.spool.path,
+                                   segment_path(self.output_path,
+                                                len(self.segments) - 1),
+                                   self.fourcc)
+        self.spool = None
+
+    def write(self, frame, frame_time=None):
+        '''
+        Write `frame`, grabbed at wall clock `frame_time` (default: now).
+        '''
+        if frame_time is None:
+            frame_time = time()
+        if self.spool.full:
+            self._finish_segment()
+            self._start_segment()
+        self.spool.append(frame, frame_time, self.frame_count)
+        segment = self.segments[-1]
+        if segment['start_time'] is None:
+            segment['start_time'] = frame_time
+        segment['end_time'] = frame_time
+        segment['frame_count'] += 1
+        self.frame_count += 1
+
+    def release(self):
+        if self.spool is None:
+            return
+        self._finish_segment()
+        if self.transcoder is not None:
+            for segment, frame_count in zip(self.segments,
+                                            self.transcoder.join()):
+                segment['transcoded'] = frame_count
+            self.transcoder = None
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+'''
+Tests of `control.ControlChannel`, with child processes that reply late,
+out of order, or not at all.
+
+Run with `python -m unittest test_control` from this directory.
+'''
+from __future__ import division
+import multiprocessing
+import threading
+import time
+import unittest
+
+from control import (ChildDiedError, ControlChannel, ControlTimeout,
+                     Response, parse_command)
+from pacing import monotonic
+
+
+def silent_child(conn, seconds):
+    # Read commands for `seconds`, but never reply.
+    end = time.time() + seconds
+    while time.time() < end:
+        if conn.poll(0.05):
+            conn.recv()
+
+
+def dying_child(conn, delay):
+    time.sleep(delay)
+
+
+def reverse_child(conn, count, delay):
+    # Reply to `count` commands in reverse order, with an unsolicited message
+    # in between.
+    commands = [parse_command(conn.recv()) for i in xrange(count)]
+    conn.send(('heartbeat', 0))
+    for request_id, name, args in reversed(commands):
+        time.sleep(delay)
+        conn.send(Response(request_id, name, (name, ) + args))
+
+
+class TestControlChannel(unittest.TestCase):
+    def channel(self, target, *args):
+        conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=target,
+                                          args=(child_conn, ) + args)
+        process.daemon = True
+        process.start()
+        self.addCleanup(process.join, 5.)
+        self.addCleanup(conn.close)
+        return ControlChannel(conn, process, poll_interval=0.05)
+
+    def test_timeout(self):
+        channel = self.channel(silent_child, 1.)
+        start = monotonic()
+        self.assertRaises(ControlTimeout, channel.request, 'ping',
+                          timeout=0.3)
+        self.assertAlmostEqual(monotonic() - start, 0.3, delta=0.1)
+        self.assertRaises(ControlTimeout, channel.wait_for, 'ready',
+                          timeout=0.2)
+        self.assertFalse(channel.poll(0.1))
+        # No statistics for commands without a response.
+        self.assertEqual(channel.stats(), {})
+
+    def test_child_died(self):
+        channel = self.channel(dying_child, 0.2)
+        start = monotonic()
+        # Raised once the child has exited, long before the timeout.
+        self.assertRaises(ChildDiedError, channel.request, 'ping',
+                          timeout=10.)
+        self.assertLess(monotonic() - start, 1.)
+        self.assertRaises(ChildDiedError, channel.wait_for, 'ready',
+                          timeout=10.)
+
+    def test_concurrent_requests(self):
+        channel = self.channel(reverse_child, 2, 0.2)
+        results = {}
+
+        def request(name, arg):
+            results[name] = channel.request(name, arg, timeout=5.)
+
+        threads = [threading.Thread(target=request, args=(name, arg))
+                   for name, arg in (('first', 1), ('second', 2))]
+        for thread in threads:
+            thread.start()
+            # Commands are sent in order.
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join(5.)
+        # Each thread gets the response to its own command, even though the
+        # responses arrive in reverse order, read by either thread.
+        self.assertEqual(results, {'first': ('first', 1),
+                                   'second': ('second', 2)})
+        self.assertEqual(sorted(channel.stats()), ['first', 'second'])
+        self.assertGreater(channel.stats()['first']['last'],
+                           channel.stats()['second']['last'])
+        # Unsolicited message read meanwhile is kept.
+        self.assertEqual(channel.wait_for('heartbeat', timeout=1.),
+                         ('heartbeat', 0))
+        self.assertEqual(list(channel.pending), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
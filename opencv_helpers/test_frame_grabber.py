@@ -30,6 +30,7 @@ from path_helpers import path
 
 from safe_cv import cv
 from frame_grabber import FrameGrabber, CVCaptureConfig
+from frame_transform import FrameTransform
 from camera_capture import CameraCapture
 
 
@@ -125,6 +126,12 @@ class FrameGrabberGUI:
             gtk_frame = array2cv(frame)
             cv.CvtColor(gtk_frame, gtk_frame, cv.CV_BGR2RGB)
             x, y, a_width, a_height = self.area.get_allocation()
+            if self.grabber.transform is None and \
+                    (a_width < width or a_height < height):
+                # Downscale in the grabber child process, so only
+                # preview-sized frames are sent to this process.
+                scale = min(a_width / float(width), a_height / float(height))
+                self.grabber.set_transform(FrameTransform(scale=scale))
             if a_width != width or a_height != height:
                 resized = cv.CreateMat(width, height, cv.CV_8UC3)
                 cv.Resize(gtk_frame, resized)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+'''
+Tests of `frame_grabber_core`: delivery policies of `FrameSender` over a
+pipe, and grabbers with a synthetic capture (see
+`test_frame_transport.CountingCapture`), so no camera is needed.
+
+Run with `python -m unittest test_frame_grabber_core` from this directory.
+'''
+from __future__ import division
+from datetime import datetime
+import multiprocessing
+import time
+import unittest
+
+import numpy as np
+
+from frame_grabber_core import FrameSender, ThreadedFrameGrabber
+from frame_transport import PickleFrameTransport
+from test_frame_transport import CountingCapture
+
+
+class TestFrameSender(unittest.TestCase):
+    '''
+    Delivery policies with a consumer that has not acknowledged frames yet,
+    i.e., with no credits left (2 frames in flight).
+    '''
+    def sender(self, policy, queue_length=4):
+        self.conn, child_conn = multiprocessing.Pipe()
+        sender = FrameSender(child_conn, PickleFrameTransport(), policy,
+                             queue_length)
+        sender.start()
+        self.addCleanup(sender.stop)
+        return sender
+
+    def put(self, sender, sequence):
+        frame = np.full((4, 4, 3), sequence, dtype='uint8')
+        sender.put(frame, datetime.now(), (sequence, 0., 0.))
+
+    def receive(self):
+        '''
+        Returns `(sequence, counts)` of the next frame sent.
+        '''
+        self.assertTrue(self.conn.poll(1.))
+        message = self.conn.recv()
+        self.assertEqual(message[0], 'frame')
+        payload, grab_time, counts, info = message[1:5]
+        self.assertTrue((payload[0] == info[0]).all())
+        return info[0], counts
+
+    def fill(self, sender):
+        # Frames in flight, one at a time, so none is dropped.
+        for sequence in xrange(sender.transport.max_in_flight):
+            self.put(sender, sequence)
+            self.assertEqual(self.receive(), (sequence, (sequence + 1, 0)))
+        self.assertEqual(sender.credits, 0)
+
+    def test_latest(self):
+        sender = self.sender('latest')
+        self.fill(sender)
+        for sequence in xrange(2, 6):
+            self.put(sender, sequence)
+        # Nothing is sent until acknowledged, and only the newest frame waits.
+        self.assertFalse(self.conn.poll(0.2))
+        self.assertEqual(sender.dropped, 3)
+        self.assertEqual(len(sender.frames), 1)
+        sender.ack(2)
+        self.assertEqual(self.receive(), (5, (6, 3)))
+        self.assertFalse(self.conn.poll(0.2))
+        self.assertEqual(sender.credits, 1)
+
+    def test_queue(self):
+        sender = self.sender('queue', queue_length=3)
+        self.fill(sender)
+        for sequence in xrange(2, 8):
+            self.put(sender, sequence)
+        self.assertFalse(self.conn.poll(0.2))
+        # Oldest frames are dropped.
+        self.assertEqual(sender.dropped, 3)
+        self.assertEqual(len(sender.frames), 3)
+        sender.ack(2)
+        self.assertEqual([self.receive()[0] for i in xrange(2)], [5, 6])
+        self.assertFalse(self.conn.poll(0.2))
+        sender.ack(1)
+        self.assertEqual(self.receive(), (7, (8, 3)))
+
+    def test_block(self):
+        sender = self.sender('block')
+        # Frames are sent by `put` itself (no sender thread), and none are
+        # dropped; the capture loop waits for credits before `put` (see
+        # `FrameGrabberChild.main`).
+        self.assertEqual(sender.thread, None)
+        self.fill(sender)
+        self.assertEqual(sender.dropped, 0)
+        self.assertEqual(len(sender.frames), 0)
+        sender.ack(1)
+        self.assertEqual(sender.credits, 1)
+        self.put(sender, 2)
+        self.assertEqual(self.receive(), (2, (3, 0)))
+        self.assertEqual(sender.credits, 0)
+
+
+class TestStartup(unittest.TestCase):
+    def test_prewarm_startup_kept(self):
+        grabber = ThreadedFrameGrabber(CountingCapture(), prewarm=True)
+        try:
+            for i in xrange(2):
+                # Let the prewarmed child initialize.
+                time.sleep(0.5)
+                grabber.start()
+                next(iter(grabber))
+                grabber.stop()
+                # Phases of the run just stopped, while the next child is
+                # prewarmed.
+                self.assertEqual(sorted(grabber.startup),
+                                 ['init_capture', 'ready', 'spawn',
+                                  'start_to_first_frame'])
+                self.assertEqual(grabber.stats()['startup'],
+                                 grabber.startup)
+        finally:
+            grabber.close()
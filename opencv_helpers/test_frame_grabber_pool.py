@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+'''
+Tests of frame set matching of `frame_grabber_pool.FrameGrabberPool`, using
+fake frame sources, so no child process or `gobject` main loop is needed.
+
+Run with `python -m unittest test_frame_grabber_pool` from this directory,
+or run this file with video files as arguments for a throughput demo.
+'''
+import logging
+from pprint import pprint
+import unittest
+
+from frame_grabber_pool import FrameGrabberPool
+from frame_stats import FrameInfo
+from camera_capture import CVFileCapture
+
+
+def fake_source(grabber, grab_starts):
+    '''
+    Replace `receive_frames` of `grabber` to return one frame per grab start
+    time in `grab_starts`, on the first call only.
+    '''
+    frames = [('frame-%s' % t, None, FrameInfo(i, t, t, t, t))
+              for i, t in enumerate(grab_starts)]
+
+    def receive_frames():
+        received = frames[:]
+        del frames[:]
+        return received
+
+    grabber.receive_frames = receive_frames
+
+
+class TestFrameGrabberPool(unittest.TestCase):
+    def pool(self, sources, **kwargs):
+        pool = FrameGrabberPool([None] * len(sources), **kwargs)
+        for grabber, grab_starts in zip(pool.grabbers, sources):
+            fake_source(grabber, grab_starts)
+        self.frame_sets = []
+        pool.frame_set_callback = lambda frames, timestamps: \
+            self.frame_sets.append(frames)
+        return pool
+
+    def test_default_tolerance(self):
+        pool = self.pool([[], []], fps_limit=20.)
+        self.assertAlmostEqual(pool.tolerance, 0.025)
+
+    def test_match(self):
+        pool = self.pool([[0., 0.1, 0.2], [0.01, 0.11, 0.205]],
+                         tolerance=0.02)
+        pool._grab_frames()
+        self.assertEqual(self.frame_sets, [['frame-0.0', 'frame-0.01'],
+                                           ['frame-0.1', 'frame-0.11'],
+                                           ['frame-0.2', 'frame-0.205']])
+        self.assertEqual(pool.frame_sets, 3)
+        self.assertEqual(list(pool.frames_received), [3, 3])
+        self.assertEqual(list(pool.frames_unmatched), [0, 0])
+
+    def test_tolerance(self):
+        # Grabs of the second source are late by more than the tolerance.
+        pool = self.pool([[0., 0.1, 0.2], [0.05, 0.15, 0.21]],
+                         tolerance=0.02)
+        pool._grab_frames()
+        self.assertEqual(self.frame_sets, [['frame-0.2', 'frame-0.21']])
+        # Oldest frame is dropped until the oldest frames of all sources
+        # are within tolerance.
+        self.assertEqual(list(pool.frames_unmatched), [2, 2])
+        self.assertEqual([len(p) for p in pool.pending], [0, 0])
+
+    def test_wait_for_all_sources(self):
+        pool = self.pool([[0., 0.1], []], tolerance=0.02)
+        pool._grab_frames()
+        self.assertEqual(self.frame_sets, [])
+        self.assertEqual([len(p) for p in pool.pending], [2, 0])
+        # Frame arriving later is matched with a pending frame.
+        fake_source(pool.grabbers[1], [0.105])
+        pool._grab_frames()
+        self.assertEqual(self.frame_sets, [['frame-0.1', 'frame-0.105']])
+        self.assertEqual(list(pool.frames_unmatched), [1, 0])
+
+    def test_queue_length(self):
+        pool = self.pool([[0., 0.1, 0.2, 0.3], []], tolerance=0.02,
+                         queue_length=2)
+        pool._grab_frames()
+        # Frames pushed out of a full queue count as unmatched.
+        self.assertEqual([p[0] for p in pool.pending[0]], [0.2, 0.3])
+        self.assertEqual(list(pool.frames_unmatched), [2, 0])
+
+
+def parse_args():
+    """Parses arguments, returns ``(options, args)``."""
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="""\
+Grab synchronized frame sets from several video files and print throughput
+statistics.""",
+                           )
+    parser.add_argument('-s', '--seconds', dest='seconds', type=float,
+                        default=5)
+    parser.add_argument('-f', '--fps_limit', dest='fps_limit', type=float,
+                        default=30)
+    parser.add_argument('-t', '--tolerance', dest='tolerance', type=float,
+                        default=None, help='Max timestamp difference (in '
+                        'seconds) within a frame set.')
+    parser.add_argument(nargs='+', dest='in_files', type=str)
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    import gobject
+
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+
+    cam_caps = [CVFileCapture(f) for f in args.in_files]
+    pool = FrameGrabberPool(cam_caps, fps_limit=args.fps_limit,
+                            tolerance=args.tolerance, auto_init=True)
+    pool.start()
+
+    loop = gobject.MainLoop()
+    gobject.timeout_add(int(1000 * args.seconds), loop.quit)
+    loop.run()
+
+    pprint(pool.stats())
+    pool.stop()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+'''
+Tests of `frame_grabber_supervisor.FrameGrabberSupervisor`, checked manually
+(no `gobject` timer), with a synthetic capture, so no camera is needed.
+
+Run with `python -m unittest test_frame_grabber_supervisor` from this
+directory.
+'''
+from __future__ import division
+import time
+import unittest
+
+from frame_grabber_core import ThreadedFrameGrabber
+from frame_grabber_supervisor import FrameGrabberSupervisor
+from test_frame_transport import CountingCapture
+
+
+class TestFrameGrabberSupervisor(unittest.TestCase):
+    fps = 50.
+
+    def setUp(self):
+        self.grabber = ThreadedFrameGrabber(CountingCapture(), auto_init=True)
+        self.grabber.set_fps_limit(self.fps)
+
+    def tearDown(self):
+        self.grabber.close()
+
+    def test_stall_timeout(self):
+        # An idle child would be restarted between heartbeats.
+        for stall_timeout in (0.5, self.grabber.HEARTBEAT_INTERVAL):
+            self.assertRaises(ValueError, FrameGrabberSupervisor,
+                              self.grabber, stall_timeout=stall_timeout,
+                              check_interval=None)
+
+    def test_restart_counts(self):
+        supervisor = FrameGrabberSupervisor(self.grabber, stall_timeout=2.,
+                                            backoff_base=0.1,
+                                            check_interval=None)
+        self.grabber.start()
+        time.sleep(0.5)
+        self.grabber.child.terminate()
+        deadline = time.time() + 10.
+        while supervisor.restart_count < 1 or supervisor.state != 'running':
+            self.assertLess(time.time(), deadline)
+            supervisor.check()
+            time.sleep(0.05)
+        time.sleep(0.5)
+        self.grabber.stop()
+        counts = self.grabber.frame_counts
+        # Counts of the killed child are included.
+        self.assertGreater(counts['delivered'], 0.8 * self.fps)
+        self.assertGreaterEqual(counts['produced'], counts['delivered'])
+        self.assertLess(counts['produced'] - counts['delivered'] -
+                        counts['dropped'], 0.1 * self.fps)
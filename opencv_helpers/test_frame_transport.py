@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+'''
+Tests of frame transports, alone and with a `ThreadedFrameGrabber` child
+process, using a synthetic capture, so no camera is needed.
+
+Run with `python -m unittest test_frame_transport` from this directory.
+'''
+from __future__ import division
+import os
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from camera_capture import CameraCaptureBase
+from control import ControlError
+from frame_grabber_core import ThreadedFrameGrabber
+from frame_transform import FrameTransform
+from frame_transport import SharedMemoryFrameTransport
+
+
+class CountingCapture(CameraCaptureBase):
+    '''
+    Generate frames filled with the number of the frame (modulo 256).
+    '''
+    def __init__(self, width=64, height=48):
+        self.width = width
+        self.height = height
+        self.count = 0
+        super(CountingCapture, self).__init__()
+
+    def _init_capture(self):
+        self.count = 0
+
+    def _release_capture(self):
+        pass
+
+    def grab(self):
+        return True
+
+    def retrieve(self, out=None):
+        if out is None:
+            out = np.empty((self.height, self.width, 3), dtype='uint8')
+        out[:] = self.count % 256
+        self.count += 1
+        return out
+
+    def get_framerate_info(self):
+        return None
+
+    @property
+    def dimensions(self):
+        return (self.width, self.height)
+
+
+class FailingTransform(FrameTransform):
+    def apply(self, frame, out=None):
+        raise RuntimeError('transform failed')
+
+
+class TestSharedMemoryFrameTransport(unittest.TestCase):
+    def test_pack_frames(self):
+        transport = SharedMemoryFrameTransport(3, (4, 4, 3))
+        frames = [np.full((4, 4, 3), 1, dtype='uint8'),
+                  np.full((2, 2), 2, dtype='uint8')]
+        # Frame and variant do not fit in a slot of the initial ring.
+        self.assertRaises(ValueError, transport.ring.write_frames, frames)
+        # Child end, sharing the initial ring (as after a fork).
+        child = SharedMemoryFrameTransport(3, (4, 4, 3))
+        child.ring = transport.ring
+        payload = child.pack_frames(frames)
+        self.assertEqual(child.ring_resizes, 1)
+        self.assertEqual(child.ring.slot_bytes, 52)
+        unpacked = transport.unpack_frames(payload)
+        self.assertEqual(transport.ring_resizes, 1)
+        # File is removed once mapped by both processes.
+        self.assertFalse(os.path.exists(child.ring.path))
+        for frame, np_frame in zip(unpacked, frames):
+            self.assertTrue((frame == np_frame).all())
+        # Frames that fit are written to the same ring.
+        payload = child.pack_frames(frames[:1])
+        self.assertEqual(child.ring_resizes, 1)
+        self.assertTrue((transport.unpack_frames(payload)[0] == 1).all())
+
+
+class TestSharedMemoryGrabber(unittest.TestCase):
+    fps = 50.
+
+    def grabber(self, **kwargs):
+        grabber = ThreadedFrameGrabber(CountingCapture(), auto_init=True,
+                                       **kwargs)
+        grabber.set_fps_limit(self.fps)
+        return grabber
+
+    def test_transformed_subscription(self):
+        grabber = self.grabber(transport=
+                               SharedMemoryFrameTransport(4, (48, 64, 3)))
+        frames = []
+        lock = threading.Lock()
+
+        def callback(frame, grab_time):
+            with lock:
+                frames.append(frame.copy())
+
+        grabber.subscribe(callback, policy='queue',
+                          transform=FrameTransform(scale=0.5))
+        full_frames = []
+        grabber.frame_callback = \
+            lambda frame, grab_time: full_frames.append(frame.copy())
+        grabber.start()
+        time.sleep(1.)
+        log = grabber.stop()
+        self.assertEqual(log[1]['error'], None)
+        counts = grabber.frame_counts
+        self.assertGreater(counts['delivered'], 0.8 * self.fps)
+        self.assertEqual(counts['dropped_child'], 0)
+        # Each subscription gets frames of its own transform.
+        self.assertGreater(len(frames), 0.8 * self.fps)
+        self.assertTrue(all(frame.shape == (24, 32, 3) for frame in frames))
+        self.assertTrue(all(frame.shape == (48, 64, 3)
+                            for frame in full_frames))
+        # Frames are intact, i.e., not overwritten by later frames.
+        for frame in frames + full_frames:
+            self.assertTrue((frame == frame.flat[0]).all())
+        values = [frame.flat[0] for frame in frames]
+        self.assertEqual(values, sorted(values))
+
+    def test_send_error(self):
+        grabber = self.grabber(transform=FailingTransform(scale=0.5))
+        grabber.start()
+        time.sleep(0.5)
+        # Error in the child sender thread is reported.
+        self.assertRaises(ControlError, grabber.stop)
+        self.assertTrue('transform failed' in grabber.child_error)
+        self.assertEqual(grabber.frame_counts['delivered'], 0)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+'''
+Tests of several outputs of one `recorder.RecorderChild` capture (see
+`recorder.RecorderOutput`), using the synthetic capture and counting writer
+of `test_recorder_pacing`.
+
+Run with `python -m unittest test_recorder_outputs` from this directory.
+'''
+from __future__ import division
+import os
+import unittest
+
+import numpy as np
+
+from frame_timestamps import FrameTimestamps
+from recorder import RecorderOutput
+from test_recorder_pacing import (CountingRecorderChild, LatencyCapture,
+                                  RecorderTestCase)
+
+
+class TestRecorderOutputs(RecorderTestCase):
+    def test_outputs(self):
+        preview_path = os.path.join(self.directory, 'preview.avi')
+        slow_path = os.path.join(self.directory, 'slow.avi')
+        # Slow output takes two frame periods per frame.
+        CountingRecorderChild.write_delays = {'slow.avi': 2. / self.fps}
+        try:
+            log, frames_written, child, channel = \
+                self.record_child(LatencyCapture(latency=0.002),
+                                  outputs=[RecorderOutput(preview_path,
+                                                          decimation=2,
+                                                          scale=0.5),
+                                           RecorderOutput(slow_path)])
+        finally:
+            CountingRecorderChild.write_delays = {}
+        main, preview, slow = [encoder.writer
+                               for encoder in child.encoders]
+        main_stats, preview_stats, slow_stats = log.outputs
+        # Slow output drops its own frames, without delaying the others.
+        self.assertEqual(main_stats['frames_dropped'], 0)
+        self.assertEqual(preview_stats['frames_dropped'], 0)
+        self.assertGreater(slow_stats['frames_dropped'], 0)
+        self.assertEqual(log.frames_dropped, slow_stats['frames_dropped'])
+        self.assert_rate(log, frames_written, self.fps * self.seconds)
+        self.assertLessEqual(abs(2 * preview.frame_count - frames_written), 2)
+        self.assertEqual(preview.frame_shape, (12, 16, 3))
+        self.assertEqual(slow.frame_count + slow_stats['frames_dropped'],
+                         frames_written)
+        timestamps = FrameTimestamps(preview_path)
+        self.assertEqual(len(timestamps), preview.frame_count)
+        self.assertEqual(timestamps.fps, self.fps / 2)
+        self.assertTrue((timestamps[:]['sequence'] ==
+                         np.arange(len(timestamps))).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+'''
+Tests of pre-roll recording of `recorder.RecorderChild` (see
+`preroll.PreRollBuffer`), using the synthetic capture and counting writer of
+`test_recorder_pacing`.
+
+Run with `python -m unittest test_recorder_preroll` from this directory.
+'''
+from __future__ import division
+import unittest
+
+import numpy as np
+
+from frame_codec import JPEGFrameCodec
+from frame_timestamps import FrameTimestamps, FRAME_PREROLL
+from test_recorder_pacing import LatencyCapture, RecorderTestCase
+
+
+class TestRecorderPreRoll(RecorderTestCase):
+    def check_preroll(self, preroll_codec):
+        preroll_seconds = 0.5
+        log, frames_written = \
+            self.record(LatencyCapture(latency=0.002),
+                        preroll_seconds=preroll_seconds,
+                        preroll_codec=preroll_codec, trigger_delay=1.)
+        preroll_frames = int(preroll_seconds * self.fps)
+        self.assertEqual(log.preroll_frames, preroll_frames)
+        self.assertLessEqual(abs(frames_written - preroll_frames -
+                                 self.fps * self.seconds), 3)
+        timestamps = FrameTimestamps(self.output_path)
+        self.assertEqual(len(timestamps), frames_written)
+        preroll = (timestamps[:]['flags'] & FRAME_PREROLL) != 0
+        self.assertEqual(preroll.sum(), preroll_frames)
+        self.assertTrue(preroll[:preroll_frames].all())
+        # Deadlines and frame timing continue across the trigger.
+        self.assertTrue((timestamps[:]['sequence'] ==
+                         np.arange(frames_written)).all())
+        # Every frame is grabbed within a frame period of its deadline.
+        offsets = timestamps[:]['monotonic'] - \
+            timestamps[:]['sequence'] / self.fps
+        self.assertLess(np.ptp(offsets), 1.25 / self.fps)
+
+    def test_preroll_raw(self):
+        self.check_preroll(None)
+
+    def test_preroll_compressed(self):
+        self.check_preroll(JPEGFrameCodec())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+'''
+Tests of quality changes of `recorder.RecorderChild` while recording lags
+(see `recorder_qos`), using the synthetic capture and counting writer of
+`test_recorder_pacing`.
+
+Run with `python -m unittest test_recorder_qos` from this directory.
+'''
+from __future__ import division
+from multiprocessing.pool import ThreadPool
+import unittest
+
+import numpy as np
+
+from frame_timestamps import FrameTimestamps
+from recorder_qos import QualityController, QualityLevel
+from spool import SpoolWriter
+from test_recorder_pacing import (CountingRecorderChild, LatencyCapture,
+                                  RecorderTestCase)
+
+
+class TestRecorderQoS(RecorderTestCase):
+    def test_qos(self):
+        # Main output takes two frame periods per frame at full quality, and
+        # keeps up at half rate.
+        CountingRecorderChild.write_delays = {'output.avi': 2. / self.fps}
+        qos = QualityController([QualityLevel('full'),
+                                 QualityLevel('half_rate', decimation=2)],
+                                degrade_time=0.1)
+        try:
+            log, frames_written, child, channel = \
+                self.record_child(LatencyCapture(latency=0.002), qos=qos)
+        finally:
+            CountingRecorderChild.write_delays = {}
+        # Recording lags until the main queue is half full.
+        self.assertEqual(len(log.qos_transitions), 1)
+        transition = log.qos_transitions[0]
+        self.assertEqual((transition['from_level'], transition['to_level']),
+                         ('full', 'half_rate'))
+        self.assertEqual(transition['path'], 'output-q01.avi')
+        self.assertGreaterEqual(transition['lag'], 0.5)
+        writer = child.encoder.writer
+        self.assertEqual(child.writer.frame_count, transition['frame'])
+        self.assertEqual(log.outputs[0]['frames_queued'],
+                         transition['frame'] + writer.frame_count)
+        # Timing is unaffected, and the sidecar continues over both files,
+        # with every other deadline left out after the change.
+        self.assertLess(abs(log.rate_stats['achieved_fps'] / self.fps - 1),
+                        0.02)
+        timestamps = FrameTimestamps(self.output_path)
+        self.assertEqual(len(timestamps), log.outputs[0]['frames_queued'])
+        sequence = timestamps[:]['sequence']
+        first = transition['frame']
+        self.assertTrue((sequence[:first] == np.arange(first)).all())
+        self.assertTrue((np.diff(sequence[first:]) == 2).all())
+        self.assertGreater(writer.frame_count, 0.4 * self.fps)
+
+    def test_qos_spool(self):
+        pools = []
+        get_spool_writer = CountingRecorderChild._get_spool_writer
+
+        def _get_spool_writer(child, *args, **kwargs):
+            writer = get_spool_writer(child, *args, **kwargs)
+            pools.append(writer.transcoder.pool)
+            return writer
+
+        CountingRecorderChild._get_spool_writer = _get_spool_writer
+        CountingRecorderChild.write_delays = {'output.avi': 2. / self.fps}
+        qos = QualityController([QualityLevel('full'),
+                                 QualityLevel('spool', spool=True)],
+                                degrade_time=0.1)
+        try:
+            log, frames_written, child, channel = \
+                self.record_child(LatencyCapture(latency=0.002), qos=qos)
+        finally:
+            CountingRecorderChild.write_delays = {}
+            # Inherited from `RecorderChild`.
+            del CountingRecorderChild._get_spool_writer
+        self.assertEqual(len(log.qos_transitions), 1)
+        self.assertTrue(log.qos_transitions[0]['spool'])
+        # Spool writer is created from the encoder thread, so its spool
+        # files are encoded by threads rather than forked processes.
+        self.assertEqual(len(pools), 1)
+        self.assertTrue(isinstance(pools[0], ThreadPool))
+        writer = child.encoder.writer
+        self.assertTrue(isinstance(writer, SpoolWriter))
+        self.assertEqual(sum([segment['transcoded']
+                              for segment in writer.segments]),
+                         writer.frame_count)
+        self.assertGreater(writer.frame_count, 0)
+
+    def test_qos_hysteresis(self):
+        qos = QualityController([QualityLevel('full'),
+                                 QualityLevel('half', scale=0.5),
+                                 QualityLevel('quarter', scale=0.25)],
+                                degrade_lag=0.5, degrade_time=1.,
+                                recover_lag=0.1, recover_time=5.,
+                                hold_time=3.)
+        # Short peaks and lag between thresholds do not change quality.
+        for now, lag in [(0, 0.9), (0.5, 0.3), (1., 0.9), (1.5, 0.3),
+                         (2.5, 0.3)]:
+            self.assertEqual(qos.update(now, lag), None)
+        self.assertEqual(qos.update(3., 0.9), None)
+        self.assertEqual(qos.update(4., 0.9), 1)
+        # Held at a level after a change.
+        self.assertEqual(qos.update(5.5, 0.9), None)
+        self.assertEqual(qos.update(6.9, 0.9), None)
+        self.assertEqual(qos.update(7., 0.9), 2)
+        # Lowest level reached.
+        self.assertEqual(qos.update(20., 0.9), None)
+        # Quality recovers one level at a time.
+        self.assertEqual(qos.update(21., 0.), None)
+        self.assertEqual(qos.update(26., 0.), 1)
+        self.assertEqual(qos.update(27., 0.), None)
+        self.assertEqual(qos.update(32., 0.), 0)
+        self.assertEqual(qos.update(40., 0.), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
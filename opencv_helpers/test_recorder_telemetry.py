@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+'''
+Tests of recording telemetry (see `recorder.RecorderChild._send_telemetry`),
+as sent by the child and as received by a `recorder.Recorder`, using the
+synthetic capture and counting writer of `test_recorder_pacing`.
+
+Run with `python -m unittest test_recorder_telemetry` from this directory.
+'''
+from __future__ import division
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from test_recorder_pacing import (CountingRecorder, CountingRecorderChild,
+                                  LatencyCapture, RecorderTestCase)
+
+
+class TestRecorderChildTelemetry(RecorderTestCase):
+    def test_telemetry(self):
+        # Main output takes 1.5 frame periods per frame, so its queue grows.
+        CountingRecorderChild.write_delays = {'output.avi': 1.5 / self.fps}
+        try:
+            log, frames_written, child, channel = \
+                self.record_child(LatencyCapture(latency=0.002),
+                                  telemetry_interval=0.25)
+        finally:
+            CountingRecorderChild.write_delays = {}
+        snapshots = []
+        while channel.poll():
+            message = channel.recv()
+            if message[0] == 'telemetry':
+                snapshots.append(message[1])
+        self.assertLessEqual(abs(len(snapshots) - self.seconds / 0.25), 1)
+        for previous, snapshot in zip(snapshots, snapshots[1:]):
+            self.assertGreater(snapshot['time'], previous['time'])
+            self.assertGreater(snapshot['frames_written'],
+                               previous['frames_written'])
+        last = snapshots[-1]
+        self.assertGreater(last['queue_depth'], snapshots[0]['queue_depth'])
+        self.assertLessEqual(last['frames_captured'], len(log.times))
+        self.assertLessEqual(last['frames_written'], frames_written)
+        self.assertLess(abs(last['fps'] / self.fps - 1), 0.1)
+        self.assertLess(abs(last['achieved_fps'] / self.fps - 1), 0.02)
+        self.assertAlmostEqual(last['encode_time_p95'], 1.5 / self.fps,
+                               delta=0.5 / self.fps)
+        self.assertEqual(last['quality'], None)
+
+    def test_telemetry_preroll(self):
+        preroll_seconds = 0.5
+        log, frames_written, child, channel = \
+            self.record_child(LatencyCapture(latency=0.002),
+                              preroll_seconds=preroll_seconds,
+                              trigger_delay=1., telemetry_interval=0.25)
+        snapshots = []
+        while channel.poll():
+            message = channel.recv()
+            if message[0] == 'telemetry':
+                snapshots.append(message[1])
+        preroll_frames = int(preroll_seconds * self.fps)
+        # Pre-roll frames are reported separately, and do not inflate the
+        # rate of the first interval.
+        first = snapshots[0]
+        self.assertEqual(first['preroll_frames'], preroll_frames)
+        self.assertGreaterEqual(first['frames_captured'], preroll_frames)
+        self.assertLess(abs(first['fps'] / self.fps - 1), 0.15)
+
+
+class TestRecorderTelemetry(unittest.TestCase):
+    '''
+    Telemetry as received by a `Recorder`, from a child process.
+    '''
+    fps = 50.
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.directory, 'output.avi')
+        self.snapshots = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def recorder(self, **kwargs):
+        kwargs.setdefault('telemetry_callback', self.snapshots.append)
+        return CountingRecorder(self.output_path, LatencyCapture(),
+                                fps=self.fps, **kwargs)
+
+    def test_stats(self):
+        recorder = self.recorder(telemetry_interval=0.2)
+        self.assertEqual(recorder.stats(), None)
+        recorder.record()
+        time.sleep(1.1)
+        stats = recorder.stats()
+        thread = recorder.telemetry_thread
+        self.assertTrue(thread.is_alive())
+        log = recorder.stop()
+        # Callback is called with each snapshot, as returned by `stats`.
+        self.assertLessEqual(abs(len(self.snapshots) - 1.1 / 0.2), 1)
+        self.assertIn(stats, self.snapshots)
+        for previous, snapshot in zip(self.snapshots, self.snapshots[1:]):
+            self.assertGreater(snapshot['time'], previous['time'])
+            self.assertGreater(snapshot['frames_captured'],
+                               previous['frames_captured'])
+        self.assertLessEqual(stats['frames_captured'], len(log.times))
+        self.assertLess(abs(stats['fps'] / self.fps - 1), 0.1)
+        # Receiving thread is stopped, and no snapshot arrives after `stop`.
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(recorder.telemetry_thread, None)
+        count = len(self.snapshots)
+        time.sleep(0.5)
+        self.assertEqual(len(self.snapshots), count)
+
+    def test_stale_snapshot(self):
+        recorder = self.recorder(telemetry_interval=0.2)
+        recorder.record()
+        time.sleep(0.5)
+        recorder.stop()
+        # Snapshots read along with the `'stop'` response are discarded.
+        self.assertFalse([message for message in recorder.channel.pending
+                          if message[0] == 'telemetry'])
+        # Snapshot left pending is not reported for the next recording.
+        stale = dict(self.snapshots[-1], frames_captured=-1)
+        recorder.channel.pending.append(('telemetry', stale))
+        recorder.record()
+        time.sleep(0.1)
+        self.assertNotEqual(recorder.stats(), stale)
+        recorder.stop()
+        self.assertNotIn(stale, self.snapshots)
+
+    def test_callback_error(self):
+        def callback(snapshot):
+            self.snapshots.append(snapshot)
+            if len(self.snapshots) == 1:
+                raise RuntimeError('callback failed')
+
+        recorder = self.recorder(telemetry_interval=0.2,
+                                 telemetry_callback=callback)
+        recorder.record()
+        time.sleep(0.7)
+        recorder.stop()
+        # Error is logged, and snapshots keep coming.
+        self.assertGreater(len(self.snapshots), 1)
+        self.assertEqual(recorder.stats(), self.snapshots[-1])
+
+    def test_disabled(self):
+        recorder = self.recorder(telemetry_interval=None)
+        recorder.record()
+        self.assertEqual(recorder.telemetry_thread, None)
+        time.sleep(0.3)
+        log = recorder.stop()
+        self.assertEqual(recorder.stats(), None)
+        self.assertEqual(self.snapshots, [])
+        self.assertGreater(len(log.times), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
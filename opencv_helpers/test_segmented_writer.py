@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+'''
+Tests of segment rotation and the manifest of
+`segmented_writer.SegmentedVideoWriter`, using a writer that only appends
+frame bytes to each segment file, so no video codec is needed.
+
+Run with `python -m unittest test_segmented_writer` from this directory.
+'''
+from __future__ import division
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from segmented_writer import (SegmentedVideoWriter, locate_frame,
+                              manifest_path, read_manifest, segment_path)
+
+
+class FileWriter(object):
+    '''
+    Create `path` when opened and append raw frame data on `write`.
+    '''
+    def __init__(self, path):
+        self.output = open(path, 'wb')
+        self.frame_count = 0
+
+    def write(self, frame):
+        self.output.write(frame.tostring())
+        self.output.flush()
+        self.frame_count += 1
+
+    def release(self):
+        self.output.close()
+
+
+class FileSegmentedWriter(SegmentedVideoWriter):
+    def _create_writer(self, index):
+        return FileWriter(segment_path(self.output_path, index))
+
+
+class TestSegmentedVideoWriter(unittest.TestCase):
+    frame_size = (4, 3)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.directory, 'output.avi')
+        self.frame = np.zeros((3, 4, 3), dtype='uint8')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def writer(self, **limits):
+        return FileSegmentedWriter(self.output_path, 0, 10., self.frame_size,
+                                   **limits)
+
+    def test_limit_required(self):
+        self.assertRaises(ValueError, self.writer)
+
+    def test_max_frames(self):
+        writer = self.writer(max_frames=7)
+        for i in xrange(20):
+            writer.write(self.frame, 100. + i)
+        writer.release()
+        self.assertEqual([(s['first_frame'], s['frame_count'])
+                          for s in writer.segments],
+                         [(0, 7), (7, 7), (14, 6)])
+        self.assertEqual([s['path'] for s in writer.segments],
+                         ['output-0000.avi', 'output-0001.avi',
+                          'output-0002.avi'])
+        self.assertEqual([(s['start_time'], s['end_time'])
+                          for s in writer.segments],
+                         [(100., 106.), (107., 113.), (114., 119.)])
+        self.assertEqual(writer.frame_count, 20)
+        self.assertEqual(len(writer.rotation_waits), 2)
+
+    def test_max_seconds(self):
+        writer = self.writer(max_seconds=1.)
+        for i in xrange(10):
+            writer.write(self.frame, 100. + 0.3 * i)
+        writer.release()
+        # A segment is full once a frame is at least 1 s after its first.
+        self.assertEqual([(s['first_frame'], s['frame_count'])
+                          for s in writer.segments],
+                         [(0, 4), (4, 4), (8, 2)])
+
+    def test_max_bytes(self):
+        writer = self.writer(max_bytes=3 * self.frame.nbytes)
+        for i in xrange(8):
+            writer.write(self.frame, 100. + i)
+        writer.release()
+        self.assertEqual([s['frame_count'] for s in writer.segments],
+                         [3, 3, 2])
+        self.assertEqual([s['bytes'] for s in writer.segments],
+                         [3 * self.frame.nbytes, 3 * self.frame.nbytes,
+                          2 * self.frame.nbytes])
+
+    def test_manifest(self):
+        writer = self.writer(max_frames=3)
+        for i in xrange(4):
+            writer.write(self.frame, 100. + i)
+        # Rewritten on rotation, while the last segment is being written.
+        manifest = read_manifest(self.output_path)
+        self.assertFalse(manifest['complete'])
+        self.assertEqual(manifest['frame_count'], 3)
+        self.assertEqual(len(manifest['segments']), 2)
+        writer.release()
+        manifest = read_manifest(self.output_path)
+        self.assertTrue(manifest['complete'])
+        self.assertEqual(manifest['fps'], 10.)
+        self.assertEqual(manifest['frame_size'], list(self.frame_size))
+        self.assertEqual(manifest['frame_count'], 4)
+        self.assertEqual([(s['first_frame'], s['frame_count'])
+                          for s in manifest['segments']], [(0, 3), (3, 1)])
+
+    def test_manifest_atomic(self):
+        # Manifest of a previous recording is replaced, not appended to.
+        with open(manifest_path(self.output_path), 'wb') as output:
+            output.write('{"stale": true, "padding": "%s"}' % ('x' * 4096))
+        writer = self.writer(max_frames=2)
+        self.assertNotIn('stale', read_manifest(self.output_path))
+        for i in xrange(5):
+            writer.write(self.frame, 100. + i)
+            with open(manifest_path(self.output_path), 'rb') as input_:
+                # Always a complete JSON document.
+                json.load(input_)
+        writer.release()
+        # Temporary file is renamed over the manifest.
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['output-0000.avi', 'output-0001.avi',
+                          'output-0002.avi', 'output.avi.manifest.json'])
+
+    def test_locate_frame(self):
+        writer = self.writer(max_frames=7)
+        for i in xrange(20):
+            writer.write(self.frame, 100. + i)
+        writer.release()
+        manifest = read_manifest(self.output_path)
+        self.assertEqual(locate_frame(manifest, 0), ('output-0000.avi', 0))
+        self.assertEqual(locate_frame(manifest, 6), ('output-0000.avi', 6))
+        self.assertEqual(locate_frame(manifest, 7), ('output-0001.avi', 0))
+        self.assertEqual(locate_frame(manifest, 19), ('output-0002.avi', 5))
+        self.assertRaises(IndexError, locate_frame, manifest, 20)
+        self.assertRaises(IndexError, locate_frame, manifest, -1)
+
+    def test_unused_segment_removed(self):
+        writer = self.writer(max_frames=7)
+        for i in xrange(7):
+            writer.write(self.frame, 100. + i)
+        # Next segment is opened ahead of the rotation.
+        writer.next_thread.join()
+        self.assertTrue(os.path.exists(segment_path(self.output_path, 1)))
+        writer.release()
+        self.assertFalse(os.path.exists(segment_path(self.output_path, 1)))
+        self.assertEqual(len(writer.segments), 1)
+        self.assertEqual(os.path.getsize(segment_path(self.output_path, 0)),
+                         7 * self.frame.nbytes)
+        # Releasing again does nothing.
+        writer.release()
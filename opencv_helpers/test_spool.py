@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+'''
+Tests of spool recording (see `spool.SpoolWriter`), alone and from a
+`recorder.RecorderChild`, using the synthetic capture and counting writer of
+`test_recorder_pacing`.
+
+Run with `python -m unittest test_spool` from this directory.
+'''
+from __future__ import division
+import os
+import unittest
+
+import numpy as np
+
+from frame_timestamps import FrameTimestamps
+from segmented_writer import segment_path
+from spool import SpoolFile, SpoolWriter, spool_path
+from test_recorder_pacing import LatencyCapture, RecorderTestCase
+
+
+class TestSpool(RecorderTestCase):
+    def test_spool(self):
+        # Spool files of 30 frames, encoded by two processes while recording.
+        log, frames_written, child, channel = \
+            self.record_child(LatencyCapture(latency=0.002),
+                              spool=dict(segment_frames=30, processes=2))
+        self.assertTrue(isinstance(child.writer, SpoolWriter))
+        self.assertLessEqual(log.deadline_misses, 1)
+        self.assert_rate(log, frames_written, self.fps * self.seconds)
+        self.assertEqual(len(log.segments),
+                         -(-frames_written // 30))
+        self.assertEqual(sum([segment['transcoded']
+                              for segment in log.segments]), frames_written)
+        self.assertEqual(log.segments[-1]['path'],
+                         os.path.basename(segment_path(self.output_path,
+                                                       len(log.segments) -
+                                                       1)))
+        # Spool files are deleted once encoded.
+        self.assertFalse([name for name in os.listdir(self.directory)
+                          if name.endswith('.spool')])
+        self.assertEqual(len(FrameTimestamps(self.output_path)),
+                         frames_written)
+
+    def test_spool_file(self):
+        writer = SpoolWriter(self.output_path, (24, 32, 3), self.fps,
+                             segment_frames=4)
+        for i in xrange(10):
+            writer.write(np.full((24, 32, 3), i, dtype='uint8'), 100. + i)
+        writer.release()
+        self.assertEqual([segment['frame_count']
+                          for segment in writer.segments], [4, 4, 2])
+        # Spool files are kept, and no video file is written.
+        self.assertEqual([(segment['path'], segment['spool'])
+                          for segment in writer.segments],
+                         [(None, 'output-0000.spool'),
+                          (None, 'output-0001.spool'),
+                          (None, 'output-0002.spool')])
+        # Random access to frames of a spool file, by index or grab time.
+        spool = SpoolFile(segment_path(spool_path(self.output_path), 1))
+        self.assertEqual((len(spool), spool.capacity, spool.fps),
+                         (4, 4, self.fps))
+        self.assertTrue((spool[2] == 6).all())
+        self.assertEqual(spool.index['frame'][3], 7)
+        self.assertEqual(spool.index_at(105.5), 1)
+        spool.close()
+        # Last file is cut to the frames written.
+        spool = SpoolFile(segment_path(spool_path(self.output_path), 2))
+        self.assertEqual(len(spool), 2)
+        self.assertEqual(spool.frames.shape, (2, 24, 32, 3))
+        self.assertTrue((spool[-1] == 9).all())
+        spool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()